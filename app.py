@@ -29,6 +29,9 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10MB max upload size
+# Tải file qua web server: X-Sendfile (Apache/lighttpd) hoặc X-Accel-Redirect (nginx, tiền tố location internal)
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+app.config["FILE_STORAGE_ACCEL_PREFIX"] = os.environ.get("FILE_STORAGE_ACCEL_PREFIX")
 
 # Set up login manager
 login_manager = LoginManager()
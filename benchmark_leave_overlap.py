@@ -0,0 +1,103 @@
+"""
+Đo thời gian kiểm tra chồng lấn đơn nghỉ phép trên dữ liệu lớn
+
+Sử dụng: python benchmark_leave_overlap.py [số_dòng] [database_url]
+- số_dòng: Số đơn nghỉ phép giả lập (mặc định 1.000.000)
+- database_url: Database dùng để đo (mặc định SQLite trong bộ nhớ, không ảnh hưởng dữ liệu thật)
+"""
+import sys
+import time
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, inspect, text, MetaData, Table, Column, Index
+
+from models import LeaveRequest, LeaveStatus, LeaveType
+from utils_overlap import leave_overlap_query
+
+EMPLOYEES = 10000
+BATCH_SIZE = 50000
+QUERIES = 1000
+
+
+def generate_rows(total):
+    """Sinh đơn nghỉ phép không trùng nhau cho từng nhân viên, rải đều trong nhiều năm"""
+    per_employee = max(total // EMPLOYEES, 1)
+    base = date(2000, 1, 1)
+    rows = []
+    for employee_id in range(1, EMPLOYEES + 1):
+        current = base + timedelta(days=random.randint(0, 30))
+        for _ in range(per_employee):
+            length = random.randint(0, 4)
+            rows.append({
+                'employee_id': employee_id,
+                'leave_type': LeaveType.ANNUAL.name,
+                'start_date': current,
+                'end_date': current + timedelta(days=length),
+                'status': random.choice([LeaveStatus.APPROVED.name, LeaveStatus.REJECTED.name]),
+            })
+            current += timedelta(days=length + random.randint(2, 60))
+            if len(rows) >= BATCH_SIZE:
+                yield rows
+                rows = []
+    if rows:
+        yield rows
+
+
+def build_table():
+    """Bản sao bảng leave_request không có khóa ngoại, để chạy trên database trống"""
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in LeaveRequest.__table__.columns]
+    table = Table(LeaveRequest.__tablename__, MetaData(), *columns)
+    index = Index('ix_leave_request_employee_dates', table.c.employee_id, table.c.start_date, table.c.end_date)
+    return table, index
+
+
+def run_queries(conn):
+    """Chạy QUERIES lần kiểm tra chồng lấn ngẫu nhiên, trả về thời gian trung bình (ms)"""
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        employee_id = random.randint(1, EMPLOYEES)
+        start = date(2000, 1, 1) + timedelta(days=random.randint(0, 365 * 20))
+        query = leave_overlap_query([employee_id], start, start + timedelta(days=5)).limit(1)
+        conn.execute(query).first()
+    return (time.perf_counter() - started) * 1000 / QUERIES
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    url = sys.argv[2] if len(sys.argv) > 2 else 'sqlite://'
+    engine = create_engine(url)
+    table, index = build_table()
+
+    if inspect(engine).has_table(table.name):
+        print(f"Database đã có bảng {table.name}, hãy dùng một database trống để đo.")
+        return 1
+
+    with engine.begin() as conn:
+        table.create(conn)
+
+        print(f"Đang tạo {total} đơn nghỉ phép...")
+        started = time.perf_counter()
+        inserted = 0
+        for batch in generate_rows(total):
+            conn.execute(table.insert(), batch)
+            inserted += len(batch)
+        print(f"Đã tạo {inserted} dòng trong {time.perf_counter() - started:.1f}s")
+
+    with engine.connect() as conn:
+        print(f"Không có index: {run_queries(conn):.3f} ms/truy vấn")
+
+    with engine.begin() as conn:
+        index.create(conn)
+        conn.execute(text('ANALYZE'))
+
+    with engine.connect() as conn:
+        print(f"Có index (employee_id, start_date, end_date): {run_queries(conn):.3f} ms/truy vấn")
+
+    with engine.begin() as conn:
+        table.drop(conn)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Script để quét các giấy tờ nhân viên sắp hết hạn và gửi nhắc nhở
+Script này có thể được chạy tự động thông qua cron vào mỗi ngày
+"""
+import sys
+import logging
+from datetime import datetime
+from app import app
+from utils_document import sweep_expiring_documents
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python check_documents.py [YYYY-MM-DD] [--dry-run]
+    - YYYY-MM-DD: Ngày quét (mặc định hôm nay)
+    - --dry-run: Chỉ đếm, không gửi thông báo
+    """
+    try:
+        args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+        dry_run = '--dry-run' in sys.argv[1:]
+        today = datetime.strptime(args[0], '%Y-%m-%d').date() if args else None
+        
+        logger.info("Quét giấy tờ sắp hết hạn...")
+        
+        with app.app_context():
+            result = sweep_expiring_documents(today, notify=not dry_run)
+            
+            logger.info(f"Đã kiểm tra xong, {result['documents']} giấy tờ của {result['employees']} nhân viên, "
+                        f"{result['employees_notified']} thông báo đã được gửi.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Script để chuyển các hợp đồng đã quá ngày kết thúc sang trạng thái hết hạn
+và đồng bộ ngày hợp đồng của nhân viên
+Script này có thể được chạy tự động thông qua cron vào mỗi đêm
+"""
+import sys
+import logging
+from datetime import datetime
+from app import app
+from utils_contract import run_contract_lifecycle
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python expire_contracts.py [YYYY-MM-DD]
+    - YYYY-MM-DD: Ngày xét hết hạn (mặc định hôm nay)
+    """
+    try:
+        today = None
+        if len(sys.argv) > 1:
+            today = datetime.strptime(sys.argv[1], '%Y-%m-%d').date()
+        
+        logger.info("Chuyển trạng thái hợp đồng hết hạn...")
+        
+        with app.app_context():
+            result = run_contract_lifecycle(today)
+            total = sum(result['timings'].values())
+            
+            logger.info(f"Đã hoàn thành: {result['expired']} hợp đồng hết hạn, "
+                        f"{result['employees_synced']} nhân viên được cập nhật, tổng {total:.3f} giây.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
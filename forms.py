@@ -1,11 +1,13 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SelectField, DateField, DateTimeField, TextAreaField, FloatField, FileField, HiddenField, BooleanField, SelectMultipleField, SubmitField, IntegerField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, ValidationError, NumberRange
-from models import (Gender, EmployeeStatus, LeaveType, Department, User, Employee, UserRole,
+from models import (Gender, EmployeeStatus, LeaveType, User, Employee, UserRole,
               AwardType, EducationLevel, Position, VIETNAM_PROVINCES, SalaryGrade, WorkScheduleType, WorkScheduleStatus,
               PerformanceRatingPeriod, PerformanceRatingStatus, PerformanceEvaluationCriteria, CustomPosition,
               TaskStatus, TaskPriority, Task, WorkSchedule)
 from app import db
+from utils_cache import get_department_choices, get_custom_position_choices, get_salary_grade_choices
+from forms_fields import EmployeeLookupField, EmployeeLookupMultipleField
 from flask_wtf.file import FileAllowed
 from datetime import date, datetime, timedelta
 
@@ -109,14 +111,14 @@ class EmployeeForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(EmployeeForm, self).__init__(*args, **kwargs)
-        self.department_id.choices = [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = get_department_choices()
         self.home_town.choices = [('', '-- Chọn quê quán --')] + [(province, province) for province in VIETNAM_PROVINCES]
         
         # Lấy danh sách vị trí mặc định từ enum Position
         default_positions = [(pos.value, pos.value) for pos in Position]
         
         # Lấy danh sách vị trí tùy chỉnh từ database
-        custom_positions = [(pos.name, pos.name) for pos in CustomPosition.query.all()]
+        custom_positions = get_custom_position_choices()
         
         # Kết hợp và gán cho choices của trường position
         self.position.choices = [('', '-- Chọn chức vụ --')] + default_positions + custom_positions
@@ -177,11 +179,7 @@ class CareerPathForm(FlaskForm):
 class AttendanceReportForm(FlaskForm):
     start_date = DateField('Từ ngày', validators=[DataRequired(message='Vui lòng chọn ngày bắt đầu')])
     end_date = DateField('Đến ngày', validators=[DataRequired(message='Vui lòng chọn ngày kết thúc')])
-    employee_id = SelectField('Nhân viên', coerce=int, validators=[Optional()])
-    
-    def __init__(self, *args, **kwargs):
-        super(AttendanceReportForm, self).__init__(*args, **kwargs)
-        self.employee_id.choices = [(0, 'Tất cả nhân viên')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
+    employee_id = EmployeeLookupField('Nhân viên', blank_choices=[(0, 'Tất cả nhân viên')], validators=[Optional()])
 
     def validate_dates(self):
         if self.start_date.data and self.end_date.data:
@@ -202,7 +200,7 @@ class EmployeeImportForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(EmployeeImportForm, self).__init__(*args, **kwargs)
-        self.department_id.choices = [(0, 'Không chọn')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Không chọn')] + get_department_choices()
 
 
 class AwardForm(FlaskForm):
@@ -242,7 +240,7 @@ class EmployeeFilterForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(EmployeeFilterForm, self).__init__(*args, **kwargs)
-        self.department_id.choices = [(0, 'Tất cả phòng ban')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Tất cả phòng ban')] + get_department_choices()
         self.gender.choices = [('', 'Tất cả')] + [(g.name, g.value) for g in Gender]
         self.status.choices = [('', 'Tất cả')] + [(s.name, s.value) for s in EmployeeStatus]
         self.home_town.choices = [('', 'Tất cả tỉnh thành')] + [(province, province) for province in VIETNAM_PROVINCES]
@@ -303,6 +301,20 @@ class SalaryGradeEditForm(SalaryGradeForm):
     salary_grade_id = HiddenField('ID')
 
 
+class PerformanceAnalyticsForm(FlaskForm):
+    """Form lọc thống kê đánh giá hiệu suất"""
+    evaluation_period = SelectField('Kỳ đánh giá', choices=[(p.name, p.value) for p in PerformanceRatingPeriod],
+                                    default=PerformanceRatingPeriod.QUARTERLY.name)
+    year = IntegerField('Năm', validators=[DataRequired(message='Vui lòng nhập năm'),
+                                          NumberRange(min=2000, max=2100, message='Năm không hợp lệ')],
+                        default=lambda: date.today().year)
+    department_id = SelectField('Phòng ban', coerce=int, validators=[Optional()])
+    
+    def __init__(self, *args, **kwargs):
+        super(PerformanceAnalyticsForm, self).__init__(*args, **kwargs)
+        self.department_id.choices = [(0, 'Tất cả phòng ban')] + get_department_choices()
+
+
 class CustomPositionForm(FlaskForm):
     """Form để thêm mới vị trí/chức vụ tùy chỉnh"""
     name = StringField('Tên vị trí/chức vụ', validators=[DataRequired(message='Vui lòng nhập tên vị trí')])
@@ -326,7 +338,7 @@ class CustomPositionEditForm(CustomPositionForm):
 
 
 class EmployeeSalaryForm(FlaskForm):
-    employee_id = SelectField('Nhân viên', coerce=int, validators=[DataRequired(message='Vui lòng chọn nhân viên')])
+    employee_id = EmployeeLookupField('Nhân viên', validators=[DataRequired(message='Vui lòng chọn nhân viên')])
     salary_grade_id = SelectField('Bậc lương', coerce=int, validators=[DataRequired(message='Vui lòng chọn bậc lương')])
     effective_date = DateField('Ngày hiệu lực', validators=[DataRequired(message='Vui lòng chọn ngày hiệu lực')])
     end_date = DateField('Ngày kết thúc', validators=[Optional()])
@@ -336,8 +348,7 @@ class EmployeeSalaryForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(EmployeeSalaryForm, self).__init__(*args, **kwargs)
-        self.employee_id.choices = [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
-        self.salary_grade_id.choices = [(g.id, f"{g.code} - {g.name} (Hệ số: {g.base_coefficient})") for g in SalaryGrade.query.all()]
+        self.salary_grade_id.choices = get_salary_grade_choices()
     
     def validate_dates(self):
         if self.effective_date.data and self.end_date.data:
@@ -355,6 +366,16 @@ class EmployeeSalaryEditForm(EmployeeSalaryForm):
     salary_id = HiddenField('ID')
 
 
+class PayrollRunForm(FlaskForm):
+    """Form tính bảng lương tháng"""
+    month = SelectField('Tháng', coerce=int, choices=[(m, f'Tháng {m}') for m in range(1, 13)],
+                        default=lambda: date.today().month)
+    year = IntegerField('Năm', validators=[DataRequired(message='Vui lòng nhập năm'),
+                                          NumberRange(min=2000, max=2100, message='Năm không hợp lệ')],
+                        default=lambda: date.today().year)
+    notes = TextAreaField('Ghi chú', validators=[Optional()])
+
+
 class WorkScheduleForm(FlaskForm):
     """Form tạo lịch công tác"""
     title = StringField('Tiêu đề', validators=[DataRequired(message='Vui lòng nhập tiêu đề')])
@@ -363,16 +384,30 @@ class WorkScheduleForm(FlaskForm):
     location = StringField('Địa điểm', validators=[DataRequired(message='Vui lòng nhập địa điểm')])
     start_time = DateTimeField('Thời gian bắt đầu', format='%Y-%m-%dT%H:%M', validators=[DataRequired(message='Vui lòng chọn thời gian bắt đầu')])
     end_time = DateTimeField('Thời gian kết thúc', format='%Y-%m-%dT%H:%M', validators=[DataRequired(message='Vui lòng chọn thời gian kết thúc')])
-    participants = SelectMultipleField('Người tham gia', coerce=int, validators=[DataRequired(message='Vui lòng chọn ít nhất một người tham gia')])
-    
-    def __init__(self, *args, **kwargs):
-        super(WorkScheduleForm, self).__init__(*args, **kwargs)
-        self.participants.choices = [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
+    participants = EmployeeLookupMultipleField('Người tham gia', validators=[DataRequired(message='Vui lòng chọn ít nhất một người tham gia')])
     
     def validate_end_time(self, end_time):
         if self.start_time.data and end_time.data:
             if self.start_time.data >= end_time.data:
                 raise ValidationError('Thời gian kết thúc phải sau thời gian bắt đầu.')
+    
+    def validate_participants(self, participants):
+        if not participants.data or not self.start_time.data or not self.end_time.data:
+            return
+        from utils_overlap import find_schedule_conflicts, find_participant_leave_conflicts
+        
+        exclude_id = None
+        if hasattr(self, 'schedule_id') and self.schedule_id.data:
+            exclude_id = int(self.schedule_id.data)
+        
+        conflicts = find_schedule_conflicts(participants.data, self.start_time.data, self.end_time.data, exclude_id)
+        if conflicts:
+            names = ', '.join(sorted({f"{c.employee_code} - {c.full_name}" for c in conflicts}))
+            raise ValidationError(f'Người tham gia bị trùng lịch công tác khác: {names}.')
+        
+        leaves = find_participant_leave_conflicts(participants.data, self.start_time.data, self.end_time.data)
+        if leaves:
+            raise ValidationError(f'Có {len({l.employee_id for l in leaves})} người tham gia đang nghỉ phép trong thời gian này.')
 
 
 class WorkScheduleEditForm(WorkScheduleForm):
@@ -418,7 +453,7 @@ class PerformanceCriteriaForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(PerformanceCriteriaForm, self).__init__(*args, **kwargs)
-        self.department_id.choices = [(0, 'Tất cả phòng ban')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Tất cả phòng ban')] + get_department_choices()
     
     def validate_max_score(self, max_score):
         try:
@@ -435,7 +470,7 @@ class PerformanceCriteriaForm(FlaskForm):
 
 class PerformanceEvaluationForm(FlaskForm):
     """Form tạo đánh giá hiệu suất nhân viên"""
-    employee_id = SelectField('Nhân viên', coerce=int, validators=[DataRequired(message='Vui lòng chọn nhân viên')])
+    employee_id = EmployeeLookupField('Nhân viên', validators=[DataRequired(message='Vui lòng chọn nhân viên')])
     evaluation_period = SelectField('Kỳ đánh giá', choices=[(p.name, p.value) for p in PerformanceRatingPeriod], validators=[DataRequired(message='Vui lòng chọn kỳ đánh giá')])
     start_date = DateField('Từ ngày', validators=[DataRequired(message='Vui lòng chọn ngày bắt đầu')])
     end_date = DateField('Đến ngày', validators=[DataRequired(message='Vui lòng chọn ngày kết thúc')])
@@ -444,10 +479,6 @@ class PerformanceEvaluationForm(FlaskForm):
     areas_for_improvement = TextAreaField('Lĩnh vực cần cải thiện', validators=[Optional()])
     goals_for_next_period = TextAreaField('Mục tiêu cho kỳ tiếp theo', validators=[Optional()])
     
-    def __init__(self, *args, **kwargs):
-        super(PerformanceEvaluationForm, self).__init__(*args, **kwargs)
-        self.employee_id.choices = [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
-    
     def validate_dates(self):
         if self.start_date.data and self.end_date.data:
             if self.start_date.data > self.end_date.data:
@@ -486,7 +517,7 @@ class PerformanceApprovalForm(FlaskForm):
 
 class PerformanceFilterForm(FlaskForm):
     """Form lọc đánh giá hiệu suất"""
-    employee_id = SelectField('Nhân viên', coerce=int, validators=[Optional()])
+    employee_id = EmployeeLookupField('Nhân viên', blank_choices=[(0, 'Tất cả nhân viên')], validators=[Optional()])
     evaluation_period = SelectField('Kỳ đánh giá', validators=[Optional()])
     status = SelectField('Trạng thái', validators=[Optional()])
     start_date = DateField('Từ ngày', validators=[Optional()])
@@ -494,7 +525,6 @@ class PerformanceFilterForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(PerformanceFilterForm, self).__init__(*args, **kwargs)
-        self.employee_id.choices = [(0, 'Tất cả nhân viên')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
         self.evaluation_period.choices = [('', 'Tất cả kỳ đánh giá')] + [(p.name, p.value) for p in PerformanceRatingPeriod]
         self.status.choices = [('', 'Tất cả trạng thái')] + [(s.name, s.value) for s in PerformanceRatingStatus]
     
@@ -533,7 +563,7 @@ class TaskForm(FlaskForm):
     description = TextAreaField('Mô tả', validators=[Optional()])
     status = SelectField('Trạng thái', choices=[(s.name, s.value) for s in TaskStatus], validators=[DataRequired(message='Vui lòng chọn trạng thái')])
     priority = SelectField('Mức độ ưu tiên', choices=[(p.name, p.value) for p in TaskPriority], validators=[DataRequired(message='Vui lòng chọn mức độ ưu tiên')])
-    assigned_to = SelectField('Người được giao', coerce=int, validators=[Optional()])
+    assigned_to = EmployeeLookupField('Người được giao', blank_choices=[(0, 'Chưa phân công')], validators=[Optional()])
     department_id = SelectField('Phòng ban', coerce=int, validators=[Optional()])
     work_schedule_id = SelectField('Lịch công tác liên quan', coerce=int, validators=[Optional()])
     deadline = DateTimeField('Hạn chót', format='%Y-%m-%dT%H:%M', validators=[Optional()])
@@ -544,8 +574,7 @@ class TaskForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(TaskForm, self).__init__(*args, **kwargs)
-        self.assigned_to.choices = [(0, 'Chưa phân công')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
-        self.department_id.choices = [(0, 'Không thuộc phòng ban cụ thể')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Không thuộc phòng ban cụ thể')] + get_department_choices()
         self.work_schedule_id.choices = [(0, 'Không liên kết với lịch công tác')] + [(w.id, f"{w.title} ({w.start_time.strftime('%d/%m/%Y')})") for w in WorkSchedule.query.filter(WorkSchedule.end_time > datetime.utcnow()).all()]
         # Chỉ hiển thị các nhiệm vụ đang làm và đang xét duyệt để tránh phụ thuộc vòng
         self.dependent_tasks.choices = [(t.id, f"{t.title} ({t.status_display})") for t in Task.query.filter(Task.status.in_([TaskStatus.TODO, TaskStatus.IN_PROGRESS, TaskStatus.REVIEW])).all()]
@@ -572,15 +601,14 @@ class TaskSearchForm(FlaskForm):
     keyword = StringField('Từ khóa', validators=[Optional()])
     status = SelectField('Trạng thái', choices=[('', 'Tất cả')] + [(s.name, s.value) for s in TaskStatus], validators=[Optional()])
     priority = SelectField('Mức độ ưu tiên', choices=[('', 'Tất cả')] + [(p.name, p.value) for p in TaskPriority], validators=[Optional()])
-    assigned_to = SelectField('Người được giao', coerce=int, validators=[Optional()])
+    assigned_to = EmployeeLookupField('Người được giao', blank_choices=[(0, 'Tất cả')], active_only=False, validators=[Optional()])
     department_id = SelectField('Phòng ban', coerce=int, validators=[Optional()])
     label = StringField('Nhãn', validators=[Optional()])
     overdue = BooleanField('Chỉ hiện nhiệm vụ quá hạn', default=False)
     
     def __init__(self, *args, **kwargs):
         super(TaskSearchForm, self).__init__(*args, **kwargs)
-        self.assigned_to.choices = [('', 'Tất cả')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.all()]
-        self.department_id.choices = [('', 'Tất cả')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [('', 'Tất cả')] + get_department_choices()
 
 
 class TaskBulkActionForm(FlaskForm):
@@ -595,10 +623,9 @@ class TaskBulkActionForm(FlaskForm):
     ], validators=[DataRequired()])
     status = SelectField('Trạng thái mới', choices=[(s.name, s.value) for s in TaskStatus], validators=[Optional()])
     priority = SelectField('Mức độ ưu tiên mới', choices=[(p.name, p.value) for p in TaskPriority], validators=[Optional()])
-    assigned_to = SelectField('Người được giao mới', coerce=int, validators=[Optional()])
+    assigned_to = EmployeeLookupField('Người được giao mới', blank_choices=[(0, 'Chưa phân công')], validators=[Optional()])
     department_id = SelectField('Phòng ban mới', coerce=int, validators=[Optional()])
     
     def __init__(self, *args, **kwargs):
         super(TaskBulkActionForm, self).__init__(*args, **kwargs)
-        self.assigned_to.choices = [(0, 'Chưa phân công')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
-        self.department_id.choices = [(0, 'Không thuộc phòng ban cụ thể')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Không thuộc phòng ban cụ thể')] + get_department_choices()
@@ -1,13 +1,14 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, DateField, FloatField, TextAreaField, FileField, HiddenField, BooleanField
-from wtforms.validators import DataRequired, Optional, NumberRange, Length
-from flask_wtf.file import FileAllowed
+from wtforms import StringField, SelectField, DateField, FloatField, IntegerField, TextAreaField, FileField, HiddenField, BooleanField
+from wtforms.validators import DataRequired, Optional, NumberRange, Length, ValidationError
+from flask_wtf.file import FileAllowed, FileRequired
 from datetime import date
 from models import (
     AssetCategory, AssetStatus, MaintenanceType, 
-    MaintenanceStatus, Asset, Employee, EmployeeStatus,
-    AssetCategoryModel
+    MaintenanceStatus, Asset,
+    AssetCategoryModel, DepreciationMethod
 )
+from utils_cache import get_department_choices, get_active_employee_choices
 
 
 class AssetCategoryForm(FlaskForm):
@@ -18,6 +19,25 @@ class AssetCategoryForm(FlaskForm):
     ])
     description = TextAreaField('Mô tả', validators=[Optional()])
     is_active = BooleanField('Kích hoạt', default=True)
+    depreciation_method = SelectField('Phương pháp khấu hao', choices=[
+        (m.name, m.value) for m in DepreciationMethod
+    ], default=DepreciationMethod.NONE.name)
+    useful_life_months = IntegerField('Thời gian sử dụng hữu ích (tháng)', validators=[
+        Optional(),
+        NumberRange(min=1, max=600, message='Thời gian sử dụng phải từ 1-600 tháng')
+    ])
+    salvage_rate = FloatField('Giá trị thu hồi (% nguyên giá)', default=0, validators=[
+        Optional(),
+        NumberRange(min=0, max=100, message='Giá trị thu hồi phải từ 0-100%')
+    ])
+    declining_factor = FloatField('Hệ số số dư giảm dần', default=2.0, validators=[
+        Optional(),
+        NumberRange(min=1, max=5, message='Hệ số phải từ 1-5')
+    ])
+    
+    def validate_useful_life_months(self, field):
+        if self.depreciation_method.data != DepreciationMethod.NONE.name and not field.data:
+            raise ValidationError('Vui lòng nhập thời gian sử dụng hữu ích để tính khấu hao')
 
 
 class AssetCategoryEditForm(AssetCategoryForm):
@@ -60,7 +80,7 @@ class AssetForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(AssetForm, self).__init__(*args, **kwargs)
-        from models import Department, Employee, AssetCategoryModel
+        from models import AssetCategoryModel
         
         # Lấy danh sách danh mục tài sản từ database
         categories = AssetCategoryModel.query.filter_by(is_active=True).all()
@@ -70,9 +90,9 @@ class AssetForm(FlaskForm):
             self.category.choices = [(0, '-- Không có danh mục --')]
         
         # Lấy danh sách phòng ban (chỉ khi có dữ liệu)
-        departments = Department.query.all()
+        departments = get_department_choices()
         if departments:
-            self.department_id.choices = [(0, '-- Chọn phòng ban --')] + [(d.id, d.name) for d in departments]
+            self.department_id.choices = [(0, '-- Chọn phòng ban --')] + departments
         else:
             self.department_id.choices = [(0, '-- Không có phòng ban --')]
             
@@ -107,8 +127,20 @@ class AssetAssignmentForm(FlaskForm):
         self.asset_id.choices = [(a.id, f"{a.asset_code} - {a.name}") for a in 
                                Asset.query.filter_by(status=AssetStatus.AVAILABLE).all()]
         # Lấy danh sách nhân viên đang làm việc
-        self.employee_id.choices = [(e.id, f"{e.employee_code} - {e.full_name}") for e in 
-                                  Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()]
+        self.employee_id.choices = get_active_employee_choices()
+
+
+class AssetBulkUploadForm(FlaskForm):
+    """Form tải file CSV bàn giao / thu hồi tài sản hàng loạt"""
+    action = SelectField('Thao tác', choices=[
+        ('assign', 'Bàn giao tài sản'),
+        ('return', 'Thu hồi tài sản')
+    ], default='assign')
+    file = FileField('File CSV', validators=[
+        FileRequired(message='Vui lòng chọn file CSV'),
+        FileAllowed(['csv'], 'Chỉ chấp nhận file CSV')
+    ])
+    dry_run = BooleanField('Chỉ kiểm tra, chưa ghi dữ liệu')
 
 
 class AssetReturnForm(FlaskForm):
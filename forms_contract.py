@@ -5,8 +5,9 @@ from flask_wtf.file import FileAllowed
 from datetime import date, datetime
 from models import (
     ContractType, ContractStatus, Contract, ContractAmendment,
-    DocumentType, Document, Employee, EmployeeStatus, Department
+    DocumentType, Document, Employee
 )
+from utils_cache import get_department_choices, get_active_employee_choices
 
 
 class ContractForm(FlaskForm):
@@ -50,16 +51,16 @@ class ContractForm(FlaskForm):
         super(ContractForm, self).__init__(*args, **kwargs)
         
         # Lấy danh sách nhân viên đang làm việc (chỉ khi có dữ liệu)
-        employees = Employee.query.filter_by(status=EmployeeStatus.ACTIVE).all()
+        employees = get_active_employee_choices()
         if employees:
-            self.employee_id.choices = [(e.id, f"{e.employee_code} - {e.full_name}") for e in employees]
+            self.employee_id.choices = employees
         else:
             self.employee_id.choices = [(0, '-- Chưa có nhân viên --')]
             
         # Lấy danh sách phòng ban (chỉ khi có dữ liệu)
-        departments = Department.query.all()
+        departments = get_department_choices()
         if departments:
-            self.department_id.choices = [(d.id, d.name) for d in departments]
+            self.department_id.choices = departments
         else:
             self.department_id.choices = [(0, '-- Chưa có phòng ban --')]
 
@@ -211,7 +212,7 @@ class ContractFilterForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(ContractFilterForm, self).__init__(*args, **kwargs)
         self.employee_id.choices = [(0, 'Tất cả nhân viên')] + [(e.id, f"{e.employee_code} - {e.full_name}") for e in Employee.query.all()]
-        self.department_id.choices = [(0, 'Tất cả phòng ban')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Tất cả phòng ban')] + get_department_choices()
         self.contract_type.choices = [('', 'Tất cả loại')] + [(t.name, t.value) for t in ContractType]
         self.status.choices = [('', 'Tất cả trạng thái')] + [(s.name, s.value) for s in ContractStatus]
 
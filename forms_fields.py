@@ -0,0 +1,100 @@
+"""
+Các kiểu trường form dùng chung.
+
+EmployeeLookupField / EmployeeLookupMultipleField thay cho SelectField chứa toàn bộ
+danh sách nhân viên: trang chỉ render các lựa chọn mặc định và nhân viên đang được chọn,
+phần còn lại được tìm qua API /api/employees/lookup (xem static/js/employee-lookup.js).
+Khi submit, ID được kiểm tra trực tiếp trong database thay vì so với danh sách choices.
+"""
+from flask import url_for
+from wtforms import SelectField, SelectMultipleField
+from wtforms.validators import ValidationError
+
+from models import Employee, EmployeeStatus
+
+
+def employee_label(employee):
+    """Nhãn hiển thị của nhân viên trong các ô chọn"""
+    return f"{employee.employee_code} - {employee.full_name}"
+
+
+def _employee_choices(ids):
+    """Lấy (id, nhãn) cho các nhân viên có ID trong danh sách"""
+    ids = [i for i in ids if isinstance(i, int) and i > 0]
+    if not ids:
+        return []
+    rows = Employee.query.with_entities(Employee.id, Employee.employee_code, Employee.full_name) \
+        .filter(Employee.id.in_(ids)).order_by(Employee.id).all()
+    return [(r.id, employee_label(r)) for r in rows]
+
+
+def _existing_employee_ids(ids, active_only):
+    """Trả về tập ID nhân viên tồn tại (và đang làm việc nếu active_only)"""
+    ids = [i for i in ids if isinstance(i, int)]
+    if not ids:
+        return set()
+    query = Employee.query.with_entities(Employee.id).filter(Employee.id.in_(ids))
+    if active_only:
+        query = query.filter(Employee.status == EmployeeStatus.ACTIVE)
+    return {row.id for row in query.all()}
+
+
+class EmployeeLookupField(SelectField):
+    """
+    Ô chọn một nhân viên, tìm kiếm từ xa
+
+    Args:
+        blank_choices (list): Các lựa chọn cố định, ví dụ [(0, 'Tất cả nhân viên')]
+        active_only (bool): Chỉ cho phép chọn nhân viên đang làm việc
+    """
+
+    def __init__(self, label=None, validators=None, blank_choices=None, active_only=True, **kwargs):
+        kwargs.setdefault('coerce', int)
+        super(EmployeeLookupField, self).__init__(label, validators, **kwargs)
+        self.blank_choices = list(blank_choices or [])
+        self.active_only = active_only
+
+    def __call__(self, **kwargs):
+        kwargs.setdefault('data-employee-lookup', url_for('employee_lookup', active=int(self.active_only)))
+        return super(EmployeeLookupField, self).__call__(**kwargs)
+
+    def iter_choices(self):
+        self.choices = self.blank_choices + _employee_choices([self.data])
+        return super(EmployeeLookupField, self).iter_choices()
+
+    def pre_validate(self, form):
+        if not self.validate_choice:
+            return
+        if self.data in [self.coerce(value) for value, _ in self.blank_choices]:
+            return
+        if self.data not in _existing_employee_ids([self.data], self.active_only):
+            raise ValidationError('Nhân viên không hợp lệ.')
+
+
+class EmployeeLookupMultipleField(SelectMultipleField):
+    """
+    Ô chọn nhiều nhân viên, tìm kiếm từ xa
+
+    Args:
+        active_only (bool): Chỉ cho phép chọn nhân viên đang làm việc
+    """
+
+    def __init__(self, label=None, validators=None, active_only=True, **kwargs):
+        kwargs.setdefault('coerce', int)
+        super(EmployeeLookupMultipleField, self).__init__(label, validators, **kwargs)
+        self.active_only = active_only
+
+    def __call__(self, **kwargs):
+        kwargs.setdefault('data-employee-lookup', url_for('employee_lookup', active=int(self.active_only)))
+        return super(EmployeeLookupMultipleField, self).__call__(**kwargs)
+
+    def iter_choices(self):
+        self.choices = _employee_choices(list(self.data or []))
+        return super(EmployeeLookupMultipleField, self).iter_choices()
+
+    def pre_validate(self, form):
+        if not self.validate_choice or not self.data:
+            return
+        invalid = set(self.data) - _existing_employee_ids(self.data, self.active_only)
+        if invalid:
+            raise ValidationError(f"Nhân viên không hợp lệ: {', '.join(str(i) for i in sorted(invalid))}.")
@@ -17,7 +17,8 @@ class NotificationEmailForm(FlaskForm):
         ('all', 'Tất cả thông báo'),
         ('contracts', 'Chỉ thông báo hợp đồng'),
         ('employees', 'Chỉ thông báo nhân viên'),
-        ('performance', 'Chỉ thông báo đánh giá hiệu suất')
+        ('performance', 'Chỉ thông báo đánh giá hiệu suất'),
+        ('documents', 'Chỉ thông báo giấy tờ hết hạn')
     ], default='all')
     is_active = BooleanField('Kích hoạt', default=True)
     submit = SubmitField('Thêm email')
@@ -39,7 +40,8 @@ class NotificationEmailEditForm(FlaskForm):
         ('all', 'Tất cả thông báo'),
         ('contracts', 'Chỉ thông báo hợp đồng'),
         ('employees', 'Chỉ thông báo nhân viên'),
-        ('performance', 'Chỉ thông báo đánh giá hiệu suất')
+        ('performance', 'Chỉ thông báo đánh giá hiệu suất'),
+        ('documents', 'Chỉ thông báo giấy tờ hết hạn')
     ])
     is_active = BooleanField('Kích hoạt')
     submit = SubmitField('Cập nhật')
@@ -1,14 +1,16 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, DateField, TextAreaField, FloatField, FileField, HiddenField, IntegerField
+from wtforms import StringField, SelectField, DateField, TextAreaField, FloatField, FileField, HiddenField, IntegerField, BooleanField
 from wtforms.validators import DataRequired, Optional, ValidationError, Length, Email, NumberRange
 from flask_wtf.file import FileAllowed
 from datetime import date, datetime
 from models import (
     JobPosition, JobOpeningStatus, JobOpening, 
     CandidateStatus, Candidate, 
-    InterviewType, InterviewStatus, 
-    Department
+    InterviewType, InterviewStatus, InterviewRoom
 )
+from utils_cache import get_department_choices
+from forms_fields import EmployeeLookupMultipleField
+from utils_interview import get_room_choices
 
 
 class JobPositionForm(FlaskForm):
@@ -33,7 +35,7 @@ class JobPositionForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(JobPositionForm, self).__init__(*args, **kwargs)
         # Lấy danh sách phòng ban
-        self.department_id.choices = [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = get_department_choices()
 
 
 class JobPositionEditForm(JobPositionForm):
@@ -132,7 +134,13 @@ class InterviewForm(FlaskForm):
     interview_type = SelectField('Loại phỏng vấn', choices=[
         (t.name, t.value) for t in InterviewType
     ], validators=[DataRequired(message='Vui lòng chọn loại phỏng vấn')])
-    interviewers = StringField('Người phỏng vấn', validators=[Optional()])
+    duration_minutes = IntegerField('Thời lượng (phút)', default=60, validators=[
+        DataRequired(message='Vui lòng nhập thời lượng'),
+        NumberRange(min=15, max=480, message='Thời lượng phải từ 15 đến 480 phút')
+    ])
+    interviewer_ids = EmployeeLookupMultipleField('Nhân viên phỏng vấn', validators=[Optional()])
+    interviewers = StringField('Người phỏng vấn khác', validators=[Optional()])
+    room_id = SelectField('Phòng phỏng vấn', coerce=int, validators=[Optional()])
     location = StringField('Địa điểm', validators=[Optional()])
     status = SelectField('Trạng thái', choices=[
         (s.name, s.value) for s in InterviewStatus
@@ -154,6 +162,22 @@ class InterviewForm(FlaskForm):
                          CandidateStatus.INTERVIEW_SCHEDULED, CandidateStatus.INTERVIEWED]
         self.candidate_id.choices = [(c.id, f"{c.full_name} - {c.job_opening.position.title}") 
                                for c in Candidate.query.filter(Candidate.status.in_([s.name for s in valid_statuses])).all()]
+        self.room_id.choices = get_room_choices()
+
+
+class InterviewRoomForm(FlaskForm):
+    """Form để tạo phòng phỏng vấn"""
+    name = StringField('Tên phòng', validators=[
+        DataRequired(message='Vui lòng nhập tên phòng'),
+        Length(max=100, message='Tên phòng không được quá 100 ký tự')
+    ])
+    location = StringField('Vị trí', validators=[Optional(), Length(max=200)])
+    capacity = IntegerField('Sức chứa', validators=[Optional(), NumberRange(min=1, message='Sức chứa phải lớn hơn 0')])
+    is_active = BooleanField('Đang sử dụng', default=True)
+
+    def validate_name(self, name):
+        if InterviewRoom.query.filter_by(name=name.data).first():
+            raise ValidationError('Tên phòng đã tồn tại.')
 
 
 class InterviewEditForm(InterviewForm):
@@ -171,7 +195,7 @@ class RecruitmentFilterForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(RecruitmentFilterForm, self).__init__(*args, **kwargs)
-        self.department_id.choices = [(0, 'Tất cả phòng ban')] + [(d.id, d.name) for d in Department.query.all()]
+        self.department_id.choices = [(0, 'Tất cả phòng ban')] + get_department_choices()
         self.status.choices = [('', 'Tất cả trạng thái')] + [(s.name, s.value) for s in JobOpeningStatus]
 
     def validate_date_range(self):
@@ -0,0 +1,46 @@
+"""
+Script trích xuất văn bản CV của ứng viên và cập nhật chỉ mục token dùng để xếp hạng ứng viên
+Script này có thể được chạy tự động thông qua cron
+"""
+import sys
+import logging
+from app import app
+from utils_cv_index import index_candidate_cvs
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python index_candidate_cvs.py [workers]
+    - workers: Số process trích xuất song song (mặc định bằng số CPU)
+    """
+    try:
+        workers = None
+        if len(sys.argv) > 1:
+            workers = int(sys.argv[1])
+        
+        logger.info("Đang trích xuất và đánh index CV của ứng viên...")
+        
+        with app.app_context():
+            indexed, failed = index_candidate_cvs(workers=workers)
+            
+            logger.info(f"Đã đánh index {indexed} CV, {failed} CV không trích xuất được.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
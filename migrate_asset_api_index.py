@@ -0,0 +1,14 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index updated_at cho bảng assets đã tồn tại để tính ETag của API tài sản
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_asset_updated_at ON assets (updated_at)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_asset_updated_at to assets table")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,50 @@
+from app import app, db
+from sqlalchemy import text
+
+def migrate():
+    """
+    Thêm cấu hình khấu hao cho bảng asset_categories và index hạn bảo hành cho bảng assets.
+    Bảng asset_book_values được tạo bởi db.create_all() khi khởi động ứng dụng.
+    """
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if_not_exists = "IF NOT EXISTS " if dialect == "postgresql" else ""
+        
+        if dialect == "postgresql":
+            try:
+                print("Đang tạo kiểu enum depreciationmethod...")
+                db.session.execute(text(
+                    "CREATE TYPE depreciationmethod AS ENUM ('NONE', 'STRAIGHT_LINE', 'DECLINING_BALANCE')"
+                ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Lỗi khi tạo kiểu enum: {str(e)}")
+            method_type = "depreciationmethod"
+        else:
+            method_type = "VARCHAR(17)"
+        
+        columns = [
+            ("depreciation_method", f"{method_type} NOT NULL DEFAULT 'NONE'"),
+            ("useful_life_months", "INTEGER"),
+            ("salvage_rate", "FLOAT NOT NULL DEFAULT 0"),
+            ("declining_factor", "FLOAT NOT NULL DEFAULT 2.0"),
+        ]
+        
+        for name, definition in columns:
+            try:
+                print(f"Đang thêm trường {name} vào bảng asset_categories...")
+                db.session.execute(text(f"ALTER TABLE asset_categories ADD COLUMN {if_not_exists}{name} {definition}"))
+                db.session.commit()
+                print(f"Đã thêm trường {name} thành công!")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Lỗi khi thêm trường {name}: {str(e)}")
+        
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_asset_warranty_expiry ON assets (warranty_expiry)"))
+        db.session.commit()
+        
+        print("Migration completed successfully: asset category depreciation settings and ix_asset_warranty_expiry")
+
+if __name__ == "__main__":
+    migrate()
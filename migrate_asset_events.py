@@ -0,0 +1,27 @@
+from app import app, db
+from utils_asset_events import backfill_events, rebuild_states
+
+def migrate():
+    """
+    Tạo nhật ký sự kiện tài sản từ dữ liệu bàn giao/bảo trì đã có và dựng bảng trạng thái hiện tại.
+    Bảng asset_events và asset_states được tạo bởi db.create_all() khi khởi động ứng dụng.
+    """
+    with app.app_context():
+        try:
+            print("Đang tạo nhật ký sự kiện từ dữ liệu cũ...")
+            created = backfill_events()
+            print(f"Đã tạo {created} sự kiện")
+            
+            print("Đang dựng lại trạng thái hiện tại của tài sản...")
+            rebuilt = rebuild_states()
+            db.session.commit()
+            print(f"Đã dựng lại trạng thái của {rebuilt} tài sản")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Lỗi khi tạo nhật ký sự kiện: {str(e)}")
+            return
+        
+        print("Migration completed successfully: asset_events backfilled and asset_states rebuilt")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,16 @@
+from app import app, db
+from sqlalchemy import text
+
+# Thêm các sự kiện báo hỏng và khôi phục tài sản (trạng thái trên form sửa được ghi qua nhật ký sự kiện).
+# PostgreSQL lưu AssetEventType bằng kiểu enum riêng nên cần thêm giá trị; SQLite lưu dạng chuỗi, không cần đổi.
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text("ALTER TYPE asseteventtype ADD VALUE IF NOT EXISTS 'MARKED_BROKEN'"))
+                conn.execute(text("ALTER TYPE asseteventtype ADD VALUE IF NOT EXISTS 'RESTORED'"))
+                conn.commit()
+        print("Migration completed successfully: Added MARKED_BROKEN and RESTORED asset events")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,14 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index đọc chấm công theo kỳ cho bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_attendance_date_employee ON attendance (date, employee_id)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_attendance_date_employee to attendance table")
+
+if __name__ == "__main__":
+    migrate()
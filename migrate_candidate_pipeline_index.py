@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index pipeline ứng viên theo đợt tuyển dụng cho bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_candidate_opening_status_date '
+                              'ON candidates (job_opening_id, status, application_date)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_candidate_opening_status_date to candidates table")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,18 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index cho job hết hạn hợp đồng và đồng bộ ngày hợp đồng nhân viên trên bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ; bảng contract_events được tạo tự động)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_contract_status_end_date '
+                              'ON contracts (status, end_date)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_contract_employee_status_start '
+                              'ON contracts (employee_id, status, start_date)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_contract_status_end_date, "
+              "ix_contract_employee_status_start to contracts table")
+
+if __name__ == "__main__":
+    migrate()
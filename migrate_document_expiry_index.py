@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index cho việc quét giấy tờ sắp hết hạn trên bảng documents đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_document_expiry_verified '
+                              'ON documents (expiry_date, is_verified)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_document_expiry_verified to documents table")
+
+if __name__ == "__main__":
+    migrate()
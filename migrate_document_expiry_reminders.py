@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Thêm cột lưu mốc nhắc hết hạn đã gửi cho bảng documents đã tồn tại
+# (utils_document nhắc theo khoảng ngày và dùng các cột này để không gửi lặp lại)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('ALTER TABLE documents ADD COLUMN expiry_reminder_stage INTEGER'))
+            conn.execute(text('ALTER TABLE documents ADD COLUMN expiry_reminded_for DATE'))
+            conn.commit()
+        print("Migration completed successfully: Added expiry reminder columns to documents table")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,24 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index phục vụ tìm kiếm nhân viên cho các bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            postgresql = conn.dialect.name == 'postgresql'
+            pattern_ops = ' text_pattern_ops' if postgresql else ''
+            # Index trên cột gốc không dùng được cho lower(...) LIKE, thay bằng index trên lower(cột)
+            conn.execute(text('DROP INDEX IF EXISTS ix_employee_full_name'))
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_employee_full_name_lower ON employee (lower(full_name){pattern_ops})'))
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_employee_code_lower ON employee (lower(employee_code){pattern_ops})'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_employee_status_code ON employee (status, employee_code)'))
+            if postgresql:
+                # Tìm theo đầu từ trong họ tên (LIKE '% abc%') cần index trigram
+                conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_employee_full_name_trgm ON employee USING gin (lower(full_name) gin_trgm_ops)'))
+            conn.commit()
+        print("Migration completed successfully: Added lookup indexes to employee table")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,43 @@
+from app import app, db
+from sqlalchemy import text
+
+def migrate():
+    """
+    Thêm thời lượng, thời gian kết thúc và phòng cho bảng interviews, cùng index kiểm tra trùng phòng.
+    Bảng interview_rooms và interview_panelists được tạo bởi db.create_all() khi khởi động ứng dụng.
+    """
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        timestamp = "TIMESTAMP" if dialect == "postgresql" else "DATETIME"
+        if_not_exists = "IF NOT EXISTS " if dialect == "postgresql" else ""
+        columns = [
+            ("duration_minutes", "INTEGER NOT NULL DEFAULT 60"),
+            ("end_time", timestamp),
+            ("room_id", "INTEGER REFERENCES interview_rooms(id)"),
+        ]
+        
+        for name, definition in columns:
+            try:
+                print(f"Đang thêm trường {name} vào bảng interviews...")
+                db.session.execute(text(f"ALTER TABLE interviews ADD COLUMN {if_not_exists}{name} {definition}"))
+                db.session.commit()
+                print(f"Đã thêm trường {name} thành công!")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Lỗi khi thêm trường {name}: {str(e)}")
+        
+        # Điền thời gian kết thúc cho các buổi phỏng vấn đã có
+        if dialect == "postgresql":
+            end_time = "scheduled_date + duration_minutes * INTERVAL '1 minute'"
+        else:
+            end_time = "datetime(scheduled_date, '+' || duration_minutes || ' minutes')"
+        db.session.execute(text(f"UPDATE interviews SET end_time = {end_time} WHERE end_time IS NULL"))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_interview_room_time ON interviews (room_id, scheduled_date, end_time)"
+        ))
+        db.session.commit()
+        
+        print("Migration completed successfully: interview duration, end_time, room_id and ix_interview_room_time")
+
+if __name__ == "__main__":
+    migrate()
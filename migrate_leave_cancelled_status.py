@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Thêm trạng thái CANCELLED cho đơn nghỉ phép (đơn đã duyệt bị hủy được giữ lại thay vì xóa).
+# PostgreSQL lưu LeaveStatus bằng kiểu enum riêng nên cần thêm giá trị; SQLite lưu dạng chuỗi, không cần đổi.
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text("ALTER TYPE leavestatus ADD VALUE IF NOT EXISTS 'CANCELLED'"))
+                conn.commit()
+        print("Migration completed successfully: Added CANCELLED to leave request statuses")
+
+if __name__ == "__main__":
+    migrate()
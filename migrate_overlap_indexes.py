@@ -0,0 +1,35 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index phục vụ kiểm tra chồng lấn thời gian cho các bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_leave_request_employee_dates '
+                              'ON leave_request (employee_id, start_date, end_date)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_work_schedule_time '
+                              'ON work_schedule (start_time, end_time)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_work_schedule_participant_employee '
+                              'ON work_schedule_participant (employee_id, schedule_id)'))
+            conn.commit()
+        print("Migration completed successfully: Added overlap indexes")
+        
+        # Trên PostgreSQL: ràng buộc EXCLUDE để database tự chặn đơn nghỉ phép trùng nhau
+        if db.engine.dialect.name == 'postgresql':
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+                    conn.execute(text(
+                        "ALTER TABLE leave_request ADD CONSTRAINT leave_request_no_overlap "
+                        "EXCLUDE USING gist (employee_id WITH =, daterange(start_date, end_date, '[]') WITH &&) "
+                        "WHERE (status IN ('PENDING', 'APPROVED'))"
+                    ))
+                    conn.commit()
+                print("Migration completed successfully: Added leave_request_no_overlap constraint")
+            except Exception as e:
+                # Thường do dữ liệu cũ đã có đơn trùng nhau hoặc ràng buộc đã tồn tại
+                print(f"Không thể thêm ràng buộc leave_request_no_overlap: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,21 @@
+from app import app, db
+from sqlalchemy import text
+
+# Thêm ràng buộc duy nhất (evaluation_id, criteria_id) cho bảng đã tồn tại
+# (db.create_all() không thêm ràng buộc vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            # Xóa các dòng điểm trùng lặp, giữ lại dòng mới nhất của mỗi tiêu chí
+            result = conn.execute(text(
+                'DELETE FROM performance_evaluation_detail WHERE id NOT IN ('
+                'SELECT MAX(id) FROM performance_evaluation_detail GROUP BY evaluation_id, criteria_id)'
+            ))
+            print(f"Removed {result.rowcount} duplicate performance_evaluation_detail rows")
+            conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_performance_detail_evaluation_criteria '
+                              'ON performance_evaluation_detail (evaluation_id, criteria_id)'))
+            conn.commit()
+        print("Migration completed successfully: Added uq_performance_detail_evaluation_criteria to performance_evaluation_detail table")
+
+if __name__ == "__main__":
+    migrate()
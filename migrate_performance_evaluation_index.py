@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index bộ lọc danh sách đánh giá hiệu suất cho bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_performance_evaluation_filters '
+                              'ON performance_evaluation (employee_id, evaluation_period, status, start_date)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_performance_evaluation_filters to performance_evaluation table")
+
+if __name__ == "__main__":
+    migrate()
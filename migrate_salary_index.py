@@ -0,0 +1,15 @@
+from app import app, db
+from sqlalchemy import text
+
+# Tạo index tra cứu lương có hiệu lực theo ngày cho bảng đã tồn tại
+# (db.create_all() không thêm index vào bảng cũ)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_employee_salary_employee_effective '
+                              'ON employee_salary (employee_id, effective_date DESC)'))
+            conn.commit()
+        print("Migration completed successfully: Added ix_employee_salary_employee_effective to employee_salary table")
+
+if __name__ == "__main__":
+    migrate()
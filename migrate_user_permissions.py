@@ -0,0 +1,18 @@
+from app import app, db
+from sqlalchemy import text
+from utils_permission_matrix import rebuild_user_permissions
+
+# Tạo index và dựng lại toàn bộ ma trận quyền hiệu lực (bảng user_effective_permissions)
+# (db.create_all() tạo bảng mới nhưng ma trận cần được tính từ vai trò hiện có)
+def migrate():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_user_permission_permission '
+                              'ON user_effective_permissions (permission_id, user_id)'))
+            conn.commit()
+        count = rebuild_user_permissions()
+        db.session.commit()
+        print(f"Migration completed successfully: Rebuilt user_effective_permissions ({count} rows)")
+
+if __name__ == "__main__":
+    migrate()
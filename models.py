@@ -1,6 +1,7 @@
 from datetime import datetime, date
 import enum
 from app import db
+from sqlalchemy import event
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
@@ -65,6 +66,7 @@ class LeaveStatus(enum.Enum):
     PENDING = "Đang chờ xét duyệt"
     APPROVED = "Đã duyệt"
     REJECTED = "Từ chối"
+    CANCELLED = "Đã hủy"
 
 
 class ApproverRole(enum.Enum):
@@ -109,16 +111,23 @@ class User(UserMixin, db.Model):
         if self.is_admin():
             return True
         
-        # Kiểm tra trong các vai trò tùy chỉnh của người dùng
-        for role in self.custom_roles:
-            if not role.is_active:
-                continue
-                
-            for permission in role.permissions:
-                if permission.code == permission_code:
-                    return True
+        return permission_code in self.permission_codes()
+    
+    def permission_codes(self):
+        """
+        Mã các quyền hiệu lực của người dùng, đọc một lần từ ma trận quyền tính sẵn
+        (nhớ trên đối tượng, tức là trong phạm vi một request với current_user)
         
-        return False
+        Returns:
+            frozenset: Các mã quyền
+        """
+        codes = getattr(self, '_permission_codes', None)
+        if codes is None:
+            codes = frozenset(code for code, in db.session.query(Permission.code).join(
+                UserPermission, UserPermission.permission_id == Permission.id
+            ).filter(UserPermission.user_id == self.id))
+            self._permission_codes = codes
+        return codes
     
     def has_role(self, role_name):
         """
@@ -142,22 +151,14 @@ class User(UserMixin, db.Model):
     
     def get_all_permissions(self):
         """
-        Lấy danh sách tất cả các quyền của người dùng
+        Lấy danh sách tất cả các quyền của người dùng (đọc từ ma trận quyền tính sẵn)
         
         Returns:
             list: Danh sách các đối tượng Permission
         """
-        if self.is_admin():
-            return Permission.query.all()
-            
-        permissions = []
-        for role in self.custom_roles:
-            if role.is_active:
-                permissions.extend(role.permissions)
-                
-        # Loại bỏ các quyền trùng lặp
-        unique_permissions = list({p.id: p for p in permissions}.values())
-        return unique_permissions
+        return Permission.query.join(
+            UserPermission, UserPermission.permission_id == Permission.id
+        ).filter(UserPermission.user_id == self.id).order_by(Permission.module, Permission.id).all()
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -179,6 +180,10 @@ class Department(db.Model):
 
 
 class Employee(db.Model):
+    __table_args__ = (
+        db.Index('ix_employee_status_code', 'status', 'employee_code'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
     employee_code = db.Column(db.String(20), unique=True, nullable=False)
@@ -238,7 +243,20 @@ class Employee(db.Model):
         return f'<Employee {self.employee_code} - {self.full_name}>'
 
 
+# Tìm kiếm nhân viên theo tiền tố mã hoặc họ tên không phân biệt hoa thường (/api/employees/lookup);
+# text_pattern_ops để PostgreSQL dùng được index cho LIKE 'abc%' với mọi collation
+db.Index('ix_employee_full_name_lower', db.func.lower(Employee.full_name).label('full_name_lower'),
+         postgresql_ops={'full_name_lower': 'text_pattern_ops'})
+db.Index('ix_employee_code_lower', db.func.lower(Employee.employee_code).label('employee_code_lower'),
+         postgresql_ops={'employee_code_lower': 'text_pattern_ops'})
+
+
 class Attendance(db.Model):
+    __table_args__ = (
+        # Đọc chấm công theo kỳ cho báo cáo tổng hợp (utils_attendance)
+        db.Index('ix_attendance_date_employee', 'date', 'employee_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -252,6 +270,11 @@ class Attendance(db.Model):
 
 
 class LeaveRequest(db.Model):
+    __table_args__ = (
+        # Kiểm tra chồng lấn đơn nghỉ phép theo nhân viên (utils_overlap)
+        db.Index('ix_leave_request_employee_dates', 'employee_id', 'start_date', 'end_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     leave_type = db.Column(db.Enum(LeaveType), nullable=False)
@@ -270,6 +293,47 @@ class LeaveRequest(db.Model):
         return f'<LeaveRequest {self.employee_id} - {self.start_date} to {self.end_date}>'
 
 
+class Holiday(db.Model):
+    """Ngày nghỉ lễ, không tính vào số ngày phép"""
+    __tablename__ = 'holidays'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Holiday {self.date} {self.name}>'
+
+
+class LeaveBalance(db.Model):
+    """Sổ ngày phép theo nhân viên, năm và loại phép"""
+    __tablename__ = 'leave_balances'
+    __table_args__ = (
+        db.UniqueConstraint('employee_id', 'year', 'leave_type', name='uq_leave_balance_employee_year_type'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    leave_type = db.Column(db.Enum(LeaveType), nullable=False)
+    entitled_days = db.Column(db.Float, default=0, nullable=False)  # Số ngày được hưởng trong năm
+    carried_over_days = db.Column(db.Float, default=0, nullable=False)  # Số ngày chuyển từ năm trước
+    used_days = db.Column(db.Float, default=0, nullable=False)  # Số ngày đã dùng (đơn đã duyệt)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    employee = db.relationship('Employee', backref=db.backref('leave_balances', lazy=True))
+    
+    @property
+    def remaining_days(self):
+        """Số ngày phép còn lại"""
+        return (self.entitled_days or 0) + (self.carried_over_days or 0) - (self.used_days or 0)
+    
+    def __repr__(self):
+        return f'<LeaveBalance {self.employee_id} {self.year} {self.leave_type.name}>'
+
+
 class CareerPath(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
@@ -390,6 +454,78 @@ class EmployeeSalary(db.Model):
         return int(self.total_coefficient * self.salary_grade.base_salary)
 
 
+# Tra cứu hồ sơ lương có hiệu lực tại một ngày (utils_salary)
+db.Index('ix_employee_salary_employee_effective',
+         EmployeeSalary.employee_id, EmployeeSalary.effective_date.desc())
+
+
+class PayrollRun(db.Model):
+    """Bảng lương đã chốt của một tháng (không sửa sau khi tạo, tính lại sẽ tạo bảng mới)"""
+    __tablename__ = 'payroll_runs'
+    __table_args__ = (
+        db.Index('ix_payroll_run_period', 'year', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    working_days = db.Column(db.Integer, nullable=False)  # Số ngày làm việc chuẩn trong tháng
+    employee_count = db.Column(db.Integer, default=0, nullable=False)
+    total_gross = db.Column(db.BigInteger, default=0, nullable=False)
+    total_deduction = db.Column(db.BigInteger, default=0, nullable=False)
+    total_net = db.Column(db.BigInteger, default=0, nullable=False)
+    notes = db.Column(db.Text)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    created_by = db.relationship('User', backref=db.backref('payroll_runs', lazy=True))
+    items = db.relationship('PayrollItem', backref='run', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<PayrollRun {self.month}/{self.year} #{self.id}>'
+
+
+class PayrollItem(db.Model):
+    """Dòng lương của một nhân viên trong bảng lương"""
+    __tablename__ = 'payroll_items'
+    __table_args__ = (
+        db.Index('ix_payroll_item_run_employee', 'run_id', 'employee_id'),
+        db.Index('ix_payroll_item_employee', 'employee_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id'), nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    employee_salary_id = db.Column(db.Integer, db.ForeignKey('employee_salary.id'), nullable=False)
+    salary_grade_id = db.Column(db.Integer, db.ForeignKey('salary_grade.id'), nullable=False)
+    base_salary = db.Column(db.Integer, nullable=False)  # Lương cơ sở tại thời điểm tính
+    total_coefficient = db.Column(db.Float, nullable=False)  # Hệ số cơ bản + hệ số phụ cấp
+    gross_salary = db.Column(db.BigInteger, nullable=False)
+    working_days = db.Column(db.Integer, nullable=False)  # Số ngày làm việc phải đi làm
+    days_present = db.Column(db.Integer, default=0, nullable=False)
+    paid_leave_days = db.Column(db.Integer, default=0, nullable=False)
+    unpaid_leave_days = db.Column(db.Integer, default=0, nullable=False)
+    absent_days = db.Column(db.Integer, default=0, nullable=False)  # Không chấm công, không có đơn nghỉ
+    deduction = db.Column(db.BigInteger, default=0, nullable=False)
+    net_salary = db.Column(db.BigInteger, nullable=False)
+
+    employee = db.relationship('Employee', backref=db.backref('payroll_items', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<PayrollItem {self.run_id} - {self.employee_id}>'
+
+
+@event.listens_for(PayrollRun, 'before_update')
+@event.listens_for(PayrollRun, 'before_delete')
+@event.listens_for(PayrollItem, 'before_update')
+@event.listens_for(PayrollItem, 'before_delete')
+def _prevent_payroll_change(mapper, connection, target):
+    """Bảng lương đã chốt không được sửa hoặc xóa"""
+    raise ValueError('Bảng lương đã chốt không thể chỉnh sửa hoặc xóa. Hãy tính lại để tạo bảng lương mới.')
+
+
 class WorkScheduleStatus(enum.Enum):
     """Trạng thái lịch công tác"""
     PENDING = "Chờ phê duyệt"
@@ -427,6 +563,10 @@ class TaskPriority(enum.Enum):
 
 class WorkSchedule(db.Model):
     """Lịch công tác"""
+    __table_args__ = (
+        db.Index('ix_work_schedule_time', 'start_time', 'end_time'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
@@ -453,6 +593,10 @@ class WorkSchedule(db.Model):
 
 class WorkScheduleParticipant(db.Model):
     """Người tham gia lịch công tác"""
+    __table_args__ = (
+        db.Index('ix_work_schedule_participant_employee', 'employee_id', 'schedule_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     schedule_id = db.Column(db.Integer, db.ForeignKey('work_schedule.id'), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
@@ -509,6 +653,11 @@ class PerformanceEvaluationCriteria(db.Model):
 
 class PerformanceEvaluation(db.Model):
     """Đánh giá hiệu suất nhân viên"""
+    __table_args__ = (
+        # Bộ lọc danh sách đánh giá theo nhân viên, kỳ, trạng thái và thời gian
+        db.Index('ix_performance_evaluation_filters', 'employee_id', 'evaluation_period', 'status', 'start_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     evaluator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Người đánh giá
@@ -541,17 +690,28 @@ class PerformanceEvaluation(db.Model):
         if not self.criteria_scores:
             return None
             
-        weighted_scores = [detail.score * detail.criteria.weight for detail in self.criteria_scores if detail.score is not None]
-        total_weight = sum([detail.criteria.weight for detail in self.criteria_scores if detail.score is not None])
+        weighted_sum = 0
+        total_weight = 0
+        for detail in self.criteria_scores:
+            if detail.score is None:
+                continue
+            weight = detail.criteria.weight
+            weighted_sum += detail.score * weight
+            total_weight += weight
         
-        if not weighted_scores or total_weight == 0:
+        if total_weight == 0:
             return None
             
-        return sum(weighted_scores) / total_weight
+        return weighted_sum / total_weight
 
 
 class PerformanceEvaluationDetail(db.Model):
     """Chi tiết đánh giá theo từng tiêu chí"""
+    __table_args__ = (
+        # Mỗi tiêu chí chỉ có một dòng điểm trong một đánh giá (dùng cho upsert trong utils_performance)
+        db.UniqueConstraint('evaluation_id', 'criteria_id', name='uq_performance_detail_evaluation_criteria'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     evaluation_id = db.Column(db.Integer, db.ForeignKey('performance_evaluation.id'), nullable=False)
     criteria_id = db.Column(db.Integer, db.ForeignKey('performance_evaluation_criteria.id'), nullable=False)
@@ -704,6 +864,12 @@ class AssetCategory(enum.Enum):
     FURNITURE = "Nội thất văn phòng"
     OTHER = "Khác"
     
+class DepreciationMethod(enum.Enum):
+    NONE = "Không khấu hao"
+    STRAIGHT_LINE = "Đường thẳng"
+    DECLINING_BALANCE = "Số dư giảm dần"
+
+
 class AssetCategoryModel(db.Model):
     """
     Mô hình danh mục tài sản (thay thế Enum)
@@ -714,6 +880,11 @@ class AssetCategoryModel(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Cấu hình khấu hao áp dụng cho các tài sản thuộc danh mục (utils_depreciation)
+    depreciation_method = db.Column(db.Enum(DepreciationMethod), default=DepreciationMethod.NONE, nullable=False)
+    useful_life_months = db.Column(db.Integer, nullable=True)  # Thời gian sử dụng hữu ích (tháng)
+    salvage_rate = db.Column(db.Float, default=0, nullable=False)  # Giá trị thu hồi ước tính (% nguyên giá)
+    declining_factor = db.Column(db.Float, default=2.0, nullable=False)  # Hệ số điều chỉnh cho số dư giảm dần
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
@@ -749,6 +920,12 @@ class AssetStatus(enum.Enum):
 
 class Asset(db.Model):
     __tablename__ = 'assets'
+    __table_args__ = (
+        # Phiên bản dữ liệu cho ETag của /asset/api/assets (MAX(updated_at))
+        db.Index('ix_asset_updated_at', 'updated_at'),
+        # Báo cáo tài sản sắp hết hạn bảo hành
+        db.Index('ix_asset_warranty_expiry', 'warranty_expiry'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     asset_code = db.Column(db.String(20), unique=True, nullable=False)
@@ -780,6 +957,30 @@ class Asset(db.Model):
         return f'<Asset {self.asset_code}: {self.name}>'
 
 
+class AssetBookValue(db.Model):
+    """
+    Ảnh chụp giá trị còn lại của tài sản vào cuối mỗi tháng (utils_depreciation)
+    """
+    __tablename__ = 'asset_book_values'
+    __table_args__ = (
+        # Lịch sử giá trị còn lại của một tài sản
+        db.Index('ix_asset_book_value_asset_period', 'asset_id', 'period'),
+    )
+    
+    period = db.Column(db.Date, primary_key=True)  # Ngày đầu tháng của kỳ
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id', ondelete='CASCADE'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('asset_categories.id'), nullable=True)
+    cost = db.Column(db.Float, nullable=False)  # Nguyên giá
+    accumulated_depreciation = db.Column(db.Float, nullable=False)
+    book_value = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.now)
+    
+    asset = db.relationship('Asset', backref=db.backref('book_values', lazy='dynamic', passive_deletes=True))
+    
+    def __repr__(self):
+        return f'<AssetBookValue {self.asset_id} {self.period}: {self.book_value}>'
+
+
 class AssetAssignment(db.Model):
     __tablename__ = 'asset_assignments'
     
@@ -826,6 +1027,74 @@ class AssetMaintenance(db.Model):
         return f'<AssetMaintenance {self.asset.name} on {self.maintenance_date}>'
 
 
+class AssetEventType(enum.Enum):
+    """Loại sự kiện trong vòng đời tài sản"""
+    ASSIGNED = "Bàn giao"
+    RETURNED = "Thu hồi"
+    MAINTENANCE_STARTED = "Bắt đầu bảo trì"
+    MAINTENANCE_COMPLETED = "Hoàn thành bảo trì"
+    MARKED_BROKEN = "Báo hỏng"
+    RESTORED = "Khôi phục"
+    DISCARDED = "Thanh lý"
+
+
+class AssetEvent(db.Model):
+    """
+    Nhật ký sự kiện tài sản (chỉ thêm, không sửa/xóa); phát lại theo thứ tự id để dựng lại trạng thái
+    """
+    __tablename__ = 'asset_events'
+    __table_args__ = (
+        # Phát lại lịch sử của một tài sản theo thứ tự
+        db.Index('ix_asset_event_asset_id', 'asset_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id', ondelete='CASCADE'), nullable=False)
+    event_type = db.Column(db.Enum(AssetEventType), nullable=False)
+    occurred_on = db.Column(db.Date, nullable=False, default=date.today)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('asset_assignments.id', ondelete='SET NULL'), nullable=True)
+    maintenance_id = db.Column(db.Integer, db.ForeignKey('asset_maintenance.id', ondelete='SET NULL'), nullable=True)
+    note = db.Column(db.Text, nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    # Relationships
+    asset = db.relationship('Asset', backref=db.backref('events', lazy='dynamic', passive_deletes=True))
+    employee = db.relationship('Employee')
+    created_by = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<AssetEvent {self.asset_id} {self.event_type.name if self.event_type else None}>'
+
+
+class AssetState(db.Model):
+    """
+    Trạng thái hiện tại của tài sản, được cập nhật cùng mỗi sự kiện (projection của asset_events)
+    """
+    __tablename__ = 'asset_states'
+    __table_args__ = (
+        # Tra cứu tài sản nhân viên đang giữ
+        db.Index('ix_asset_state_holder', 'holder_id', 'asset_id'),
+    )
+    
+    asset_id = db.Column(db.Integer, db.ForeignKey('assets.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.Enum(AssetStatus), nullable=False, default=AssetStatus.AVAILABLE)
+    holder_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('asset_assignments.id', ondelete='SET NULL'), nullable=True)
+    open_maintenance = db.Column(db.Integer, nullable=False, default=0)  # Số lần bảo trì đang thực hiện
+    last_event_id = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    # Relationships
+    asset = db.relationship('Asset', backref=db.backref('state', uselist=False, passive_deletes=True))
+    holder = db.relationship('Employee')
+    assignment = db.relationship('AssetAssignment')
+    
+    def __repr__(self):
+        return f'<AssetState {self.asset_id}: {self.status.name if self.status else None} holder={self.holder_id}>'
+
+
 # Recruitment Management Models
 class JobOpeningStatus(enum.Enum):
     DRAFT = "Nháp"
@@ -894,6 +1163,10 @@ class CandidateStatus(enum.Enum):
 
 class Candidate(db.Model):
     __tablename__ = 'candidates'
+    __table_args__ = (
+        # Đếm và phân trang ứng viên theo giai đoạn của đợt tuyển dụng (utils_recruitment)
+        db.Index('ix_candidate_opening_status_date', 'job_opening_id', 'status', 'application_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     job_opening_id = db.Column(db.Integer, db.ForeignKey('job_openings.id'), nullable=False)
@@ -917,6 +1190,33 @@ class Candidate(db.Model):
         return f'<Candidate {self.full_name} for {self.job_opening.position.title}>'
 
 
+class CandidateCvIndex(db.Model):
+    """Kết quả trích xuất văn bản CV của ứng viên, dùng cho xếp hạng BM25 (utils_cv_index)"""
+    __tablename__ = 'candidate_cv_index'
+    
+    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id', ondelete='CASCADE'), primary_key=True)
+    cv_file = db.Column(db.String(255), nullable=True)  # Tham chiếu CV đã được đánh index
+    doc_length = db.Column(db.Integer, default=0, nullable=False)  # Tổng số token của CV
+    error = db.Column(db.String(255), nullable=True)
+    indexed_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<CandidateCvIndex {self.candidate_id} tokens={self.doc_length}>'
+
+
+class CandidateToken(db.Model):
+    """Chỉ mục token đã chuẩn hóa của CV: số lần xuất hiện của mỗi token trong CV của ứng viên"""
+    __tablename__ = 'candidate_tokens'
+    __table_args__ = (
+        # Tra danh sách ứng viên (posting list) theo token khi xếp hạng
+        db.Index('ix_candidate_token_token_candidate', 'token', 'candidate_id'),
+    )
+    
+    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id', ondelete='CASCADE'), primary_key=True)
+    token = db.Column(db.String(64), primary_key=True)
+    tf = db.Column(db.Integer, nullable=False)
+
+
 class InterviewType(enum.Enum):
     PHONE = "Phỏng vấn điện thoại"
     VIDEO = "Phỏng vấn video"
@@ -932,14 +1232,36 @@ class InterviewStatus(enum.Enum):
     RESCHEDULED = "Đã lên lịch lại"
 
 
+class InterviewRoom(db.Model):
+    """Phòng phỏng vấn, dùng để kiểm tra trùng phòng và tìm giờ trống (utils_interview)"""
+    __tablename__ = 'interview_rooms'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    location = db.Column(db.String(200), nullable=True)
+    capacity = db.Column(db.Integer, nullable=True)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<InterviewRoom {self.name}>'
+
+
 class Interview(db.Model):
     __tablename__ = 'interviews'
+    __table_args__ = (
+        # Kiểm tra trùng phòng theo khoảng thời gian (utils_interview)
+        db.Index('ix_interview_room_time', 'room_id', 'scheduled_date', 'end_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), nullable=False)
     scheduled_date = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, default=60, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)  # scheduled_date + duration_minutes
     interview_type = db.Column(db.Enum(InterviewType), nullable=False)
     interviewers = db.Column(db.String(255), nullable=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('interview_rooms.id'), nullable=True)
     location = db.Column(db.String(100), nullable=True)
     status = db.Column(db.Enum(InterviewStatus), default=InterviewStatus.SCHEDULED, nullable=False)
     feedback = db.Column(db.Text, nullable=True)
@@ -949,11 +1271,31 @@ class Interview(db.Model):
     
     # Relationships
     candidate = db.relationship('Candidate', back_populates='interviews')
+    room = db.relationship('InterviewRoom')
+    panelists = db.relationship('InterviewPanelist', back_populates='interview', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Interview for {self.candidate.full_name} on {self.scheduled_date}>'
 
 
+class InterviewPanelist(db.Model):
+    """Nhân viên tham gia phỏng vấn. Thời gian được sao chép từ buổi phỏng vấn để tra trùng lịch trên một index"""
+    __tablename__ = 'interview_panelists'
+    __table_args__ = (
+        # Tra lịch phỏng vấn của người phỏng vấn theo khoảng thời gian (utils_interview)
+        db.Index('ix_interview_panelist_employee_time', 'employee_id', 'start_time', 'end_time'),
+    )
+    
+    interview_id = db.Column(db.Integer, db.ForeignKey('interviews.id', ondelete='CASCADE'), primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    
+    # Relationships
+    interview = db.relationship('Interview', back_populates='panelists')
+    employee = db.relationship('Employee')
+
+
 # Contract Management Models
 class ContractType(enum.Enum):
     PROBATION = "Thử việc"
@@ -972,6 +1314,12 @@ class ContractStatus(enum.Enum):
 
 class Contract(db.Model):
     __tablename__ = 'contracts'
+    __table_args__ = (
+        # Tìm hợp đồng đang hiệu lực đã quá hạn (utils_contract.expire_contracts)
+        db.Index('ix_contract_status_end_date', 'status', 'end_date'),
+        # Hợp đồng hiện hành của nhân viên (đồng bộ ngày hợp đồng của Employee)
+        db.Index('ix_contract_employee_status_start', 'employee_id', 'status', 'start_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     contract_number = db.Column(db.String(50), unique=True, nullable=False)
@@ -1003,6 +1351,48 @@ class Contract(db.Model):
         return f'<Contract {self.contract_number} for {self.employee.full_name}>'
 
 
+class ContractEvent(db.Model):
+    """
+    Nhật ký thay đổi trạng thái hợp đồng (thủ công hoặc do job hết hạn hằng đêm)
+    """
+    __tablename__ = 'contract_events'
+    __table_args__ = (
+        db.Index('ix_contract_event_contract', 'contract_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id', ondelete='CASCADE'), nullable=False)
+    from_status = db.Column(db.Enum(ContractStatus), nullable=True)
+    to_status = db.Column(db.Enum(ContractStatus), nullable=False)
+    changed_on = db.Column(db.Date, nullable=False, default=date.today)
+    source = db.Column(db.String(20), nullable=False, default='manual')  # manual / expiry_job
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    # Relationships
+    contract = db.relationship('Contract', backref=db.backref('events', lazy='dynamic', passive_deletes=True))
+    
+    def __repr__(self):
+        return f'<ContractEvent {self.contract_id}: {self.from_status} -> {self.to_status}>'
+
+
+@event.listens_for(Contract, 'after_insert')
+@event.listens_for(Contract, 'after_update')
+def _sync_contract_dates_on_save(mapper, connection, target):
+    """Đồng bộ ngày hợp đồng của nhân viên khi hợp đồng được thêm hoặc sửa (cùng giao dịch)"""
+    from utils_contract import affected_employee_ids, sync_statement
+    employee_ids = affected_employee_ids(target)
+    if employee_ids:
+        connection.execute(sync_statement(employee_ids))
+
+
+@event.listens_for(Contract, 'after_delete')
+def _sync_contract_dates_on_delete(mapper, connection, target):
+    """Đồng bộ ngày hợp đồng của nhân viên khi hợp đồng bị xóa (cùng giao dịch)"""
+    from utils_contract import affected_employee_ids, sync_statement
+    connection.execute(sync_statement(affected_employee_ids(target, deleted=True)))
+
+
 class ContractAmendment(db.Model):
     __tablename__ = 'contract_amendments'
     
@@ -1039,6 +1429,10 @@ class DocumentType(enum.Enum):
 
 class Document(db.Model):
     __tablename__ = 'documents'
+    __table_args__ = (
+        # Quét giấy tờ sắp hết hạn (utils_document.sweep_expiring_documents)
+        db.Index('ix_document_expiry_verified', 'expiry_date', 'is_verified'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
@@ -1052,6 +1446,9 @@ class Document(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     verified_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     verified_date = db.Column(db.DateTime, nullable=True)
+    # Mốc nhắc hết hạn đã gửi (số ngày trước hạn, -1 là đã hết hạn) và ngày hết hạn mà mốc đó áp dụng
+    expiry_reminder_stage = db.Column(db.Integer, nullable=True)
+    expiry_reminded_for = db.Column(db.Date, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     
@@ -1063,6 +1460,21 @@ class Document(db.Model):
         return f'<Document {self.document_type.value} for {self.employee.full_name}>'
 
 
+class StoredFile(db.Model):
+    """File lưu theo nội dung (SHA-256), dùng chung cho mọi bản ghi tham chiếu cùng nội dung (utils_storage)"""
+    __tablename__ = 'stored_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100), nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<StoredFile {self.sha256} refs={self.ref_count}>'
+
+
 class NotificationEmail(db.Model):
     """Model để lưu danh sách email nhận thông báo"""
     __tablename__ = 'notification_emails'
@@ -1131,3 +1543,23 @@ class Role(db.Model):
     def __repr__(self):
         return f'<Role {self.name}>'
 
+
+class UserPermission(db.Model):
+    """
+    Ma trận quyền hiệu lực người dùng × quyền, tính sẵn từ vai trò (utils_permission_matrix)
+    Admin có mọi quyền; người dùng khác có quyền của các vai trò đang hoạt động được gán.
+    """
+    __tablename__ = 'user_effective_permissions'
+    __table_args__ = (
+        # Ai có quyền X (kiểm tra, đối soát phân quyền)
+        db.Index('ix_user_permission_permission', 'permission_id', 'user_id'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    permission_id = db.Column(db.Integer, db.ForeignKey('permissions.id', ondelete='CASCADE'), primary_key=True)
+    
+    permission = db.relationship('Permission')
+    
+    def __repr__(self):
+        return f'<UserPermission {self.user_id} - {self.permission_id}>'
+
@@ -309,7 +309,7 @@ def check_expiring_contracts(days_threshold=30):
             Contract.end_date.isnot(None),  # Không bao gồm hợp đồng không xác định thời hạn
             Contract.end_date <= expiry_date,
             Contract.end_date > today,
-            Contract.status == ContractStatus.ACTIVE.name
+            Contract.status == ContractStatus.ACTIVE
         ).all()
         
         notification_count = 0
@@ -323,4 +323,87 @@ def check_expiring_contracts(days_threshold=30):
     
     except Exception as e:
         logger.error(f"Lỗi khi kiểm tra hợp đồng sắp hết hạn: {e}")
-        return 0
\ No newline at end of file
+        return 0
+
+def _document_rows_html(documents):
+    """Bảng HTML các giấy tờ sắp hết hạn"""
+    rows = "".join(
+        f"<tr><td>{doc['employee_code']}</td><td>{doc['employee_name']}</td><td>{doc['document_type']}</td>"
+        f"<td>{doc['document_number'] or ''}</td><td>{doc['expiry_date'].strftime('%d/%m/%Y')}</td>"
+        f"<td>{'Đã hết hạn' if doc['days_remaining'] < 0 else str(doc['days_remaining']) + ' ngày'}</td></tr>"
+        for doc in documents
+    )
+    return f"""
+    <table border="1" cellpadding="4" cellspacing="0">
+        <tr><th>Mã NV</th><th>Nhân viên</th><th>Loại giấy tờ</th><th>Số</th><th>Ngày hết hạn</th><th>Còn lại</th></tr>
+        {rows}
+    </table>
+    """
+
+
+def send_document_expiry_notification(to_email, recipient_name, documents):
+    """
+    Gửi một email tổng hợp các giấy tờ sắp hết hạn của nhân viên
+    
+    Args:
+        to_email (str): Email của nhân viên
+        recipient_name (str): Tên nhân viên
+        documents (list): dict {'employee_code', 'employee_name', 'document_type', 'document_number',
+                          'expiry_date', 'days_remaining'}
+    
+    Returns:
+        bool: True nếu gửi thành công, False nếu có lỗi
+    """
+    subject = f"Nhắc nhở: {len(documents)} giấy tờ sắp hết hạn"
+    html_content = f"""
+    <h2>Giấy tờ sắp hết hạn</h2>
+    <p>Chào {recipient_name},</p>
+    <p>Các giấy tờ sau của bạn sắp hết hạn hoặc đã hết hạn. Vui lòng gia hạn và cập nhật bản mới lên hệ thống.</p>
+    {_document_rows_html(documents)}
+    """
+    return send_email_notification(to_email=to_email, subject=subject, html_content=html_content)
+
+
+def send_document_expiry_digest(documents, total, summary):
+    """
+    Gửi bản tổng hợp giấy tờ sắp hết hạn cho bộ phận nhân sự (một lần cho mỗi người nhận)
+    
+    Args:
+        documents (list): Các giấy tờ hết hạn sớm nhất (cùng định dạng send_document_expiry_notification)
+        total (int): Tổng số giấy tờ sắp hết hạn
+        summary (dict): Số giấy tờ theo loại giấy tờ
+    
+    Returns:
+        int: Số người nhận đã gửi thành công (tính cả Telegram)
+    """
+    if not total:
+        return 0
+    
+    summary_lines = "".join(f"<li>{label}: {count}</li>" for label, count in sorted(summary.items()))
+    subject = f"Tổng hợp giấy tờ sắp hết hạn: {total} giấy tờ"
+    html_content = f"""
+    <h2>Giấy tờ nhân viên sắp hết hạn</h2>
+    <p><strong>Tổng số:</strong> {total} giấy tờ</p>
+    <ul>{summary_lines}</ul>
+    <p>{len(documents)} giấy tờ hết hạn sớm nhất:</p>
+    {_document_rows_html(documents)}
+    """
+    
+    sent = 0
+    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+        summary_text = "\n".join(f"• {label}: {count}" for label, count in sorted(summary.items()))
+        if send_telegram_notification(f"📑 <b>Giấy tờ sắp hết hạn: {total}</b>\n\n{summary_text}"):
+            sent += 1
+    
+    if SENDGRID_API_KEY:
+        from models import NotificationEmail
+        recipients = NotificationEmail.query.filter(
+            (NotificationEmail.is_active == True) & (
+                (NotificationEmail.notification_types == 'all') |
+                (NotificationEmail.notification_types == 'documents')
+            )
+        ).all()
+        for recipient in recipients:
+            if send_email_notification(to_email=recipient.email, subject=subject, html_content=html_content):
+                sent += 1
+    return sent
@@ -0,0 +1,47 @@
+"""
+Script để chuyển sổ ngày phép sang năm mới cho tất cả nhân viên đang làm việc
+Script này có thể được chạy tự động thông qua cron vào đầu mỗi năm
+"""
+import sys
+import logging
+from datetime import date
+from app import app
+from utils_leave import rollover_leave_balances
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python rollover_leave.py [from_year]
+    - from_year: Năm cần chuyển số dư (mặc định năm trước)
+    """
+    try:
+        from_year = date.today().year - 1
+        if len(sys.argv) > 1:
+            from_year = int(sys.argv[1])
+        
+        logger.info(f"Chuyển sổ ngày phép từ năm {from_year} sang năm {from_year + 1}...")
+        
+        with app.app_context():
+            count = rollover_leave_balances(from_year)
+            
+            logger.info(f"Đã hoàn thành, {count} sổ phép đã được tạo.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
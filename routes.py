@@ -9,8 +9,8 @@ import os
 import json
 import pandas as pd
 from sqlalchemy import func, desc
-from wtforms import FloatField, TextAreaField
-from wtforms.validators import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from flask_wtf import FlaskForm
 
 from app import app, db
@@ -26,21 +26,30 @@ app.register_blueprint(recruitment_bp, url_prefix='/recruitment')
 app.register_blueprint(contract_bp, url_prefix='/contracts')
 app.register_blueprint(notification_bp)
 app.register_blueprint(permission_bp)
-from models import (User, Department, Employee, Attendance, LeaveRequest, CareerPath, Gender, 
+from models import (User, Department, Employee, Attendance, LeaveRequest, LeaveBalance, CareerPath, Gender, 
                    EmployeeStatus, UserRole, LeaveStatus, LeaveType, Award, AwardType, 
-                   SalaryGrade, EmployeeSalary, PerformanceEvaluationCriteria, PerformanceEvaluation, 
+                   SalaryGrade, EmployeeSalary, PayrollRun, PayrollItem, PerformanceEvaluationCriteria, PerformanceEvaluation, 
                    PerformanceEvaluationDetail, PerformanceRatingPeriod, PerformanceRatingStatus,
                    Position, CustomPosition, Task, TaskStatus, TaskPriority, TaskComment, 
                    TaskAttachment, TaskDependency)
 from forms import (LoginForm, RegisterForm, DepartmentForm, EmployeeForm, EmployeeEditForm, EditUserForm,
                   LeaveRequestForm, CareerPathForm, AttendanceReportForm, EmployeeImportForm,
                   AwardForm, AwardEditForm, EmployeeFilterForm, 
-                  SalaryGradeForm, SalaryGradeEditForm, EmployeeSalaryForm, EmployeeSalaryEditForm,
+                  SalaryGradeForm, SalaryGradeEditForm, EmployeeSalaryForm, EmployeeSalaryEditForm, PayrollRunForm,
                   PerformanceCriteriaForm, PerformanceEvaluationForm, PerformanceCriteriaScoreForm,
-                  EmployeePerformanceFeedbackForm, PerformanceApprovalForm, PerformanceFilterForm,
+                  EmployeePerformanceFeedbackForm, PerformanceApprovalForm, PerformanceFilterForm, PerformanceAnalyticsForm,
                   CustomPositionForm, CustomPositionEditForm, TaskForm, TaskEditForm, TaskCommentForm,
                   TaskSearchForm, TaskBulkActionForm)
 from utils import save_profile_image, export_employees_to_excel, export_attendance_to_excel, process_employee_import, create_sample_import_file
+from utils_cache import invalidate, DEPARTMENTS, CUSTOM_POSITIONS, SALARY_GRADES, EMPLOYEE_KEYS
+from utils_leave import check_leave_balance, apply_leave_request, release_leave_request
+from utils_overlap import find_leave_conflict
+from utils_attendance import attendance_summary as build_attendance_summary
+from utils_payroll import create_payroll_run
+from utils_salary import get_salary_as_of, salary_as_of_ids
+from utils_performance import get_evaluation_details, save_evaluation_scores
+from utils_performance_analytics import get_performance_analytics, invalidate_performance_analytics
+from utils_profile import get_profile
 
 
 # Admin required decorator
@@ -54,6 +63,16 @@ def admin_required(f):
     return login_required(decorated_function)
 
 
+@app.template_filter('date_vn')
+def date_vn(value):
+    """Hiển thị ngày (date hoặc chuỗi ISO trong dữ liệu cache) dạng dd/mm/YYYY"""
+    if not value:
+        return ''
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime('%d/%m/%Y')
+
+
 # Routes
 @app.route('/')
 def index():
@@ -227,6 +246,7 @@ def create_position():
         )
         db.session.add(position)
         db.session.commit()
+        invalidate(CUSTOM_POSITIONS)
         flash('Vị trí mới đã được tạo thành công!', 'success')
         return redirect(url_for('positions'))
     
@@ -244,6 +264,7 @@ def edit_position(id):
         position.name = form.name.data
         position.description = form.description.data
         db.session.commit()
+        invalidate(CUSTOM_POSITIONS)
         flash('Vị trí đã được cập nhật thành công!', 'success')
         return redirect(url_for('positions'))
     
@@ -264,6 +285,7 @@ def delete_position(id):
     
     db.session.delete(position)
     db.session.commit()
+    invalidate(CUSTOM_POSITIONS)
     flash('Vị trí đã được xóa thành công!', 'success')
     return redirect(url_for('positions'))
 
@@ -447,6 +469,7 @@ def create_department():
         )
         db.session.add(department)
         db.session.commit()
+        invalidate(DEPARTMENTS)
         flash('Phòng ban mới đã được tạo thành công!', 'success')
         return redirect(url_for('departments'))
     
@@ -463,6 +486,7 @@ def edit_department(id):
         department.name = form.name.data
         department.description = form.description.data
         db.session.commit()
+        invalidate(DEPARTMENTS)
         flash('Phòng ban đã được cập nhật thành công!', 'success')
         return redirect(url_for('departments'))
     
@@ -481,6 +505,7 @@ def delete_department(id):
     
     db.session.delete(department)
     db.session.commit()
+    invalidate(DEPARTMENTS)
     flash('Phòng ban đã được xóa thành công!', 'success')
     return redirect(url_for('departments'))
 
@@ -685,6 +710,7 @@ def create_employee():
         
         db.session.add(employee)
         db.session.commit()
+        invalidate(*EMPLOYEE_KEYS)
         
         # Create initial career path entry
         career_path = CareerPath(
@@ -737,6 +763,7 @@ def edit_employee(id):
         employee.status = EmployeeStatus[form.status.data]
         
         db.session.commit()
+        invalidate(*EMPLOYEE_KEYS)
         flash('Thông tin nhân viên đã được cập nhật thành công!', 'success')
         return redirect(url_for('view_employee', id=employee.id))
     
@@ -753,17 +780,29 @@ def view_employee(id):
         flash('Bạn không có quyền xem thông tin của nhân viên này.', 'danger')
         return redirect(url_for('index'))
     
-    career_paths = CareerPath.query.filter_by(employee_id=id).order_by(CareerPath.start_date.desc()).all()
-    leave_requests = LeaveRequest.query.filter_by(employee_id=id).order_by(LeaveRequest.created_at.desc()).all()
+    # Các danh sách liên quan lấy từ hồ sơ tổng hợp (có cache theo nhân viên)
+    profile = get_profile(id)
     
     return render_template(
         'employees/view.html', 
         employee=employee, 
-        career_paths=career_paths, 
-        leave_requests=leave_requests
+        profile=profile
     )
 
 
+@app.route('/api/employees/<int:id>/profile')
+@login_required
+def api_employee_profile(id):
+    """Hồ sơ tổng hợp của nhân viên: lộ trình, nghỉ phép, khen thưởng, lương, hợp đồng, giấy tờ, tài sản"""
+    if not current_user.is_admin() and (not current_user.employee or current_user.employee.id != id):
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    profile = get_profile(id)
+    if profile is None:
+        abort(404)
+    return jsonify(profile)
+
+
 @app.route('/employees/<int:id>/delete', methods=['POST'])
 @admin_required
 def delete_employee(id):
@@ -772,6 +811,7 @@ def delete_employee(id):
     # Update status to LEAVE instead of deleting
     employee.status = EmployeeStatus.LEAVE
     db.session.commit()
+    invalidate(*EMPLOYEE_KEYS)
     
     flash('Nhân viên đã được chuyển sang trạng thái nghỉ việc!', 'success')
     return redirect(url_for('employees'))
@@ -800,6 +840,7 @@ def import_employees():
             update_existing=form.update_existing.data,
             default_department_id=form.department_id.data if form.department_id.data > 0 else None
         )
+        invalidate(*EMPLOYEE_KEYS)
         
         if import_results['added'] > 0 or import_results['updated'] > 0:
             flash(f"Nhập dữ liệu thành công! Đã thêm {import_results['added']} và cập nhật {import_results['updated']} nhân viên.", 'success')
@@ -1048,6 +1089,44 @@ def attendance_report():
     return render_template('attendance/report.html', form=form, has_results=False)
 
 
+@app.route('/attendance/summary', methods=['GET', 'POST'])
+@admin_required
+def attendance_summary():
+    """Báo cáo tổng hợp chấm công theo nhân viên và phòng ban"""
+    form = AttendanceReportForm()
+    
+    if form.validate_on_submit() and form.validate_dates():
+        summary = build_attendance_summary(
+            form.start_date.data,
+            form.end_date.data,
+            employee_id=form.employee_id.data if form.employee_id.data and form.employee_id.data > 0 else None
+        )
+        return render_template('attendance/summary.html', form=form, summary=summary, has_results=True)
+    
+    return render_template('attendance/summary.html', form=form, has_results=False)
+
+
+@app.route('/api/attendance/summary')
+@admin_required
+def api_attendance_summary():
+    """API tổng hợp chấm công: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD[&employee_id=&department_id=]"""
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({"error": "Tham số start_date và end_date (YYYY-MM-DD) là bắt buộc"}), 400
+    
+    if start_date > end_date:
+        return jsonify({"error": "Ngày kết thúc phải sau ngày bắt đầu"}), 400
+    
+    return jsonify(build_attendance_summary(
+        start_date,
+        end_date,
+        employee_id=request.args.get('employee_id', type=int),
+        department_id=request.args.get('department_id', type=int)
+    ))
+
+
 @app.route('/attendance/export', methods=['POST'])
 @admin_required
 def export_attendance():
@@ -1088,11 +1167,13 @@ def leave_requests():
             return redirect(url_for('index'))
         
         leave_requests = LeaveRequest.query.filter_by(employee_id=employee.id).order_by(LeaveRequest.created_at.desc()).all()
+        leave_balances = LeaveBalance.query.filter_by(employee_id=employee.id, year=date.today().year).all()
         
         return render_template(
             'leave/index.html',
             employee=employee,
-            leave_requests=leave_requests
+            leave_requests=leave_requests,
+            leave_balances=leave_balances
         )
 
 
@@ -1118,6 +1199,21 @@ def create_leave_request():
     form = LeaveRequestForm()
     
     if form.validate_on_submit() and form.validate_dates():
+        # Kiểm tra số ngày phép còn lại trước khi gửi đơn
+        has_balance, message = check_leave_balance(
+            employee.id, LeaveType[form.leave_type.data], form.start_date.data, form.end_date.data
+        )
+        if not has_balance:
+            flash(message, 'danger')
+            return render_template('leave/create.html', form=form, employee=employee)
+        
+        # Không cho phép đơn trùng với đơn đang chờ duyệt hoặc đã duyệt
+        conflict = find_leave_conflict(employee.id, form.start_date.data, form.end_date.data)
+        if conflict:
+            flash(f'Đã có đơn nghỉ phép từ {conflict.start_date.strftime("%d/%m/%Y")} đến '
+                  f'{conflict.end_date.strftime("%d/%m/%Y")} trùng với khoảng thời gian này.', 'danger')
+            return render_template('leave/create.html', form=form, employee=employee)
+        
         leave_request = LeaveRequest(
             employee_id=employee.id,
             leave_type=LeaveType[form.leave_type.data],
@@ -1127,7 +1223,13 @@ def create_leave_request():
             status=LeaveStatus.PENDING
         )
         db.session.add(leave_request)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Ràng buộc chống trùng (PostgreSQL) chặn đơn được gửi đồng thời
+            db.session.rollback()
+            flash('Khoảng thời gian này trùng với một đơn nghỉ phép khác.', 'danger')
+            return render_template('leave/create.html', form=form, employee=employee)
         flash('Yêu cầu nghỉ phép đã được gửi thành công!', 'success')
         return redirect(url_for('leave_requests'))
     
@@ -1141,12 +1243,34 @@ def approve_leave_request(id):
     
     if leave_request.status != LeaveStatus.PENDING:
         flash('Yêu cầu nghỉ phép này đã được xử lý.', 'warning')
-    else:
+        return redirect(url_for('leave_requests'))
+    
+    has_balance, message = check_leave_balance(
+        leave_request.employee_id, leave_request.leave_type, leave_request.start_date, leave_request.end_date
+    )
+    if not has_balance:
+        flash(message, 'danger')
+        return redirect(url_for('leave_requests'))
+    
+    conflict = find_leave_conflict(leave_request.employee_id, leave_request.start_date, leave_request.end_date,
+                                   exclude_id=leave_request.id, statuses=(LeaveStatus.APPROVED,))
+    if conflict:
+        flash(f'Không thể phê duyệt: nhân viên đã có đơn nghỉ phép từ {conflict.start_date.strftime("%d/%m/%Y")} '
+              f'đến {conflict.end_date.strftime("%d/%m/%Y")} trùng thời gian.', 'danger')
+        return redirect(url_for('leave_requests'))
+    
+    try:
+        # Cập nhật trạng thái đơn và sổ phép trong cùng một transaction
         leave_request.status = LeaveStatus.APPROVED
         leave_request.reviewed_by = current_user.id
         leave_request.reviewed_at = datetime.now()
+        apply_leave_request(leave_request)
         db.session.commit()
         flash('Yêu cầu nghỉ phép đã được phê duyệt!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Lỗi khi phê duyệt đơn nghỉ phép: {e}")
+        flash(f'Có lỗi xảy ra khi phê duyệt đơn nghỉ phép: {str(e)}', 'danger')
     
     return redirect(url_for('leave_requests'))
 
@@ -1179,12 +1303,25 @@ def cancel_leave_request(id):
         flash('Bạn không có quyền hủy yêu cầu nghỉ phép này.', 'danger')
         return redirect(url_for('leave_requests'))
     
-    if leave_request.status != LeaveStatus.PENDING:
-        flash('Chỉ có thể hủy yêu cầu đang chờ xét duyệt.', 'warning')
+    # Nhân viên chỉ hủy được đơn đang chờ duyệt, admin có thể hủy cả đơn đã duyệt
+    if leave_request.status == LeaveStatus.PENDING or (current_user.is_admin() and leave_request.status == LeaveStatus.APPROVED):
+        try:
+            if leave_request.status == LeaveStatus.APPROVED:
+                # Đơn đã duyệt được giữ lại với trạng thái đã hủy để còn lịch sử, ngày phép được hoàn trả
+                release_leave_request(leave_request)
+                leave_request.status = LeaveStatus.CANCELLED
+                leave_request.reviewed_by = current_user.id
+                leave_request.reviewed_at = datetime.now()
+            else:
+                db.session.delete(leave_request)
+            db.session.commit()
+            flash('Yêu cầu nghỉ phép đã được hủy!', 'success')
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Lỗi khi hủy đơn nghỉ phép: {e}")
+            flash(f'Có lỗi xảy ra khi hủy đơn nghỉ phép: {str(e)}', 'danger')
     else:
-        db.session.delete(leave_request)
-        db.session.commit()
-        flash('Yêu cầu nghỉ phép đã được hủy!', 'success')
+        flash('Chỉ có thể hủy yêu cầu đang chờ xét duyệt.', 'warning')
     
     return redirect(url_for('leave_requests'))
 
@@ -1228,6 +1365,43 @@ def get_employee(id):
     })
 
 
+@app.route('/api/employees/lookup')
+@login_required
+def employee_lookup():
+    """Tìm nhân viên theo tiền tố mã hoặc họ tên, dùng cho ô chọn nhân viên tìm kiếm từ xa"""
+    q = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+    active_only = request.args.get('active', 1, type=int)
+    
+    if not q:
+        return jsonify({"results": []})
+    
+    base_query = Employee.query.with_entities(Employee.id, Employee.employee_code, Employee.full_name)
+    if active_only:
+        base_query = base_query.filter(Employee.status == EmployeeStatus.ACTIVE)
+    
+    # Tìm theo tiền tố trên lower(cột) (dùng index lower(...) text_pattern_ops), ký tự đại diện được thoát
+    pattern = q.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    code = func.lower(Employee.employee_code)
+    full_name = func.lower(Employee.full_name)
+    rows = base_query.filter(
+        db.or_(code.like(pattern, escape='\\'), full_name.like(pattern, escape='\\'))
+    ).order_by(Employee.employee_code).limit(limit).all()
+    
+    # Tên tiếng Việt thường được tìm theo tên riêng (từ cuối), bổ sung khi chưa đủ kết quả
+    # (trên PostgreSQL dùng index trigram ix_employee_full_name_trgm)
+    if len(rows) < limit:
+        found_ids = [r.id for r in rows]
+        more = base_query.filter(full_name.like('% ' + pattern, escape='\\'))
+        if found_ids:
+            more = more.filter(~Employee.id.in_(found_ids))
+        rows += more.order_by(Employee.employee_code).limit(limit - len(rows)).all()
+    
+    return jsonify({
+        "results": [{"id": r.id, "text": f"{r.employee_code} - {r.full_name}"} for r in rows]
+    })
+
+
 @app.route('/api/dashboard/stats')
 @login_required
 def dashboard_stats():
@@ -1290,6 +1464,7 @@ def create_salary_grade():
             )
             db.session.add(salary_grade)
             db.session.commit()
+            invalidate(SALARY_GRADES)
             flash('Bậc lương mới đã được tạo thành công!', 'success')
             return redirect(url_for('salary_grades'))
         except Exception as e:
@@ -1313,6 +1488,7 @@ def edit_salary_grade(id):
             salary_grade.base_salary = int(form.base_salary.data)
             salary_grade.description = form.description.data
             db.session.commit()
+            invalidate(SALARY_GRADES)
             flash('Bậc lương đã được cập nhật thành công!', 'success')
             return redirect(url_for('salary_grades'))
         except Exception as e:
@@ -1335,6 +1511,7 @@ def delete_salary_grade(id):
     try:
         db.session.delete(salary_grade)
         db.session.commit()
+        invalidate(SALARY_GRADES)
         flash('Bậc lương đã được xóa thành công!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1347,21 +1524,70 @@ def delete_salary_grade(id):
 @app.route('/employee-salaries')
 @admin_required
 def employee_salaries():
-    salaries = db.session.query(
+    # Mặc định chỉ hiển thị lương đang áp dụng, lịch sử đầy đủ được phân trang
+    view = request.args.get('view', 'current')
+    page = request.args.get('page', 1, type=int)
+    per_page = 50
+    
+    query = db.session.query(
         EmployeeSalary, 
         Employee, 
-        SalaryGrade
+        SalaryGrade,
+        Department.name
     ).join(
         Employee, 
         EmployeeSalary.employee_id == Employee.id
     ).join(
         SalaryGrade, 
         EmployeeSalary.salary_grade_id == SalaryGrade.id
-    ).order_by(
-        desc(EmployeeSalary.effective_date)
-    ).all()
+    ).join(
+        Department,
+        Employee.department_id == Department.id
+    )
     
-    return render_template('employee_salaries/index.html', salaries=salaries)
+    if view == 'history':
+        query = query.order_by(desc(EmployeeSalary.effective_date), desc(EmployeeSalary.id))
+    else:
+        view = 'current'
+        query = query.filter(EmployeeSalary.id.in_(salary_as_of_ids())).order_by(Employee.employee_code)
+    
+    pagination = query.paginate(page=page, per_page=per_page)
+    
+    return render_template('employee_salaries/index.html', salaries=pagination.items,
+                           pagination=pagination, view=view)
+
+
+@app.route('/api/employees/<int:id>/salary')
+@admin_required
+def api_employee_salary_as_of(id):
+    """Hồ sơ lương của nhân viên có hiệu lực tại ngày ?date=YYYY-MM-DD (mặc định hôm nay)"""
+    Employee.query.get_or_404(id)
+    try:
+        as_of = datetime.strptime(request.args['date'], '%Y-%m-%d').date() if request.args.get('date') else date.today()
+    except ValueError:
+        return jsonify({"error": "Ngày không hợp lệ, định dạng YYYY-MM-DD"}), 400
+    
+    salary = get_salary_as_of(id, as_of)
+    if salary is None:
+        return jsonify({'employee_id': id, 'date': as_of.isoformat(), 'salary': None})
+    
+    grade = salary.salary_grade
+    return jsonify({
+        'employee_id': id,
+        'date': as_of.isoformat(),
+        'salary': {
+            'id': salary.id,
+            'salary_grade_id': grade.id,
+            'salary_grade_code': grade.code,
+            'base_coefficient': grade.base_coefficient,
+            'additional_coefficient': salary.additional_coefficient or 0,
+            'base_salary': grade.base_salary,
+            'calculated_salary': int((grade.base_coefficient + (salary.additional_coefficient or 0)) * grade.base_salary),
+            'effective_date': salary.effective_date.isoformat(),
+            'end_date': salary.end_date.isoformat() if salary.end_date else None,
+            'decision_number': salary.decision_number
+        }
+    })
 
 
 @app.route('/employee-salaries/create', methods=['GET', 'POST'])
@@ -1435,6 +1661,11 @@ def edit_employee_salary(id):
 def delete_employee_salary(id):
     employee_salary = EmployeeSalary.query.get_or_404(id)
     
+    # Hồ sơ lương đã dùng trong bảng lương đã chốt thì không được xóa
+    if PayrollItem.query.filter_by(employee_salary_id=id).first():
+        flash('Không thể xóa thông tin lương vì đã được dùng trong bảng lương.', 'danger')
+        return redirect(url_for('employee_salaries'))
+    
     try:
         db.session.delete(employee_salary)
         db.session.commit()
@@ -1446,6 +1677,62 @@ def delete_employee_salary(id):
     return redirect(url_for('employee_salaries'))
 
 
+# Payroll
+@app.route('/payroll')
+@admin_required
+def payroll_runs():
+    runs = PayrollRun.query.order_by(desc(PayrollRun.year), desc(PayrollRun.month), desc(PayrollRun.id)).all()
+    form = PayrollRunForm()
+    return render_template('payroll/index.html', runs=runs, form=form)
+
+
+@app.route('/payroll/run', methods=['POST'])
+@admin_required
+def run_payroll():
+    form = PayrollRunForm()
+    if form.validate_on_submit():
+        try:
+            run = create_payroll_run(form.year.data, form.month.data,
+                                     created_by_id=current_user.id, notes=form.notes.data)
+            flash(f'Đã tính bảng lương tháng {run.month}/{run.year} cho {run.employee_count} nhân viên.', 'success')
+            return redirect(url_for('view_payroll_run', id=run.id))
+        except Exception as e:
+            logging.error(f"Lỗi khi tính bảng lương: {str(e)}")
+            flash(f'Lỗi khi tính bảng lương: {str(e)}', 'danger')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, 'danger')
+    
+    return redirect(url_for('payroll_runs'))
+
+
+@app.route('/payroll/<int:id>')
+@admin_required
+def view_payroll_run(id):
+    run = PayrollRun.query.get_or_404(id)
+    page = request.args.get('page', 1, type=int)
+    per_page = 50
+    
+    pagination = db.session.query(
+        PayrollItem,
+        Employee,
+        SalaryGrade
+    ).join(
+        Employee,
+        PayrollItem.employee_id == Employee.id
+    ).join(
+        SalaryGrade,
+        PayrollItem.salary_grade_id == SalaryGrade.id
+    ).filter(
+        PayrollItem.run_id == run.id
+    ).order_by(
+        Employee.employee_code
+    ).paginate(page=page, per_page=per_page)
+    
+    return render_template('payroll/view.html', run=run, items=pagination.items, pagination=pagination)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -1557,42 +1844,141 @@ def delete_performance_criteria(id):
 
 
 # Quản lý đánh giá hiệu suất
-@app.route('/performance/evaluations')
-@login_required
-def performance_evaluations():
-    filter_form = PerformanceFilterForm(request.args)
-    
-    # Tạo query cơ sở
-    query = PerformanceEvaluation.query
+def _performance_evaluation_query(filter_form):
+    """
+    Tạo query danh sách đánh giá theo bộ lọc, nạp sẵn nhân viên và người đánh giá.
+    Trả về None nếu người dùng không được xem đánh giá nào.
+    """
+    query = PerformanceEvaluation.query.options(
+        joinedload(PerformanceEvaluation.employee),
+        joinedload(PerformanceEvaluation.evaluator)
+    )
     
-    # Áp dụng các bộ lọc
-    if request.args.get('employee_id') and int(request.args.get('employee_id')) != 0:
-        query = query.filter(PerformanceEvaluation.employee_id == request.args.get('employee_id'))
+    # Áp dụng các bộ lọc (thứ tự khớp index ix_performance_evaluation_filters)
+    if filter_form.employee_id.data:
+        query = query.filter(PerformanceEvaluation.employee_id == filter_form.employee_id.data)
     
-    if request.args.get('evaluation_period'):
+    if request.args.get('evaluation_period') in PerformanceRatingPeriod.__members__:
         query = query.filter(PerformanceEvaluation.evaluation_period == request.args.get('evaluation_period'))
         
-    if request.args.get('status'):
+    if request.args.get('status') in PerformanceRatingStatus.__members__:
         query = query.filter(PerformanceEvaluation.status == request.args.get('status'))
         
-    if request.args.get('start_date'):
-        query = query.filter(PerformanceEvaluation.start_date >= request.args.get('start_date'))
+    if filter_form.start_date.data:
+        query = query.filter(PerformanceEvaluation.start_date >= filter_form.start_date.data)
         
-    if request.args.get('end_date'):
-        query = query.filter(PerformanceEvaluation.end_date <= request.args.get('end_date'))
+    if filter_form.end_date.data:
+        query = query.filter(PerformanceEvaluation.end_date <= filter_form.end_date.data)
     
     # Nếu không phải admin, chỉ xem đánh giá của mình
-    if not current_user.is_admin:
-        # Kiểm tra xem user có thông tin employee không
-        if hasattr(current_user, 'employee'):
-            query = query.filter(PerformanceEvaluation.employee_id == current_user.employee.id)
-        else:
-            # Nếu không có thông tin employee, không có đánh giá nào được hiển thị
-            evaluations = []
-            return render_template('performance/evaluation_index.html', evaluations=evaluations, filter_form=filter_form)
+    if not current_user.is_admin():
+        if not current_user.employee:
+            return None
+        query = query.filter(PerformanceEvaluation.employee_id == current_user.employee.id)
+    
+    return query
+
+
+def _paginate_performance_evaluations(query, per_page=50):
+    """
+    Phân trang keyset theo id giảm dần: ?after=<id> lấy trang tiếp theo, ?before=<id> lấy trang trước.
+    Mỗi trang chỉ đọc per_page + 1 dòng, không dùng OFFSET và COUNT.
+
+    Returns:
+        tuple: (danh sách đánh giá, id cho trang trước hoặc None, id cho trang sau hoặc None)
+    """
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    
+    if before:
+        rows = query.filter(PerformanceEvaluation.id > before) \
+            .order_by(PerformanceEvaluation.id.asc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        prev_cursor = rows[0].id if rows and has_more else None
+        next_cursor = rows[-1].id if rows else None
+    else:
+        if after:
+            query = query.filter(PerformanceEvaluation.id < after)
+        rows = query.order_by(PerformanceEvaluation.id.desc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        prev_cursor = rows[0].id if rows and after else None
+        next_cursor = rows[-1].id if rows and has_more else None
+    
+    return rows, prev_cursor, next_cursor
+
+
+@app.route('/performance/evaluations')
+@login_required
+def performance_evaluations():
+    filter_form = PerformanceFilterForm(request.args, meta={'csrf': False})
+    
+    query = _performance_evaluation_query(filter_form)
+    if query is None:
+        # Nếu không có thông tin employee, không có đánh giá nào được hiển thị
+        return render_template('performance/evaluation_index.html', evaluations=[], filter_form=filter_form,
+                               prev_cursor=None, next_cursor=None, filter_args={})
+    
+    evaluations, prev_cursor, next_cursor = _paginate_performance_evaluations(query)
+    filter_args = {key: value for key, value in request.args.items() if key not in ('after', 'before') and value}
+    return render_template('performance/evaluation_index.html', evaluations=evaluations, filter_form=filter_form,
+                           prev_cursor=prev_cursor, next_cursor=next_cursor, filter_args=filter_args)
+
+
+@app.route('/api/performance/evaluations')
+@login_required
+def api_performance_evaluations():
+    filter_form = PerformanceFilterForm(request.args, meta={'csrf': False})
+    per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
     
-    evaluations = query.order_by(PerformanceEvaluation.id.desc()).all()
-    return render_template('performance/evaluation_index.html', evaluations=evaluations, filter_form=filter_form)
+    query = _performance_evaluation_query(filter_form)
+    if query is None:
+        return jsonify({"items": [], "prev_cursor": None, "next_cursor": None})
+    
+    evaluations, prev_cursor, next_cursor = _paginate_performance_evaluations(query, per_page)
+    return jsonify({
+        "items": [{
+            "id": e.id,
+            "employee_id": e.employee_id,
+            "employee_code": e.employee.employee_code,
+            "employee_name": e.employee.full_name,
+            "evaluator": e.evaluator.username if e.evaluator else None,
+            "evaluation_period": e.evaluation_period.name,
+            "start_date": e.start_date.isoformat(),
+            "end_date": e.end_date.isoformat(),
+            "overall_score": e.overall_score,
+            "status": e.status.name if e.status else None
+        } for e in evaluations],
+        "prev_cursor": prev_cursor,
+        "next_cursor": next_cursor
+    })
+
+
+@app.route('/performance/analytics')
+@admin_required
+def performance_analytics():
+    form = PerformanceAnalyticsForm(request.args, meta={'csrf': False})
+    form.validate()
+    
+    analytics = None
+    if not form.year.errors and form.evaluation_period.data in PerformanceRatingPeriod.__members__:
+        analytics = get_performance_analytics(form.evaluation_period.data, form.year.data,
+                                              form.department_id.data or None)
+    
+    return render_template('performance/analytics.html', form=form, analytics=analytics)
+
+
+@app.route('/api/performance/analytics')
+@admin_required
+def api_performance_analytics():
+    period = request.args.get('period', PerformanceRatingPeriod.QUARTERLY.name)
+    if period not in PerformanceRatingPeriod.__members__:
+        return jsonify({"error": "Kỳ đánh giá không hợp lệ"}), 400
+    year = request.args.get('year', date.today().year, type=int)
+    department_id = request.args.get('department_id', type=int)
+    
+    return jsonify(get_performance_analytics(period, year, department_id or None))
 
 
 @app.route('/performance/evaluations/create', methods=['GET', 'POST'])
@@ -1681,6 +2067,8 @@ def edit_performance_evaluation(id):
         if not form.validate_dates():
             return render_template('performance/evaluation_create.html', form=form)
         
+        # Thống kê của cả kỳ/phòng ban cũ và mới đều bị ảnh hưởng
+        invalidate_performance_analytics(evaluation)
         evaluation.employee_id = form.employee_id.data
         evaluation.evaluation_period = form.evaluation_period.data
         evaluation.start_date = form.start_date.data
@@ -1689,6 +2077,9 @@ def edit_performance_evaluation(id):
         evaluation.strengths = form.strengths.data
         evaluation.areas_for_improvement = form.areas_for_improvement.data
         evaluation.goals_for_next_period = form.goals_for_next_period.data
+        db.session.flush()
+        db.session.expire(evaluation)
+        invalidate_performance_analytics(evaluation)
         
         db.session.commit()
         
@@ -1718,77 +2109,54 @@ def score_performance_evaluation(id):
         flash('Đánh giá này không thể điều chỉnh điểm vì đã được gửi đi.', 'danger')
         return redirect(url_for('view_performance_evaluation', id=evaluation.id))
     
-    # Lấy danh sách các tiêu chí đánh giá
-    criteria_list = PerformanceEvaluationCriteria.query.filter_by(is_active=True).all()
-    
-    # Tạo form với các trường động cho từng tiêu chí
-    class CriteriaScoreForm(FlaskForm):
-        pass
-    
-    for i, criteria in enumerate(criteria_list):
-        setattr(CriteriaScoreForm, f'criteria_{i}_score', FloatField(f'Điểm ({criteria.name})', validators=[Optional()]))
-        setattr(CriteriaScoreForm, f'criteria_{i}_comments', TextAreaField(f'Nhận xét ({criteria.name})', validators=[Optional()]))
+    # Lấy danh sách các tiêu chí đánh giá và điểm hiện có (mỗi loại một truy vấn)
+    criteria_list = PerformanceEvaluationCriteria.query.filter_by(is_active=True) \
+        .order_by(PerformanceEvaluationCriteria.id).all()
+    existing_details = get_evaluation_details(id)
     
     form = FlaskForm()
     form.criteria_forms = []
     
-    # Lấy các điểm đánh giá hiện có
-    existing_scores = {}
-    for detail in PerformanceEvaluationDetail.query.filter_by(evaluation_id=id).all():
-        existing_scores[detail.criteria_id] = {
-            'score': detail.score,
-            'comments': detail.comments
-        }
-    
-    # Tạo form cho từng tiêu chí
-    for criteria in criteria_list:
-        criteria_form = PerformanceCriteriaScoreForm(criteria=criteria)
+    # Tạo form cho từng tiêu chí, tên trường dạng criteria_forms-<i>-score
+    for i, criteria in enumerate(criteria_list):
+        criteria_form = PerformanceCriteriaScoreForm(criteria=criteria, prefix=f'criteria_forms-{i}',
+                                                     meta={'csrf': False})
         
         # Nếu đã có điểm, hiển thị thông tin
-        if criteria.id in existing_scores:
-            criteria_form.score.data = existing_scores[criteria.id]['score']
-            criteria_form.comments.data = existing_scores[criteria.id]['comments']
+        detail = existing_details.get(criteria.id)
+        if detail and request.method != 'POST':
+            criteria_form.score.data = detail.score
+            criteria_form.comments.data = detail.comments
             
         form.criteria_forms.append(criteria_form)
     
     if request.method == 'POST':
         # Xử lý dữ liệu gửi lên
+        scores = []
         for i, criteria in enumerate(criteria_list):
             score_value = request.form.get(f'criteria_forms-{i}-score', '')
             comments_value = request.form.get(f'criteria_forms-{i}-comments', '')
             
-            # Tìm hoặc tạo mới chi tiết đánh giá
-            detail = PerformanceEvaluationDetail.query.filter_by(
-                evaluation_id=id, 
-                criteria_id=criteria.id
-            ).first()
-            
-            if not detail:
-                detail = PerformanceEvaluationDetail(
-                    evaluation_id=id,
-                    criteria_id=criteria.id
-                )
-                db.session.add(detail)
-            
-            # Cập nhật giá trị
+            score_float = None
             if score_value.strip():
                 try:
                     score_float = float(score_value)
-                    if 0 <= score_float <= criteria.max_score:
-                        detail.score = score_float
-                    else:
-                        flash(f'Điểm cho tiêu chí "{criteria.name}" phải từ 0 đến {criteria.max_score}.', 'danger')
-                        return redirect(url_for('score_performance_evaluation', id=id))
                 except ValueError:
                     flash(f'Điểm cho tiêu chí "{criteria.name}" phải là số.', 'danger')
                     return redirect(url_for('score_performance_evaluation', id=id))
-            else:
-                detail.score = None
-                
-            detail.comments = comments_value
+                if not 0 <= score_float <= criteria.max_score:
+                    flash(f'Điểm cho tiêu chí "{criteria.name}" phải từ 0 đến {criteria.max_score}.', 'danger')
+                    return redirect(url_for('score_performance_evaluation', id=id))
+            
+            scores.append({
+                'criteria_id': criteria.id,
+                'score': score_float,
+                'comments': comments_value
+            })
         
-        # Tính toán điểm tổng hợp
-        evaluation.overall_score = evaluation.calculate_overall_score()
+        # Ghi tất cả điểm bằng một câu lệnh và tính điểm tổng hợp trong SQL
+        save_evaluation_scores(evaluation, scores, existing_details)
+        invalidate_performance_analytics(evaluation)
         
         # Cập nhật trạng thái nếu người dùng nhấp vào nút "Hoàn thành đánh giá"
         if 'submit' in request.form:
@@ -1857,6 +2225,7 @@ def approve_performance_evaluation(id):
         
         evaluation.approved_by = current_user.id
         evaluation.approved_at = datetime.now()
+        invalidate_performance_analytics(evaluation)
         
         db.session.commit()
         
@@ -1873,6 +2242,7 @@ def delete_performance_evaluation(id):
         return redirect(url_for('dashboard'))
     
     evaluation = PerformanceEvaluation.query.get_or_404(id)
+    invalidate_performance_analytics(evaluation)
     
     # Xóa các chi tiết đánh giá liên quan
     details = PerformanceEvaluationDetail.query.filter_by(evaluation_id=id).all()
@@ -1918,6 +2288,7 @@ def create_custom_position():
         )
         db.session.add(position)
         db.session.commit()
+        invalidate(CUSTOM_POSITIONS)
         
         flash('Đã thêm chức vụ thành công!', 'success')
         return redirect(url_for('position_list'))
@@ -1936,6 +2307,7 @@ def edit_custom_position(id):
         position.name = form.name.data
         position.description = form.description.data
         db.session.commit()
+        invalidate(CUSTOM_POSITIONS)
         
         flash('Đã cập nhật chức vụ thành công!', 'success')
         return redirect(url_for('position_list'))
@@ -1957,6 +2329,7 @@ def delete_custom_position(id):
     
     db.session.delete(position)
     db.session.commit()
+    invalidate(CUSTOM_POSITIONS)
     
     flash('Đã xóa chức vụ thành công!', 'success')
     return redirect(url_for('position_list'))
@@ -1,14 +1,38 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
 from app import db
-from models import Asset, AssetAssignment, AssetMaintenance, AssetStatus, AssetCategory, MaintenanceType, MaintenanceStatus, Employee, AssetCategoryModel
-from forms_asset import AssetForm, AssetEditForm, AssetAssignmentForm, AssetReturnForm, AssetMaintenanceForm, AssetFilterForm, AssetCategoryForm, AssetCategoryEditForm
+from models import (Asset, AssetAssignment, AssetMaintenance, AssetStatus, AssetCategory, MaintenanceType, MaintenanceStatus,
+                    Employee, AssetCategoryModel, DepreciationMethod, AssetEvent, AssetEventType, AssetState)
+from forms_asset import (AssetForm, AssetEditForm, AssetAssignmentForm, AssetReturnForm, AssetMaintenanceForm, AssetFilterForm,
+                         AssetCategoryForm, AssetCategoryEditForm, AssetBulkUploadForm)
+from utils_pagination import paginate_request, keyset_paginate
+from utils_asset_events import (record_event, get_state, asset_history, assets_held_by,
+                                 replay_state, change_status, manual_status_choices)
+from utils_asset_bulk import (bulk_assign, bulk_return, read_csv, BulkError, ASSIGN_CSV_COLUMNS, RETURN_CSV_COLUMNS,
+                              MAX_BULK_ROWS)
+from utils_depreciation import (save_snapshot, latest_snapshot_period, depreciation_summary, snapshot_rows,
+                                expiring_warranties, WARRANTY_REPORT_DAYS)
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from sqlalchemy import func
+from datetime import datetime, date
+import hashlib
+import csv
+import io
 import os
 
 asset_bp = Blueprint('asset', __name__, url_prefix='/asset')
 
+# Số sự kiện gần nhất hiển thị trên trang chi tiết tài sản
+ASSET_HISTORY_LIMIT = 20
+
+
+def _apply_depreciation_settings(category, form):
+    """Gán cấu hình khấu hao từ form vào danh mục tài sản"""
+    category.depreciation_method = form.depreciation_method.data
+    category.useful_life_months = form.useful_life_months.data
+    category.salvage_rate = form.salvage_rate.data or 0
+    category.declining_factor = form.declining_factor.data or 2.0
+
 
 # Các route quản lý danh mục tài sản
 @asset_bp.route('/categories')
@@ -47,6 +71,7 @@ def create_category():
             description=form.description.data,
             is_active=form.is_active.data
         )
+        _apply_depreciation_settings(category, form)
         
         db.session.add(category)
         db.session.commit()
@@ -69,6 +94,8 @@ def edit_category(id):
     
     category = AssetCategoryModel.query.get_or_404(id)
     form = AssetCategoryEditForm(obj=category)
+    if request.method == 'GET':
+        form.depreciation_method.data = category.depreciation_method.name if category.depreciation_method else DepreciationMethod.NONE.name
     
     if form.validate_on_submit():
         # Kiểm tra tên danh mục đã tồn tại chưa (nếu đã thay đổi tên)
@@ -81,6 +108,7 @@ def edit_category(id):
         category.name = form.name.data
         category.description = form.description.data
         category.is_active = form.is_active.data
+        _apply_depreciation_settings(category, form)
         
         db.session.commit()
         
@@ -120,7 +148,6 @@ def delete_category(id):
 @login_required
 def index():
     form = AssetFilterForm(request.args)
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     query = Asset.query
@@ -151,7 +178,8 @@ def index():
     if form.price_max.data is not None:
         query = query.filter(Asset.purchase_price <= form.price_max.data)
     
-    pagination = query.order_by(Asset.asset_code).paginate(page=page, per_page=per_page)
+    # Phân trang keyset theo mã tài sản (duy nhất), tổng số dòng gần đúng
+    pagination = paginate_request(query, [(Asset.asset_code, False)], per_page, count_prefix='assets')
     assets = pagination.items
     
     return render_template('assets/index.html', 
@@ -214,12 +242,15 @@ def edit(id):
     asset = Asset.query.get_or_404(id)
     form = AssetEditForm(obj=asset)
     form.asset_id.data = asset.id
+    # Trạng thái bàn giao/bảo trì do sự kiện quyết định, form chỉ cho báo hỏng, thanh lý hoặc khôi phục
+    form.status.choices = [(s.name, s.value) for s in manual_status_choices(asset.status)]
+    if request.method == 'GET':
+        form.status.data = asset.status.name
     
     if form.validate_on_submit():
         asset.asset_code = form.asset_code.data
         asset.name = form.name.data
         asset.category_id = form.category.data if form.category.data != 0 else None
-        asset.status = form.status.data
         asset.serial_number = form.serial_number.data
         asset.purchase_date = form.purchase_date.data
         asset.purchase_price = form.purchase_price.data
@@ -230,6 +261,9 @@ def edit(id):
         asset.description = form.description.data
         asset.notes = form.notes.data
         
+        # Báo hỏng, thanh lý, khôi phục: ghi sự kiện để trạng thái không lệch với nhật ký
+        change_status(asset, form.status.data, created_by_id=current_user.id)
+        
         # Xử lý upload ảnh mới nếu có
         if form.image.data:
             # Xóa ảnh cũ nếu có
@@ -272,6 +306,8 @@ def view(id):
     
     return render_template('assets/view.html', 
                           asset=asset, 
+                          state=get_state(id),
+                          events=asset_history(id, limit=ASSET_HISTORY_LIMIT),
                           assignments=assignments,
                           maintenance_records=maintenance_records,
                           today_date=today_date,
@@ -295,6 +331,8 @@ def delete(id):
             os.remove(image_path)
     
     # Xóa các bản ghi liên quan
+    AssetEvent.query.filter_by(asset_id=id).delete()
+    AssetState.query.filter_by(asset_id=id).delete()
     AssetAssignment.query.filter_by(asset_id=id).delete()
     AssetMaintenance.query.filter_by(asset_id=id).delete()
     
@@ -327,10 +365,10 @@ def assign():
             is_returned=False
         )
         
-        # Cập nhật trạng thái tài sản
-        asset.status = AssetStatus.ASSIGNED
-        
+        # Ghi sự kiện bàn giao, trạng thái và người giữ tài sản được cập nhật theo
         db.session.add(assignment)
+        record_event(asset, AssetEventType.ASSIGNED, occurred_on=assignment.assigned_date,
+                     assignment=assignment, note=form.notes.data, created_by_id=current_user.id)
         db.session.commit()
         
         flash('Tài sản đã được bàn giao thành công!', 'success')
@@ -359,9 +397,8 @@ def return_asset(id):
         assignment.notes = form.notes.data if form.notes.data else assignment.notes
         assignment.is_returned = True
         
-        # Cập nhật trạng thái tài sản
-        asset = Asset.query.get(assignment.asset_id)
-        asset.status = AssetStatus.AVAILABLE
+        record_event(assignment.asset, AssetEventType.RETURNED, occurred_on=assignment.return_date,
+                     assignment=assignment, note=form.condition_on_return.data, created_by_id=current_user.id)
         
         db.session.commit()
         
@@ -374,6 +411,43 @@ def return_asset(id):
                           title='Trả tài sản')
 
 
+@asset_bp.route('/assignments/bulk', methods=['GET', 'POST'])
+@login_required
+def bulk_upload():
+    """Bàn giao / thu hồi tài sản hàng loạt từ file CSV"""
+    form = AssetBulkUploadForm()
+    result = None
+    
+    if form.validate_on_submit():
+        assign = form.action.data == 'assign'
+        try:
+            rows = read_csv(form.file.data, ASSIGN_CSV_COLUMNS if assign else RETURN_CSV_COLUMNS)
+            handler = bulk_assign if assign else bulk_return
+            result = handler(rows, created_by_id=current_user.id, dry_run=form.dry_run.data)
+            if form.dry_run.data:
+                db.session.rollback()
+                flash(f"Kiểm tra xong: {result['processed']} dòng hợp lệ, {len(result['errors'])} dòng lỗi.", 'info')
+            else:
+                db.session.commit()
+                action = 'bàn giao' if assign else 'thu hồi'
+                flash(f"Đã {action} {result['processed']} tài sản, {len(result['errors'])} dòng lỗi.",
+                      'success' if not result['errors'] else 'warning')
+        except BulkError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Lỗi khi xử lý file: {str(e)}', 'danger')
+    
+    return render_template('assets/bulk.html',
+                          form=form,
+                          result=result,
+                          assign_columns=ASSIGN_CSV_COLUMNS,
+                          return_columns=RETURN_CSV_COLUMNS,
+                          max_rows=MAX_BULK_ROWS,
+                          title='Bàn giao / thu hồi hàng loạt')
+
+
 @asset_bp.route('/maintenance', methods=['GET', 'POST'])
 @login_required
 def maintenance():
@@ -390,12 +464,14 @@ def maintenance():
             status=form.status.data
         )
         
-        # Cập nhật trạng thái tài sản nếu đang bảo trì
+        db.session.add(maintenance)
+        
+        # Bảo trì bắt đầu ngay: ghi sự kiện, tài sản chuyển sang đang bảo trì
         if form.status.data == MaintenanceStatus.IN_PROGRESS.name:
-            asset = Asset.query.get(form.asset_id.data)
-            asset.status = AssetStatus.UNDER_MAINTENANCE
+            record_event(Asset.query.get(form.asset_id.data), AssetEventType.MAINTENANCE_STARTED,
+                         occurred_on=maintenance.maintenance_date, maintenance=maintenance,
+                         created_by_id=current_user.id)
         
-        db.session.add(maintenance)
         db.session.commit()
         
         flash('Bản ghi bảo trì đã được tạo thành công!', 'success')
@@ -415,28 +491,13 @@ def complete_maintenance(id):
         flash('Bảo trì này đã được hoàn thành!', 'warning')
         return redirect(url_for('asset.view', id=maintenance.asset_id))
     
+    was_in_progress = maintenance.status == MaintenanceStatus.IN_PROGRESS.name
     maintenance.status = MaintenanceStatus.COMPLETED.name
     
-    # Kiểm tra xem còn bảo trì đang thực hiện nào không
-    ongoing_maintenance = AssetMaintenance.query.filter_by(
-        asset_id=maintenance.asset_id, 
-        status=MaintenanceStatus.IN_PROGRESS.name
-    ).first()
-    
-    # Nếu không còn bảo trì nào đang thực hiện, cập nhật trạng thái tài sản
-    if not ongoing_maintenance:
-        asset = Asset.query.get(maintenance.asset_id)
-        
-        # Kiểm tra xem tài sản có đang được bàn giao không
-        active_assignment = AssetAssignment.query.filter_by(
-            asset_id=maintenance.asset_id, 
-            is_returned=False
-        ).first()
-        
-        if active_assignment:
-            asset.status = AssetStatus.ASSIGNED
-        else:
-            asset.status = AssetStatus.AVAILABLE
+    # Trạng thái tài sản (còn bảo trì khác/đang bàn giao) được suy ra từ trạng thái hiện tại
+    if was_in_progress:
+        record_event(maintenance.asset, AssetEventType.MAINTENANCE_COMPLETED,
+                     maintenance=maintenance, created_by_id=current_user.id)
     
     db.session.commit()
     
@@ -512,31 +573,273 @@ def maintenance_list():
                           title='Danh sách bảo trì tài sản')
 
 
+def _parse_period(value):
+    """Chuyển tham số kỳ 'YYYY-MM' thành ngày đầu tháng, None nếu không hợp lệ"""
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except (TypeError, ValueError):
+        return None
+
+
+# Báo cáo khấu hao và giá trị còn lại theo ảnh chụp tháng
+@asset_bp.route('/reports/depreciation')
+@login_required
+def depreciation_report():
+    if not current_user.is_admin():
+        flash('Bạn không có quyền truy cập trang này.', 'danger')
+        return redirect(url_for('asset.index'))
+    
+    period = _parse_period(request.args.get('period')) or latest_snapshot_period()
+    
+    if period and request.args.get('format') == 'csv':
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['Mã tài sản', 'Tên tài sản', 'Danh mục', 'Ngày mua',
+                             'Nguyên giá', 'Khấu hao lũy kế', 'Giá trị còn lại'])
+            for row in snapshot_rows(period):
+                writer.writerow(row)
+                if buffer.tell() > 65536:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        
+        response = current_app.response_class(stream_with_context(generate()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename=khau-hao-{period:%Y-%m}.csv'
+        return response
+    
+    summary = depreciation_summary(period) if period else []
+    totals = {
+        key: sum(row[key] for row in summary)
+        for key in ('count', 'cost', 'accumulated_depreciation', 'book_value')
+    }
+    
+    return render_template('assets/reports/depreciation.html',
+                          period=period,
+                          summary=summary,
+                          totals=totals,
+                          title='Báo cáo khấu hao tài sản')
+
+
+@asset_bp.route('/reports/depreciation/run', methods=['POST'])
+@login_required
+def run_depreciation():
+    """Tính lại ảnh chụp giá trị còn lại của một kỳ (mặc định tháng hiện tại)"""
+    if not current_user.is_admin():
+        flash('Bạn không có quyền thực hiện thao tác này.', 'danger')
+        return redirect(url_for('asset.index'))
+    
+    period = _parse_period(request.form.get('period')) or date.today()
+    try:
+        count = save_snapshot(period)
+        flash(f'Đã tính khấu hao kỳ {period:%m/%Y} cho {count} tài sản.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Lỗi khi tính khấu hao: {str(e)}', 'danger')
+    
+    return redirect(url_for('asset.depreciation_report', period=f'{period:%Y-%m}'))
+
+
+# Báo cáo tài sản sắp hết hạn bảo hành
+@asset_bp.route('/reports/warranty')
+@login_required
+def warranty_report():
+    days = min(max(request.args.get('days', WARRANTY_REPORT_DAYS, type=int), 1), 730)
+    assets = expiring_warranties(days)
+    
+    return render_template('assets/reports/warranty.html',
+                          assets=assets,
+                          days=days,
+                          today=date.today(),
+                          title='Tài sản sắp hết hạn bảo hành')
+
+
+# Số tài sản mặc định / tối đa mỗi trang của API danh sách tài sản
+ASSET_API_PER_PAGE = 50
+ASSET_API_MAX_PER_PAGE = 200
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _asset_field(column, convert=None):
+    """Trường API đọc trực tiếp từ một cột của bảng assets"""
+    return [column], lambda row: convert(getattr(row, column.key)) if convert else getattr(row, column.key)
+
+
+# Các trường chọn được qua ?fields=: tên trường -> (cột cần đọc, hàm lấy giá trị từ dòng kết quả)
+ASSET_API_FIELDS = {
+    'id': _asset_field(Asset.id),
+    'asset_code': _asset_field(Asset.asset_code),
+    'name': _asset_field(Asset.name),
+    # Tên danh mục mới (category_id), nếu chưa có thì lấy danh mục enum cũ
+    'category': ([AssetCategoryModel.name.label('category_name'), Asset.category],
+                 lambda row: row.category_name or (row.category.value if row.category else None)),
+    'category_id': _asset_field(Asset.category_id),
+    'status': _asset_field(Asset.status, lambda status: status.value if status else None),
+    'serial_number': _asset_field(Asset.serial_number),
+    'purchase_date': _asset_field(Asset.purchase_date, _iso),
+    'purchase_price': _asset_field(Asset.purchase_price),
+    'warranty_expiry': _asset_field(Asset.warranty_expiry, _iso),
+    'department_id': _asset_field(Asset.department_id),
+    'assignee_id': _asset_field(Asset.assignee_id),
+    'updated_at': _asset_field(Asset.updated_at, _iso),
+}
+ASSET_API_DEFAULT_FIELDS = ['id', 'asset_code', 'name', 'category', 'status', 'serial_number']
+
+
+def _asset_api_etag():
+    """
+    ETag của API danh sách tài sản: thay đổi khi có tài sản/danh mục được sửa (MAX(updated_at)),
+    tài sản bị xóa (số dòng) hoặc tham số truy vấn khác
+    """
+    updated_at, count = db.session.query(func.max(Asset.updated_at), func.count(Asset.id)).one()
+    category_updated_at = db.session.query(func.max(AssetCategoryModel.updated_at)).scalar()
+    args = sorted(request.args.items(multi=True))
+    raw = f"{updated_at}|{count}|{category_updated_at}|{args}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
 # Route cho API lấy danh sách tài sản theo loại và trạng thái
 @asset_bp.route('/api/assets')
 @login_required
 def get_assets():
+    """
+    Danh sách tài sản dạng JSON, phân trang bằng con trỏ
+
+    Tham số: category (enum cũ), category_id, status, fields (danh sách trường, cách nhau bởi dấu phẩy),
+    limit, after/before (con trỏ). Trả về 304 khi If-None-Match khớp ETag hiện tại.
+    """
     category = request.args.get('category')
+    category_id = request.args.get('category_id', type=int)
     status = request.args.get('status')
     
-    query = Asset.query
-    
-    if category:
-        query = query.filter_by(category=category)
-    
-    if status:
-        query = query.filter_by(status=status)
-    
-    assets = query.all()
-    
+    if category and category not in AssetCategory.__members__:
+        return jsonify({"error": "Loại tài sản không hợp lệ"}), 400
+    if status and status not in AssetStatus.__members__:
+        return jsonify({"error": "Trạng thái tài sản không hợp lệ"}), 400
+    
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or ASSET_API_DEFAULT_FIELDS
+    unknown = [f for f in fields if f not in ASSET_API_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Trường không hợp lệ: {', '.join(unknown)}"}), 400
+    
+    etag = _asset_api_etag()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        # Chỉ đọc các cột được yêu cầu (luôn có id để làm con trỏ)
+        columns = [Asset.id]
+        for field in fields:
+            for column in ASSET_API_FIELDS[field][0]:
+                if not any(column is c for c in columns):
+                    columns.append(column)
+        
+        query = db.session.query(*columns).select_from(Asset)
+        if 'category' in fields:
+            query = query.outerjoin(AssetCategoryModel, Asset.category_id == AssetCategoryModel.id)
+        
+        if category:
+            query = query.filter(Asset.category == category)
+        
+        if category_id:
+            query = query.filter(Asset.category_id == category_id)
+        
+        if status:
+            query = query.filter(Asset.status == status)
+        
+        per_page = min(max(request.args.get('limit', ASSET_API_PER_PAGE, type=int), 1), ASSET_API_MAX_PER_PAGE)
+        page = keyset_paginate(query, [(Asset.id, False)], per_page,
+                               after=request.args.get('after'), before=request.args.get('before'))
+        
+        response = jsonify({
+            'items': [{field: ASSET_API_FIELDS[field][1](row) for field in fields} for row in page.items],
+            'prev_cursor': page.prev_cursor,
+            'next_cursor': page.next_cursor,
+        })
+    
+    response.set_etag(etag)
+    # Trình duyệt/client phải hỏi lại server mỗi lần, nhận 304 nếu dữ liệu chưa đổi
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _bulk_api(handler, key):
+    """Xử lý chung cho API bàn giao / thu hồi hàng loạt"""
+    data = request.get_json(silent=True)
+    rows = data.get(key) if isinstance(data, dict) else None
+    dry_run = isinstance(data, dict) and bool(data.get('dry_run'))
+    try:
+        result = handler(rows, created_by_id=current_user.id, dry_run=dry_run)
+    except BulkError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return jsonify(dict(result, dry_run=dry_run))
+
+
+# API bàn giao tài sản hàng loạt: {"assignments": [{"asset_code", "employee_code", "assigned_date", ...}], "dry_run"}
+@asset_bp.route('/api/assignments/bulk', methods=['POST'])
+@login_required
+def api_bulk_assign():
+    return _bulk_api(bulk_assign, 'assignments')
+
+
+# API thu hồi tài sản hàng loạt: {"returns": [{"asset_code", "return_date", "condition", ...}], "dry_run"}
+@asset_bp.route('/api/returns/bulk', methods=['POST'])
+@login_required
+def api_bulk_return():
+    return _bulk_api(bulk_return, 'returns')
+
+
+# API tài sản nhân viên đang giữ (đọc từ trạng thái hiện tại)
+@asset_bp.route('/api/employees/<int:employee_id>/assets')
+@login_required
+def get_employee_assets(employee_id):
     return jsonify([{
         'id': asset.id,
         'asset_code': asset.asset_code,
         'name': asset.name,
-        'category': asset.category.value,
-        'status': asset.status.value,
-        'serial_number': asset.serial_number
-    } for asset in assets])
+    } for asset in assets_held_by(employee_id)])
+
+
+# API nhật ký sự kiện và trạng thái của tài sản tại một ngày (phát lại nhật ký)
+@asset_bp.route('/api/assets/<int:id>/history')
+@login_required
+def get_asset_history(id):
+    Asset.query.get_or_404(id)
+    as_of = request.args.get('as_of')
+    if as_of:
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"error": "Ngày không hợp lệ, định dạng YYYY-MM-DD"}), 400
+    
+    state = replay_state(id, as_of or None)
+    events = [event for event in reversed(asset_history(id)) if not as_of or event.occurred_on <= as_of]
+    return jsonify({
+        'state': {
+            'status': state.status.name,
+            'holder_id': state.holder_id,
+            'assignment_id': state.assignment_id,
+            'open_maintenance': state.open_maintenance,
+        },
+        'events': [{
+            'id': event.id,
+            'event_type': event.event_type.name,
+            'occurred_on': event.occurred_on.isoformat(),
+            'employee_id': event.employee_id,
+            'assignment_id': event.assignment_id,
+            'maintenance_id': event.maintenance_id,
+            'note': event.note,
+        } for event in events],
+    })
 
 
 # API để lấy danh sách nhân viên theo phòng ban
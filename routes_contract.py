@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, send_from_directory
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
 from models import Contract, ContractType, ContractStatus, ContractAmendment, Document, DocumentType, Employee, Department
@@ -7,9 +7,10 @@ from forms_contract import (
     ContractAmendmentForm, ContractAmendmentEditForm,
     DocumentForm, DocumentEditForm, ContractFilterForm
 )
-from werkzeug.utils import secure_filename
+from utils_storage import store_upload, replace_file, release_file, send_stored_file
+from utils_pagination import paginate_request
+from utils_contract import record_status_change
 from datetime import datetime, date
-import os
 import logging
 # Import module thông báo
 from notifications import send_contract_notification
@@ -21,7 +22,6 @@ contract_bp = Blueprint('contract', __name__, url_prefix='/contract')
 @login_required
 def index():
     form = ContractFilterForm(request.args)
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     query = Contract.query
@@ -57,7 +57,10 @@ def index():
     if form.end_date_to.data:
         query = query.filter(Contract.end_date <= form.end_date_to.data)
     
-    pagination = query.order_by(Contract.start_date.desc()).paginate(page=page, per_page=per_page)
+    # Phân trang keyset theo ngày bắt đầu giảm dần, id làm khóa phụ
+    pagination = paginate_request(
+        query, [(Contract.start_date, True), (Contract.id, True)], per_page, count_prefix='contracts'
+    )
     contracts = pagination.items
     
     return render_template('contracts/index.html',
@@ -108,28 +111,12 @@ def create():
         
         # Xử lý upload file hợp đồng nếu có
         if form.contract_file.data:
-            filename = secure_filename(form.contract_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"contract_{form.contract_number.data.replace('/', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/contracts')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.contract_file.data.save(file_path)
-            contract.contract_file = f"uploads/contracts/{new_filename}"
+            contract.contract_file = store_upload(form.contract_file.data)
         
+        # Ngày hợp đồng của nhân viên được đồng bộ khi ghi hợp đồng (xem models.py)
         db.session.add(contract)
         db.session.commit()
         
-        # Cập nhật thông tin hợp đồng cho nhân viên nếu cần
-        employee = Employee.query.get(form.employee_id.data)
-        if employee:
-            employee.contract_start_date = form.start_date.data
-            employee.contract_end_date = form.end_date.data
-            db.session.commit()
-        
         # Gửi thông báo về hợp đồng mới
         try:
             send_contract_notification(contract.id, 'new')
@@ -162,7 +149,7 @@ def edit(id):
         contract.contract_number = form.contract_number.data
         contract.employee_id = form.employee_id.data
         contract.contract_type = form.contract_type.data
-        contract.status = form.status.data
+        record_status_change(contract, form.status.data, created_by_id=current_user.id)
         contract.start_date = form.start_date.data
         contract.end_date = form.end_date.data
         contract.job_title = form.job_title.data
@@ -174,33 +161,12 @@ def edit(id):
         
         # Xử lý upload file hợp đồng mới nếu có
         if form.contract_file.data:
-            # Xóa file cũ nếu có
-            if contract.contract_file:
-                old_file_path = os.path.join(current_app.root_path, 'static', contract.contract_file)
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-            
-            filename = secure_filename(form.contract_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"contract_{form.contract_number.data.replace('/', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/contracts')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.contract_file.data.save(file_path)
-            contract.contract_file = f"uploads/contracts/{new_filename}"
+            # Lưu file mới và bỏ tham chiếu tới file cũ
+            contract.contract_file = replace_file(contract.contract_file, form.contract_file.data)
         
+        # Ngày hợp đồng của nhân viên được đồng bộ khi ghi hợp đồng (xem models.py)
         db.session.commit()
         
-        # Cập nhật thông tin hợp đồng cho nhân viên nếu cần
-        employee = Employee.query.get(form.employee_id.data)
-        if employee:
-            employee.contract_start_date = form.start_date.data
-            employee.contract_end_date = form.end_date.data
-            db.session.commit()
-        
         # Gửi thông báo về cập nhật hợp đồng
         try:
             send_contract_notification(contract.id, 'updated')
@@ -228,10 +194,8 @@ def delete_contract_file(id):
         flash('Không có file đính kèm để xóa!', 'warning')
         return redirect(url_for('contract.edit', id=id))
     
-    # Xóa file khỏi hệ thống
-    file_path = os.path.join(current_app.root_path, 'static', contract.contract_file)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Bỏ tham chiếu tới file (đối tượng bị xóa khi không còn bản ghi nào dùng)
+    release_file(contract.contract_file)
     
     # Cập nhật thông tin hợp đồng
     contract.contract_file = None
@@ -263,7 +227,7 @@ def view(id):
 def terminate(id):
     contract = Contract.query.get_or_404(id)
     
-    if contract.status == ContractStatus.TERMINATED.name:
+    if contract.status == ContractStatus.TERMINATED:
         flash('Hợp đồng này đã được chấm dứt trước đó!', 'warning')
         return redirect(url_for('contract.view', id=id))
     
@@ -271,7 +235,8 @@ def terminate(id):
     form.contract_id.data = contract.id
     
     if form.validate_on_submit():
-        contract.status = ContractStatus.TERMINATED.name
+        record_status_change(contract, ContractStatus.TERMINATED, created_by_id=current_user.id,
+                             changed_on=form.terminated_date.data)
         contract.terminated_date = form.terminated_date.data
         contract.termination_reason = form.termination_reason.data
         
@@ -302,7 +267,6 @@ def terminate(id):
 @contract_bp.route('/amendments')
 @login_required
 def amendment_list():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     query = ContractAmendment.query
@@ -317,7 +281,10 @@ def amendment_list():
     if employee_id:
         query = query.join(Contract).filter(Contract.employee_id == employee_id)
     
-    pagination = query.order_by(ContractAmendment.amendment_date.desc()).paginate(page=page, per_page=per_page)
+    pagination = paginate_request(
+        query, [(ContractAmendment.amendment_date, True), (ContractAmendment.id, True)], per_page,
+        count_prefix='contract_amendments'
+    )
     amendments = pagination.items
     
     contracts = Contract.query.filter_by(status=ContractStatus.ACTIVE.name).all()
@@ -357,17 +324,7 @@ def amendment_create():
         
         # Xử lý upload file phụ lục nếu có
         if form.amendment_file.data:
-            filename = secure_filename(form.amendment_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"amendment_{form.amendment_number.data.replace('/', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/contracts/amendments')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.amendment_file.data.save(file_path)
-            amendment.amendment_file = f"uploads/contracts/amendments/{new_filename}"
+            amendment.amendment_file = store_upload(form.amendment_file.data)
         
         db.session.add(amendment)
         db.session.commit()
@@ -403,23 +360,8 @@ def amendment_edit(id):
         
         # Xử lý upload file phụ lục mới nếu có
         if form.amendment_file.data:
-            # Xóa file cũ nếu có
-            if amendment.amendment_file:
-                old_file_path = os.path.join(current_app.root_path, 'static', amendment.amendment_file)
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-            
-            filename = secure_filename(form.amendment_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"amendment_{form.amendment_number.data.replace('/', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/contracts/amendments')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.amendment_file.data.save(file_path)
-            amendment.amendment_file = f"uploads/contracts/amendments/{new_filename}"
+            # Lưu file mới và bỏ tham chiếu tới file cũ
+            amendment.amendment_file = replace_file(amendment.amendment_file, form.amendment_file.data)
         
         db.session.commit()
         
@@ -443,10 +385,8 @@ def delete_amendment_file(id):
         flash('Không có file đính kèm để xóa!', 'warning')
         return redirect(url_for('contract.amendment_edit', id=id))
     
-    # Xóa file khỏi hệ thống
-    file_path = os.path.join(current_app.root_path, 'static', amendment.amendment_file)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Bỏ tham chiếu tới file (đối tượng bị xóa khi không còn bản ghi nào dùng)
+    release_file(amendment.amendment_file)
     
     # Cập nhật thông tin phụ lục
     amendment.amendment_file = None
@@ -469,7 +409,6 @@ def amendment_view(id):
 @contract_bp.route('/documents')
 @login_required
 def document_list():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     query = Document.query
@@ -490,7 +429,8 @@ def document_list():
         is_verified_bool = is_verified == 'true'
         query = query.filter_by(is_verified=is_verified_bool)
     
-    pagination = query.order_by(Document.created_at.desc()).paginate(page=page, per_page=per_page)
+    # created_at có thể NULL nên sắp xếp theo id giảm dần (cùng thứ tự tạo)
+    pagination = paginate_request(query, [(Document.id, True)], per_page, count_prefix='documents')
     documents = pagination.items
     
     employees = Employee.query.all()
@@ -536,17 +476,7 @@ def document_create():
         
         # Xử lý upload file
         if form.file_upload.data:
-            filename = secure_filename(form.file_upload.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"doc_{document.document_type.name}_{document.employee_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/documents')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.file_upload.data.save(file_path)
-            document.file_path = f"uploads/documents/{new_filename}"
+            document.file_path = store_upload(form.file_upload.data)
         
         db.session.add(document)
         db.session.commit()
@@ -602,23 +532,8 @@ def document_edit(id):
         
         # Xử lý upload file mới nếu có
         if form.file_upload.data:
-            # Xóa file cũ nếu có
-            if document.file_path:
-                old_file_path = os.path.join(current_app.root_path, 'static', document.file_path)
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-            
-            filename = secure_filename(form.file_upload.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"doc_{document.document_type.name}_{document.employee_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/documents')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            file_path = os.path.join(uploads_dir, new_filename)
-            form.file_upload.data.save(file_path)
-            document.file_path = f"uploads/documents/{new_filename}"
+            # Lưu file mới và bỏ tham chiếu tới file cũ
+            document.file_path = replace_file(document.file_path, form.file_upload.data)
         
         db.session.commit()
         
@@ -685,11 +600,9 @@ def download_contract(id):
         flash('Không có file hợp đồng!', 'warning')
         return redirect(url_for('contract.view', id=id))
     
-    file_path = contract.contract_file.split('/')
-    filename = file_path[-1]
-    directory = os.path.join(current_app.root_path, 'static', os.path.dirname(contract.contract_file))
-    
-    return send_from_directory(directory, filename, as_attachment=True)
+    return send_stored_file(contract.contract_file,
+                            download_name=f"contract_{contract.contract_number.replace('/', '_')}",
+                            as_attachment=request.args.get('inline') != '1')
 
 
 @contract_bp.route('/amendments/download/<int:id>')
@@ -701,11 +614,9 @@ def download_amendment(id):
         flash('Không có file phụ lục!', 'warning')
         return redirect(url_for('contract.amendment_view', id=id))
     
-    file_path = amendment.amendment_file.split('/')
-    filename = file_path[-1]
-    directory = os.path.join(current_app.root_path, 'static', os.path.dirname(amendment.amendment_file))
-    
-    return send_from_directory(directory, filename, as_attachment=True)
+    return send_stored_file(amendment.amendment_file,
+                            download_name=f"amendment_{amendment.amendment_number.replace('/', '_')}",
+                            as_attachment=request.args.get('inline') != '1')
 
 
 @contract_bp.route('/documents/download/<int:id>')
@@ -713,11 +624,9 @@ def download_amendment(id):
 def download_document(id):
     document = Document.query.get_or_404(id)
     
-    file_path = document.file_path.split('/')
-    filename = file_path[-1]
-    directory = os.path.join(current_app.root_path, 'static', os.path.dirname(document.file_path))
-    
-    return send_from_directory(directory, filename, as_attachment=True)
+    return send_stored_file(document.file_path,
+                            download_name=f"doc_{document.document_type.name}_{document.employee_id}",
+                            as_attachment=request.args.get('inline') != '1')
 
 
 # API endpoints
@@ -5,7 +5,11 @@ from app import db
 from models import User, Role, Permission, user_roles
 from forms_permission import RoleForm, RoleEditForm, PermissionForm, PermissionEditForm, UserRoleForm
 from utils_permission import permission_required, setup_initial_permissions
+from utils_cache import get_permission_choices, invalidate, PERMISSIONS
+from utils_permission_matrix import (users_with_permission, permission_counts_by_user, role_names_by_user,
+                                     role_counts, permission_counts_by_module)
 from functools import wraps
+from sqlalchemy.orm import joinedload
 
 # Admin required decorator
 def admin_required(f):
@@ -24,24 +28,15 @@ permission_bp = Blueprint('permission', __name__, url_prefix='/permissions')
 @admin_required
 def index():
     """Hiển thị trang tổng quan phân quyền"""
-    roles = Role.query.all()
-    permissions = Permission.query.all()
-    
     # Thống kê
-    total_roles = len(roles)
-    total_perms = len(permissions)
+    total_roles = Role.query.count()
     total_users = User.query.count()
     
-    # Phân loại theo module
-    modules = {}
-    for perm in permissions:
-        if perm.module not in modules:
-            modules[perm.module] = 0
-        modules[perm.module] += 1
+    # Phân loại theo module (đếm trong SQL)
+    modules = permission_counts_by_module()
+    total_perms = sum(modules.values())
     
     return render_template('permissions/index.html', 
-                          roles=roles,
-                          permissions=permissions,
                           total_roles=total_roles,
                           total_perms=total_perms,
                           total_users=total_users,
@@ -69,8 +64,11 @@ def setup():
 def role_list():
     """Hiển thị danh sách vai trò"""
     roles = Role.query.all()
+    permission_counts, user_counts = role_counts()
     return render_template('permissions/role_list.html', 
                           roles=roles,
+                          permission_counts=permission_counts,
+                          user_counts=user_counts,
                           title='Danh sách vai trò')
 
 
@@ -81,8 +79,7 @@ def create_role():
     form = RoleForm()
     
     # Lấy danh sách quyền để hiển thị trong form MultiSelect
-    permissions = Permission.query.all()
-    form.permissions.choices = [(p.id, f"{p.name} ({p.module})") for p in permissions]
+    form.permissions.choices = get_permission_choices()
     
     if form.validate_on_submit():
         # Kiểm tra xem vai trò đã tồn tại chưa
@@ -123,8 +120,7 @@ def edit_role(id):
     form = RoleEditForm(obj=role)
     
     # Lấy danh sách quyền để hiển thị trong form MultiSelect
-    permissions = Permission.query.all()
-    form.permissions.choices = [(p.id, f"{p.name} ({p.module})") for p in permissions]
+    form.permissions.choices = get_permission_choices()
     
     if request.method == 'GET':
         # Đặt các giá trị mặc định cho form
@@ -227,6 +223,7 @@ def create_permission():
         
         db.session.add(permission)
         db.session.commit()
+        invalidate(PERMISSIONS)
         
         flash(f'Quyền "{permission.name}" đã được tạo thành công!', 'success')
         return redirect(url_for('permission.permission_list'))
@@ -254,6 +251,7 @@ def edit_permission(id):
         permission.module = form.module.data
         
         db.session.commit()
+        invalidate(PERMISSIONS)
         
         flash(f'Quyền "{permission.name}" đã được cập nhật thành công!', 'success')
         return redirect(url_for('permission.permission_list'))
@@ -278,6 +276,7 @@ def delete_permission(id):
     try:
         db.session.delete(permission)
         db.session.commit()
+        invalidate(PERMISSIONS)
         flash(f'Quyền "{permission.name}" đã được xóa thành công!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -292,9 +291,11 @@ def delete_permission(id):
 @permission_required('permission_view')
 def user_list():
     """Hiển thị danh sách người dùng để phân quyền"""
-    users = User.query.all()
+    users = User.query.options(joinedload(User.employee)).all()
     return render_template('permissions/user_list.html', 
                           users=users,
+                          role_names=role_names_by_user(),
+                          permission_counts=permission_counts_by_user(),
                           title='Phân quyền người dùng')
 
 
@@ -356,4 +357,23 @@ def user_permissions(id):
                           user=user,
                           permissions=permissions,
                           permissions_by_module=permissions_by_module,
-                          title=f'Quyền của người dùng: {user.username}')
\ No newline at end of file
+                          title=f'Quyền của người dùng: {user.username}')
+
+
+@permission_bp.route('/api/permissions/<code>/users')
+@permission_required('permission_view')
+def api_permission_users(code):
+    """Kiểm tra phân quyền: người dùng đang có quyền theo mã (đọc từ ma trận quyền tính sẵn)"""
+    permission = Permission.query.filter_by(code=code).first()
+    if permission is None:
+        return jsonify({"error": "Không tìm thấy quyền"}), 404
+    
+    return jsonify({
+        'permission': {'id': permission.id, 'code': permission.code, 'name': permission.name},
+        'users': [{
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'is_admin': user.is_admin(),
+        } for user in users_with_permission(code)]
+    })
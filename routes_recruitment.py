@@ -1,22 +1,29 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
 from flask_login import login_required, current_user
 from app import db
 from models import (
     JobPosition, JobOpening, JobOpeningStatus, 
     Candidate, CandidateStatus, 
-    Interview, InterviewStatus, InterviewType,
+    Interview, InterviewStatus, InterviewType, InterviewRoom,
     Department
 )
 from forms_recruitment import (
     JobPositionForm, JobPositionEditForm,
     JobOpeningForm, JobOpeningEditForm,
     CandidateForm, CandidateEditForm,
-    InterviewForm, InterviewEditForm,
+    InterviewForm, InterviewEditForm, InterviewRoomForm,
     RecruitmentFilterForm
 )
-from werkzeug.utils import secure_filename
+from utils_recruitment import (candidate_status_counts, stage_candidates, pipeline_preview,
+                               candidate_to_card, STAGE_PAGE_SIZE,
+                               get_recruitment_metrics, invalidate_recruitment_metrics)
+from utils_storage import store_upload, replace_file, send_stored_file
+from utils_cv_index import rank_candidates
+from utils_pagination import paginate_request
+from utils_interview import (set_interview_schedule, find_interview_conflicts, describe_conflicts,
+                             conflicts_to_dict, find_free_slots, interview_end)
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
-import os
 
 recruitment_bp = Blueprint('recruitment', __name__, url_prefix='/recruitment')
 
@@ -24,36 +31,23 @@ recruitment_bp = Blueprint('recruitment', __name__, url_prefix='/recruitment')
 @recruitment_bp.route('/')
 @login_required
 def index():
-    # Số liệu tổng quan
-    active_openings = JobOpening.query.filter_by(status=JobOpeningStatus.OPEN.name).count()
-    total_candidates = Candidate.query.count()
-    interviews_this_week = Interview.query.filter(
-        Interview.scheduled_date >= datetime.now(),
-        Interview.scheduled_date <= datetime.now() + timedelta(days=7)
-    ).count()
-    
-    # Các vị trí tuyển dụng đang mở
-    openings = JobOpening.query.filter_by(status=JobOpeningStatus.OPEN.name).order_by(JobOpening.start_date.desc()).limit(5).all()
-    
-    # Các ứng viên mới nhất
-    recent_candidates = Candidate.query.order_by(Candidate.application_date.desc()).limit(5).all()
-    
-    # Các cuộc phỏng vấn sắp tới
-    upcoming_interviews = Interview.query.filter(
-        Interview.scheduled_date >= datetime.now(),
-        Interview.status.in_([InterviewStatus.SCHEDULED.name, InterviewStatus.RESCHEDULED.name])
-    ).order_by(Interview.scheduled_date).limit(5).all()
+    # Số liệu tổng quan, phễu tuyển dụng và thời gian tuyển (cache ngắn hạn)
+    metrics = get_recruitment_metrics()
     
     return render_template('recruitment/index.html',
-                          active_openings=active_openings,
-                          total_candidates=total_candidates,
-                          interviews_this_week=interviews_this_week,
-                          openings=openings,
-                          recent_candidates=recent_candidates,
-                          upcoming_interviews=upcoming_interviews,
+                          metrics=metrics,
+                          active_openings=metrics['active_openings'],
+                          total_candidates=metrics['total_candidates'],
+                          interviews_this_week=metrics['interviews_this_week'],
                           title='Quản lý tuyển dụng')
 
 
+@recruitment_bp.route('/api/metrics')
+@login_required
+def api_metrics():
+    return jsonify(get_recruitment_metrics())
+
+
 # Job Positions
 @recruitment_bp.route('/positions')
 @login_required
@@ -187,18 +181,19 @@ def position_delete(id):
 @login_required
 def opening_list():
     form = RecruitmentFilterForm(request.args)
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     query = JobOpening.query
     
+    filter_department = form.department_id.data and form.department_id.data != 0
+    if form.keyword.data or filter_department:
+        query = query.join(JobPosition)
+    
     if form.keyword.data:
-        query = query.join(JobPosition).filter(
-            JobPosition.title.ilike(f'%{form.keyword.data}%')
-        )
+        query = query.filter(JobPosition.title.ilike(f'%{form.keyword.data}%'))
     
-    if form.department_id.data and form.department_id.data != 0:
-        query = query.join(JobPosition).filter(JobPosition.department_id == form.department_id.data)
+    if filter_department:
+        query = query.filter(JobPosition.department_id == form.department_id.data)
     
     if form.status.data:
         query = query.filter(JobOpening.status == form.status.data)
@@ -209,7 +204,9 @@ def opening_list():
     if form.date_to.data:
         query = query.filter(JobOpening.start_date <= form.date_to.data)
     
-    pagination = query.order_by(JobOpening.start_date.desc()).paginate(page=page, per_page=per_page)
+    pagination = paginate_request(
+        query, [(JobOpening.start_date, True), (JobOpening.id, True)], per_page, count_prefix='job_openings'
+    )
     openings = pagination.items
     
     return render_template('recruitment/openings/index.html',
@@ -243,6 +240,7 @@ def opening_create():
         
         db.session.add(opening)
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Tin tuyển dụng mới đã được tạo thành công!', 'success')
         return redirect(url_for('recruitment.opening_list'))
@@ -275,6 +273,7 @@ def opening_edit(id):
         opening.work_location = form.work_location.data
         
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Tin tuyển dụng đã được cập nhật!', 'success')
         return redirect(url_for('recruitment.opening_view', id=opening.id))
@@ -289,23 +288,104 @@ def opening_edit(id):
 @login_required
 def opening_view(id):
     opening = JobOpening.query.get_or_404(id)
-    candidates = Candidate.query.filter_by(job_opening_id=id).order_by(Candidate.application_date.desc()).all()
     
-    # Thống kê ứng viên theo trạng thái
-    candidate_stats = {}
-    for status in CandidateStatus:
-        candidate_stats[status.value] = Candidate.query.filter_by(
-            job_opening_id=id, 
-            status=status.name
-        ).count()
+    # Thống kê ứng viên theo trạng thái (một truy vấn GROUP BY)
+    status_counts = candidate_status_counts(id)
+    candidate_stats = {status.value: status_counts[status.name] for status in CandidateStatus}
+    total_candidates = sum(status_counts.values())
+    
+    # Danh sách ứng viên được phân trang theo từng giai đoạn
+    stage = request.args.get('stage', CandidateStatus.APPLIED.name)
+    if stage not in CandidateStatus.__members__:
+        stage = CandidateStatus.APPLIED.name
+    page = request.args.get('page', 1, type=int)
+    pagination = stage_candidates(id, stage, page, total=status_counts[stage])
+    
+    # Lịch phỏng vấn gần đây của đợt tuyển dụng
+    interviews = Interview.query.join(Candidate).options(joinedload(Interview.candidate)).filter(
+        Candidate.job_opening_id == id
+    ).order_by(Interview.scheduled_date.desc()).limit(5).all()
+    
+    # Ứng viên có CV phù hợp nhất với kỹ năng yêu cầu của vị trí (BM25 trên chỉ mục CV)
+    skill_matches = rank_candidates(opening.position.skills_required, opening_id=id, limit=10)
     
     return render_template('recruitment/openings/view.html',
                           opening=opening,
-                          candidates=candidates,
+                          candidates=pagination.items,
+                          pagination=pagination,
+                          stage=stage,
+                          candidate_statuses=CandidateStatus,
+                          status_counts=status_counts,
                           candidate_stats=candidate_stats,
+                          total_candidates=total_candidates,
+                          interviews=interviews,
+                          skill_matches=skill_matches,
                           title=f'Chi tiết tin tuyển dụng: {opening.position.title}')
 
 
+@recruitment_bp.route('/api/openings/<int:id>/matches')
+@login_required
+def api_opening_matches(id):
+    """
+    Xếp hạng ứng viên của đợt tuyển dụng theo kỹ năng yêu cầu.
+    ?skills=<chuỗi kỹ năng> thay cho kỹ năng yêu cầu của vị trí, ?all=1 để tìm trong mọi ứng viên.
+    """
+    opening = JobOpening.query.get_or_404(id)
+    skills = request.args.get('skills') or opening.position.skills_required
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    opening_id = None if request.args.get('all') == '1' else id
+    
+    matches = rank_candidates(skills, opening_id=opening_id, limit=limit)
+    return jsonify({
+        'skills': skills,
+        'matches': [
+            dict(candidate_to_card(match['candidate']), score=match['score'], matched=match['matched'])
+            for match in matches
+        ]
+    })
+
+
+@recruitment_bp.route('/api/openings/<int:id>/pipeline')
+@login_required
+def api_opening_pipeline(id):
+    """
+    Dữ liệu bảng Kanban của đợt tuyển dụng.
+    Không có tham số: số lượng và các ứng viên đầu tiên của mọi giai đoạn.
+    ?status=<trạng thái>&page=<n>: một trang ứng viên của một giai đoạn.
+    """
+    JobOpening.query.get_or_404(id)
+    per_page = max(1, min(request.args.get('per_page', STAGE_PAGE_SIZE, type=int), 100))
+    status_counts = candidate_status_counts(id)
+    
+    status = request.args.get('status')
+    if status:
+        if status not in CandidateStatus.__members__:
+            return jsonify({'error': 'Trạng thái không hợp lệ'}), 400
+        pagination = stage_candidates(id, status, request.args.get('page', 1, type=int), per_page,
+                                      total=status_counts[status])
+        return jsonify({
+            'opening_id': id,
+            'status': status,
+            'count': status_counts[status],
+            'page': pagination.page,
+            'next_page': pagination.next_num if pagination.has_next else None,
+            'candidates': [candidate_to_card(c) for c in pagination.items]
+        })
+    
+    preview = pipeline_preview(id, per_page)
+    return jsonify({
+        'opening_id': id,
+        'total': sum(status_counts.values()),
+        'stages': [{
+            'status': s.name,
+            'label': s.value,
+            'count': status_counts[s.name],
+            'next_page': 2 if status_counts[s.name] > per_page else None,
+            'candidates': [candidate_to_card(c) for c in preview[s.name]]
+        } for s in CandidateStatus]
+    })
+
+
 @recruitment_bp.route('/openings/<int:id>/close', methods=['POST'])
 @login_required
 def opening_close(id):
@@ -316,6 +396,7 @@ def opening_close(id):
     else:
         opening.status = JobOpeningStatus.CLOSED.name
         db.session.commit()
+        invalidate_recruitment_metrics()
         flash('Tin tuyển dụng đã được đóng thành công!', 'success')
     
     return redirect(url_for('recruitment.opening_view', id=id))
@@ -331,6 +412,7 @@ def opening_reopen(id):
     else:
         opening.status = JobOpeningStatus.OPEN.name
         db.session.commit()
+        invalidate_recruitment_metrics()
         flash('Tin tuyển dụng đã được mở lại thành công!', 'success')
     
     return redirect(url_for('recruitment.opening_view', id=id))
@@ -340,7 +422,6 @@ def opening_reopen(id):
 @recruitment_bp.route('/candidates')
 @login_required
 def candidate_list():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
     keyword = request.args.get('keyword', '')
@@ -362,7 +443,9 @@ def candidate_list():
     if opening_id:
         query = query.filter(Candidate.job_opening_id == opening_id)
     
-    pagination = query.order_by(Candidate.application_date.desc()).paginate(page=page, per_page=per_page)
+    pagination = paginate_request(
+        query, [(Candidate.application_date, True), (Candidate.id, True)], per_page, count_prefix='candidates'
+    )
     candidates = pagination.items
     
     openings = JobOpening.query.filter_by(status=JobOpeningStatus.OPEN.name).all()
@@ -398,20 +481,11 @@ def candidate_create():
         
         # Xử lý upload CV nếu có
         if form.cv_file.data:
-            filename = secure_filename(form.cv_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"cv_{candidate.full_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/recruitment/cv')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            cv_path = os.path.join(uploads_dir, new_filename)
-            form.cv_file.data.save(cv_path)
-            candidate.cv_file = f"uploads/recruitment/cv/{new_filename}"
+            candidate.cv_file = store_upload(form.cv_file.data)
         
         db.session.add(candidate)
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Hồ sơ ứng viên mới đã được tạo thành công!', 'success')
         return redirect(url_for('recruitment.candidate_view', id=candidate.id))
@@ -441,25 +515,11 @@ def candidate_edit(id):
         
         # Xử lý upload CV mới nếu có
         if form.cv_file.data:
-            # Xóa CV cũ nếu có
-            if candidate.cv_file:
-                old_cv_path = os.path.join(current_app.root_path, 'static', candidate.cv_file)
-                if os.path.exists(old_cv_path):
-                    os.remove(old_cv_path)
-            
-            filename = secure_filename(form.cv_file.data.filename)
-            file_ext = os.path.splitext(filename)[1]
-            new_filename = f"cv_{candidate.full_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d%H%M%S')}{file_ext}"
-            
-            uploads_dir = os.path.join(current_app.root_path, 'static/uploads/recruitment/cv')
-            if not os.path.exists(uploads_dir):
-                os.makedirs(uploads_dir)
-                
-            cv_path = os.path.join(uploads_dir, new_filename)
-            form.cv_file.data.save(cv_path)
-            candidate.cv_file = f"uploads/recruitment/cv/{new_filename}"
+            # Lưu CV mới và bỏ tham chiếu tới CV cũ
+            candidate.cv_file = replace_file(candidate.cv_file, form.cv_file.data)
         
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Hồ sơ ứng viên đã được cập nhật!', 'success')
         return redirect(url_for('recruitment.candidate_view', id=candidate.id))
@@ -482,6 +542,20 @@ def candidate_view(id):
                           title=f'Chi tiết ứng viên: {candidate.full_name}')
 
 
+@recruitment_bp.route('/candidates/<int:id>/cv')
+@login_required
+def candidate_cv(id):
+    candidate = Candidate.query.get_or_404(id)
+    
+    if not candidate.cv_file:
+        flash('Ứng viên chưa có CV!', 'warning')
+        return redirect(url_for('recruitment.candidate_view', id=id))
+    
+    return send_stored_file(candidate.cv_file,
+                            download_name=f"cv_{candidate.full_name.replace(' ', '_')}",
+                            as_attachment=request.args.get('inline') != '1')
+
+
 @recruitment_bp.route('/candidates/<int:id>/update-status', methods=['POST'])
 @login_required
 def candidate_update_status(id):
@@ -494,6 +568,7 @@ def candidate_update_status(id):
     
     candidate.status = status
     db.session.commit()
+    invalidate_recruitment_metrics()
     
     flash(f'Trạng thái ứng viên đã được cập nhật thành {dict([(s.name, s.value) for s in CandidateStatus])[status]}!', 'success')
     return redirect(url_for('recruitment.candidate_view', id=id))
@@ -568,9 +643,20 @@ def interview_create():
                                   form=form,
                                   title='Lên lịch phỏng vấn')
         
+        # Kiểm tra trùng lịch người phỏng vấn và phòng
+        conflicts = find_interview_conflicts(
+            scheduled_datetime, interview_end(scheduled_datetime, form.duration_minutes.data),
+            form.interviewer_ids.data, form.room_id.data
+        )
+        messages = describe_conflicts(conflicts)
+        if messages:
+            flash(' '.join(messages), 'danger')
+            return render_template('recruitment/interviews/create.html',
+                                  form=form,
+                                  title='Lên lịch phỏng vấn')
+        
         interview = Interview(
             candidate_id=form.candidate_id.data,
-            scheduled_date=scheduled_datetime,
             interview_type=form.interview_type.data,
             interviewers=form.interviewers.data,
             location=form.location.data,
@@ -578,6 +664,8 @@ def interview_create():
             feedback=form.feedback.data,
             rating=form.rating.data if form.rating.data else None
         )
+        set_interview_schedule(interview, scheduled_datetime, form.duration_minutes.data,
+                               form.room_id.data, form.interviewer_ids.data)
         
         # Cập nhật trạng thái ứng viên
         candidate = Candidate.query.get(form.candidate_id.data)
@@ -586,6 +674,7 @@ def interview_create():
         
         db.session.add(interview)
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Lịch phỏng vấn đã được tạo thành công!', 'success')
         return redirect(url_for('recruitment.interview_view', id=interview.id))
@@ -602,9 +691,11 @@ def interview_edit(id):
     form = InterviewEditForm(obj=interview)
     form.interview_id.data = interview.id
     
-    # Pre-fill scheduled_time
+    # Pre-fill scheduled_time, người phỏng vấn và phòng
     if request.method == 'GET':
         form.scheduled_time.data = interview.scheduled_date.strftime('%H:%M')
+        form.interviewer_ids.data = [panelist.employee_id for panelist in interview.panelists]
+        form.room_id.data = interview.room_id or 0
     
     if form.validate_on_submit():
         # Kết hợp ngày và giờ
@@ -622,8 +713,22 @@ def interview_edit(id):
                                   interview=interview,
                                   title='Chỉnh sửa lịch phỏng vấn')
         
+        # Kiểm tra trùng lịch, bỏ qua chính buổi phỏng vấn đang sửa
+        conflicts = find_interview_conflicts(
+            scheduled_datetime, interview_end(scheduled_datetime, form.duration_minutes.data),
+            form.interviewer_ids.data, form.room_id.data, exclude_interview_id=interview.id
+        )
+        messages = describe_conflicts(conflicts)
+        if messages and form.status.data in (InterviewStatus.SCHEDULED.name, InterviewStatus.RESCHEDULED.name):
+            flash(' '.join(messages), 'danger')
+            return render_template('recruitment/interviews/edit.html',
+                                  form=form,
+                                  interview=interview,
+                                  title='Chỉnh sửa lịch phỏng vấn')
+        
         interview.candidate_id = form.candidate_id.data
-        interview.scheduled_date = scheduled_datetime
+        set_interview_schedule(interview, scheduled_datetime, form.duration_minutes.data,
+                               form.room_id.data, form.interviewer_ids.data)
         interview.interview_type = form.interview_type.data
         interview.interviewers = form.interviewers.data
         interview.location = form.location.data
@@ -638,6 +743,7 @@ def interview_edit(id):
                 candidate.status = CandidateStatus.INTERVIEWED.name
         
         db.session.commit()
+        invalidate_recruitment_metrics()
         
         flash('Lịch phỏng vấn đã được cập nhật!', 'success')
         return redirect(url_for('recruitment.interview_view', id=interview.id))
@@ -675,6 +781,7 @@ def interview_complete(id):
         candidate.status = CandidateStatus.INTERVIEWED.name
     
     db.session.commit()
+    invalidate_recruitment_metrics()
     
     flash('Phỏng vấn đã được hoàn thành!', 'success')
     return redirect(url_for('recruitment.interview_view', id=id))
@@ -690,12 +797,124 @@ def interview_cancel(id):
     interview.feedback = f"Đã hủy: {reason}"
     
     db.session.commit()
+    invalidate_recruitment_metrics()
     
     flash('Phỏng vấn đã được hủy!', 'success')
     return redirect(url_for('recruitment.interview_view', id=id))
 
 
+@recruitment_bp.route('/rooms', methods=['GET', 'POST'])
+@login_required
+def room_list():
+    form = InterviewRoomForm()
+    
+    if form.validate_on_submit():
+        room = InterviewRoom(
+            name=form.name.data,
+            location=form.location.data,
+            capacity=form.capacity.data,
+            is_active=form.is_active.data
+        )
+        db.session.add(room)
+        db.session.commit()
+        
+        flash('Phòng phỏng vấn đã được tạo thành công!', 'success')
+        return redirect(url_for('recruitment.room_list'))
+    
+    rooms = InterviewRoom.query.order_by(InterviewRoom.name).all()
+    return render_template('recruitment/rooms/index.html',
+                          form=form,
+                          rooms=rooms,
+                          title='Phòng phỏng vấn')
+
+
+@recruitment_bp.route('/rooms/<int:id>/toggle', methods=['POST'])
+@login_required
+def room_toggle(id):
+    room = InterviewRoom.query.get_or_404(id)
+    room.is_active = not room.is_active
+    db.session.commit()
+    
+    flash(f'Phòng {room.name} đã được {"mở lại" if room.is_active else "ngừng sử dụng"}!', 'success')
+    return redirect(url_for('recruitment.room_list'))
+
+
+def _id_list(name):
+    """Danh sách ID từ tham số query, dạng ?name=1,2,3 hoặc ?name=1&name=2"""
+    ids = []
+    for value in request.args.getlist(name):
+        ids.extend(int(part) for part in value.split(',') if part.strip().isdigit())
+    return ids
+
+
+def _parse_datetime_arg(name, default=None):
+    value = request.args.get(name)
+    if not value:
+        return default
+    return datetime.fromisoformat(value)
+
+
 # API endpoints
+@recruitment_bp.route('/api/interviews/conflicts')
+@login_required
+def api_interview_conflicts():
+    """
+    Kiểm tra trùng lịch của một buổi phỏng vấn dự kiến.
+    ?start=<ISO datetime>&duration=<phút>&interviewer_ids=1,2&room_id=<id>&exclude_id=<id>
+    """
+    try:
+        start = _parse_datetime_arg('start')
+    except ValueError:
+        return jsonify({"error": "Thời gian bắt đầu không hợp lệ"}), 400
+    if start is None:
+        return jsonify({"error": "Thiếu thời gian bắt đầu"}), 400
+    
+    end = interview_end(start, request.args.get('duration', type=int))
+    conflicts = find_interview_conflicts(start, end, _id_list('interviewer_ids'),
+                                         request.args.get('room_id', type=int),
+                                         request.args.get('exclude_id', type=int))
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'has_conflicts': any(conflicts.values()),
+        'messages': describe_conflicts(conflicts),
+        'conflicts': conflicts_to_dict(conflicts),
+    })
+
+
+@recruitment_bp.route('/api/interviews/free-slots')
+@login_required
+def api_interview_free_slots():
+    """
+    Các giờ trống sớm nhất chung cho người phỏng vấn và phòng.
+    ?interviewer_ids=1,2&room_ids=3,4&duration=<phút>&start=<ISO datetime>&days=<số ngày>&limit=<n>
+    """
+    try:
+        window_start = _parse_datetime_arg('start', datetime.now())
+    except ValueError:
+        return jsonify({"error": "Thời gian bắt đầu không hợp lệ"}), 400
+    days = min(max(request.args.get('days', 7, type=int), 1), 31)
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+    room_ids = _id_list('room_ids')
+    
+    slots = find_free_slots(
+        _id_list('interviewer_ids'),
+        duration_minutes=request.args.get('duration', type=int),
+        window_start=window_start,
+        window_end=window_start + timedelta(days=days),
+        room_ids=room_ids or None,
+        limit=limit,
+        exclude_interview_id=request.args.get('exclude_id', type=int)
+    )
+    room_names = dict(InterviewRoom.query.with_entities(InterviewRoom.id, InterviewRoom.name)
+                      .filter(InterviewRoom.id.in_(room_ids)).all()) if room_ids else {}
+    return jsonify({'slots': [
+        {'start': slot['start'].isoformat(), 'end': slot['end'].isoformat(),
+         'room_id': slot['room_id'], 'room_name': room_names.get(slot['room_id'])}
+        for slot in slots
+    ]})
+
+
 @recruitment_bp.route('/api/positions')
 @login_required
 def api_positions():
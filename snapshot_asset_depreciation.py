@@ -0,0 +1,49 @@
+"""
+Script để tính khấu hao và lưu giá trị còn lại của toàn bộ tài sản theo tháng
+Script này có thể được chạy tự động thông qua cron vào cuối mỗi tháng
+"""
+import sys
+import logging
+from datetime import date, datetime
+from app import app
+from utils_depreciation import save_snapshot
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python snapshot_asset_depreciation.py [YYYY-MM]
+    - YYYY-MM: Kỳ cần tính (mặc định tháng hiện tại)
+    """
+    try:
+        period = date.today()
+        if len(sys.argv) > 1:
+            period = datetime.strptime(sys.argv[1], '%Y-%m').date()
+        
+        logger.info(f"Tính khấu hao tài sản kỳ {period:%m/%Y}...")
+        
+        with app.app_context():
+            started = datetime.now()
+            count = save_snapshot(period)
+            elapsed = (datetime.now() - started).total_seconds()
+            
+            logger.info(f"Đã hoàn thành, {count} tài sản đã được tính trong {elapsed:.1f} giây.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
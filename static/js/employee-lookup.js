@@ -0,0 +1,44 @@
+// employee-lookup.js - Ô chọn nhân viên tìm kiếm từ xa qua /api/employees/lookup
+
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('select[data-employee-lookup]').forEach(setupEmployeeLookup);
+});
+
+// Thêm ô tìm kiếm phía trên select, nạp các lựa chọn khớp từ API
+function setupEmployeeLookup(select) {
+  const url = select.getAttribute('data-employee-lookup');
+  const searchInput = document.createElement('input');
+  searchInput.type = 'search';
+  searchInput.className = 'form-control form-control-sm mb-1';
+  searchInput.placeholder = 'Nhập mã hoặc tên nhân viên...';
+  select.parentNode.insertBefore(searchInput, select);
+
+  // Các lựa chọn render sẵn từ server (lựa chọn mặc định và nhân viên đang chọn) luôn được giữ lại
+  const fixedValues = new Set(Array.from(select.options).map(opt => opt.value));
+  let timer = null;
+
+  searchInput.addEventListener('input', function() {
+    clearTimeout(timer);
+    const q = searchInput.value.trim();
+    if (!q) return;
+
+    timer = setTimeout(function() {
+      fetch(url + '&q=' + encodeURIComponent(q))
+        .then(response => response.json())
+        .then(data => {
+          Array.from(select.options).forEach(opt => {
+            if (!fixedValues.has(opt.value) && !opt.selected) {
+              opt.remove();
+            }
+          });
+          const existing = new Set(Array.from(select.options).map(opt => opt.value));
+          data.results.forEach(item => {
+            if (!existing.has(String(item.id))) {
+              select.add(new Option(item.text, item.id));
+            }
+          });
+        })
+        .catch(error => console.error('Lỗi khi tìm nhân viên:', error));
+    }, 250);
+  });
+}
@@ -0,0 +1,43 @@
+"""
+Cấu hình chung cho các test: ứng dụng chạy trên một database SQLite tạm.
+
+Ứng dụng tạo bảng và seed dữ liệu mẫu ngay khi import app; một phòng ban được tạo sẵn
+trong database tạm để bỏ qua bước seed.
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TEMP_DIR = tempfile.mkdtemp(prefix='hrm-test-')
+_DB_PATH = os.path.join(_TEMP_DIR, 'test.db')
+
+with sqlite3.connect(_DB_PATH) as _conn:
+    _conn.execute('CREATE TABLE department (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, '
+                  'description TEXT, created_at DATETIME, updated_at DATETIME)')
+    _conn.execute("INSERT INTO department (name) VALUES ('Phòng thử nghiệm')")
+
+os.environ['DATABASE_URL'] = f'sqlite:///{_DB_PATH}'
+os.environ['FILE_STORAGE_DIR'] = os.path.join(_TEMP_DIR, 'storage')
+
+# models phải được import qua app (app import models khi khởi tạo)
+import app as _app  # noqa: E402,F401
+
+
+@pytest.fixture
+def app():
+    from app import app, db
+    with app.app_context():
+        yield app
+        db.session.rollback()
+
+
+@pytest.fixture
+def db(app):
+    from app import db
+    return db
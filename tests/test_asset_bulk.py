@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+from utils_asset_bulk import bulk_assign, bulk_return, BulkError
+
+
+@pytest.mark.parametrize('handler', [bulk_assign, bulk_return])
+@pytest.mark.parametrize('rows', [None, [], ['A001'], [{'asset_code': 'A001'}, None]])
+def test_invalid_batches_are_rejected(app, handler, rows):
+    with pytest.raises(BulkError):
+        handler(rows, created_by_id=1, dry_run=True)
+
+
+@pytest.fixture
+def asset(db):
+    from models import Asset, AssetAssignment, AssetEvent, AssetState, Employee, EmployeeStatus, Gender
+    employee = Employee(employee_code='NV-TS', full_name='Võ Văn E', gender=Gender.MALE,
+                        date_of_birth=date(1988, 3, 1), email='e@example.com', department_id=1,
+                        join_date=date(2019, 1, 1), status=EmployeeStatus.ACTIVE)
+    asset = Asset(asset_code='TS-BULK-1', name='Máy tính xách tay')
+    db.session.add_all([employee, asset])
+    db.session.commit()
+    yield asset
+    for model in (AssetEvent, AssetState, AssetAssignment):
+        model.query.filter_by(asset_id=asset.id).delete()
+    db.session.delete(asset)
+    db.session.delete(employee)
+    db.session.commit()
+
+
+def test_bulk_return_keeps_broken_asset_broken(db, asset):
+    from models import AssetStatus, AssetState
+    from utils_asset_events import change_status, replay_state
+
+    assert bulk_assign([{'asset_code': 'TS-BULK-1', 'employee_code': 'NV-TS'}])['processed'] == 1
+    db.session.commit()
+    assert asset.status == AssetStatus.ASSIGNED
+
+    change_status(asset, AssetStatus.BROKEN)
+    db.session.commit()
+    assert bulk_return([{'asset_code': 'TS-BULK-1'}])['processed'] == 1
+    db.session.commit()
+    db.session.expire_all()
+
+    state = db.session.get(AssetState, asset.id)
+    assert asset.status == state.status == replay_state(asset.id).status == AssetStatus.BROKEN
+    assert state.holder_id is None and asset.assignee_id is None
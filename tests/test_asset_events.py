@@ -0,0 +1,29 @@
+from models import AssetStatus, AssetEventType as Event
+from utils_asset_events import _new_state, apply_event, manual_status_choices
+
+
+def _replay(*events, holder=7):
+    state = _new_state(1)
+    for event_type in events:
+        apply_event(state, event_type, employee_id=holder if event_type == Event.ASSIGNED else None)
+    return state.status
+
+
+def test_broken_is_kept_until_restored_or_repaired():
+    assert _replay(Event.ASSIGNED, Event.MARKED_BROKEN, Event.RETURNED) == AssetStatus.BROKEN
+    assert _replay(Event.ASSIGNED, Event.MARKED_BROKEN, Event.RESTORED) == AssetStatus.ASSIGNED
+    assert _replay(Event.MARKED_BROKEN, Event.MAINTENANCE_STARTED) == AssetStatus.UNDER_MAINTENANCE
+    assert _replay(Event.MARKED_BROKEN, Event.MAINTENANCE_STARTED, Event.MAINTENANCE_COMPLETED) == \
+        AssetStatus.AVAILABLE
+
+
+def test_discarded_is_kept_until_restored():
+    assert _replay(Event.ASSIGNED, Event.DISCARDED, Event.MAINTENANCE_STARTED) == AssetStatus.DISCARDED
+    assert _replay(Event.ASSIGNED, Event.DISCARDED, Event.RESTORED) == AssetStatus.AVAILABLE
+
+
+def test_manual_status_choices():
+    assert manual_status_choices(AssetStatus.ASSIGNED) == \
+        [AssetStatus.ASSIGNED, AssetStatus.BROKEN, AssetStatus.DISCARDED]
+    assert manual_status_choices('BROKEN') == \
+        [AssetStatus.BROKEN, AssetStatus.AVAILABLE, AssetStatus.DISCARDED]
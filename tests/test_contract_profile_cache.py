@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+
+from models import Contract, ContractStatus, ContractType, Employee, Gender
+from utils_contract import expire_contracts, sync_employee_contract_dates
+from utils_profile import get_profile
+
+
+@pytest.fixture
+def contract(db):
+    employee = Employee(employee_code='NV-HD', full_name='Phạm Thị D', gender=Gender.FEMALE,
+                        date_of_birth=date(1992, 5, 1), email='d@example.com', department_id=1,
+                        join_date=date(2021, 1, 1))
+    db.session.add(employee)
+    db.session.flush()
+    contract = Contract(employee_id=employee.id, contract_number='HD-TEST-1', contract_type=ContractType.FIXED_TERM,
+                        start_date=date(2024, 1, 1), end_date=date(2025, 12, 31), status=ContractStatus.ACTIVE,
+                        job_title='Kế toán', base_salary=10_000_000, department_id=1)
+    db.session.add(contract)
+    db.session.commit()
+    yield contract
+    db.session.delete(contract)
+    db.session.delete(employee)
+    db.session.commit()
+
+
+def test_expire_contracts_invalidates_cached_profile(db, contract):
+    assert get_profile(contract.employee_id)['contracts'][0]['status'] == 'ACTIVE'
+
+    assert expire_contracts(date(2026, 1, 15)) == 1
+    db.session.commit()
+
+    assert get_profile(contract.employee_id)['contracts'][0]['status'] == 'EXPIRED'
+
+
+def test_contract_date_sync_invalidates_cached_profile(db, contract):
+    db.session.query(Employee).filter_by(id=contract.employee_id).update({'contract_end_date': None})
+    db.session.commit()
+    assert get_profile(contract.employee_id)['employee']['contract_end_date'] is None
+
+    assert sync_employee_contract_dates() == 1
+    db.session.commit()
+
+    assert get_profile(contract.employee_id)['employee']['contract_end_date'] == '2025-12-31'
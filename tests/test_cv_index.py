@@ -0,0 +1,61 @@
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from utils_cv_index import extract_text, index_candidate_cvs, rank_candidates
+
+
+def _docx(text):
+    """File DOCX tối giản chứa một đoạn văn"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p></w:body></w:document>'
+        ))
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def storage(tmp_path):
+    import utils_storage
+    previous = utils_storage._backend
+    utils_storage.set_backend(utils_storage.LocalStorageBackend(str(tmp_path)))
+    yield utils_storage
+    utils_storage.set_backend(previous)
+
+
+def test_extract_text_uses_given_extension(tmp_path):
+    path = tmp_path / 'a1b2c3'
+    path.write_bytes(_docx('Kỹ năng Python').read())
+
+    assert extract_text(str(path), '.docx') == 'Kỹ năng Python'
+    with pytest.raises(ValueError):
+        extract_text(str(path))
+
+
+def test_index_candidate_cv_stored_by_content(db, storage):
+    from models import Candidate, CandidateCvIndex
+
+    cv_file = storage.store_upload(FileStorage(stream=_docx('Lập trình Python, PostgreSQL và Flask'),
+                                               filename='cv.docx'))
+    candidate = Candidate(job_opening_id=1, full_name='Trần Thị B', email='b@example.com', cv_file=cv_file)
+    db.session.add(candidate)
+    db.session.commit()
+
+    try:
+        index_candidate_cvs(workers=1)
+        entry = db.session.get(CandidateCvIndex, candidate.id)
+        assert entry.error is None
+        assert entry.doc_length > 0
+
+        ranked = rank_candidates('Python, Flask')
+        assert [row['candidate'].id for row in ranked] == [candidate.id]
+        assert ranked[0]['matched'] == ['python', 'flask']
+    finally:
+        storage.release_file(cv_file)
+        db.session.delete(candidate)
+        db.session.commit()
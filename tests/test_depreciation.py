@@ -0,0 +1,68 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from models import DepreciationMethod
+from utils_depreciation import compute_book_values, _METHOD_CODES
+
+
+def _register(method, cost, life, salvage_rate=0, factor=2.0, purchased='2024-01'):
+    return {
+        'asset_id': np.array([1], dtype=np.int64),
+        'category_id': np.array([1], dtype=np.int64),
+        'purchase_month': np.array([purchased], dtype='datetime64[M]'),
+        'cost': np.array([cost], dtype=float),
+        'method': np.array([_METHOD_CODES[method]], dtype=np.int8),
+        'life': np.array([life], dtype=float),
+        'salvage_rate': np.array([salvage_rate], dtype=float) / 100,
+        'factor': np.array([factor], dtype=float),
+    }
+
+
+def _book_value(register, as_of):
+    accumulated, book_value = compute_book_values(register, as_of)
+    assert accumulated[0] + book_value[0] == pytest.approx(register['cost'][0])
+    return book_value[0]
+
+
+@pytest.mark.parametrize('as_of, expected', [
+    (date(2024, 1, 20), 111_000),
+    (date(2024, 3, 1), 93_000),
+    (date(2024, 12, 31), 12_000),
+    (date(2026, 6, 1), 12_000),
+])
+def test_straight_line(as_of, expected):
+    register = _register(DepreciationMethod.STRAIGHT_LINE, 120_000, 12, salvage_rate=10)
+    # Mỗi tháng khấu hao (120.000 - 12.000) / 12 = 9.000
+    assert _book_value(register, as_of) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('month, expected', [
+    (1, 600), (2, 360), (3, 216),
+    # Tháng 4: đường thẳng 216 / 2 = 108 lớn hơn 216 * 0,4 = 86,4 nên chuyển sang đường thẳng
+    (4, 108), (5, 0), (8, 0),
+])
+def test_declining_balance_switches_to_straight_line(month, expected):
+    register = _register(DepreciationMethod.DECLINING_BALANCE, 1000, 5)
+    assert _book_value(register, date(2024, month, 1)) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('month, expected', [
+    (3, 216), (4, 129.6), (5, 100), (6, 100),
+])
+def test_declining_balance_stops_at_salvage(month, expected):
+    register = _register(DepreciationMethod.DECLINING_BALANCE, 1000, 5, salvage_rate=10)
+    assert _book_value(register, date(2024, month, 1)) == pytest.approx(expected)
+
+
+def test_declining_balance_is_monotonic_over_life():
+    register = _register(DepreciationMethod.DECLINING_BALANCE, 50_000_000, 60, salvage_rate=5, factor=1.5)
+    values = [_book_value(register, date(2024 + (m - 1) // 12, (m - 1) % 12 + 1, 1)) for m in range(1, 61)]
+    assert all(a >= b for a, b in zip(values, values[1:]))
+    assert values[-1] == pytest.approx(2_500_000)
+
+
+def test_without_method_keeps_cost():
+    register = _register(DepreciationMethod.NONE, 5000, 12)
+    assert _book_value(register, date(2025, 1, 1)) == pytest.approx(5000)
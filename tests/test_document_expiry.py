@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('sendgrid')  # notifications cần sendgrid
+
+import utils_document  # noqa: E402
+from models import Document, DocumentType, Employee, EmployeeStatus, Gender  # noqa: E402
+
+TODAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def sweep(db, monkeypatch):
+    """Chạy quét vào một ngày, trả về {loại giấy tờ: số ngày còn lại} đã được nhắc"""
+    sent = []
+    delivery = {'ok': True}
+    monkeypatch.setattr(utils_document, 'send_document_expiry_notification',
+                        lambda email, name, documents: sent.extend(documents) or delivery['ok'])
+    monkeypatch.setattr(utils_document, 'send_document_expiry_digest', lambda *args: 0)
+
+    def run(day, delivered=True):
+        sent.clear()
+        delivery['ok'] = delivered
+        utils_document.sweep_expiring_documents(day)
+        return {document['document_type']: document['days_remaining'] for document in sent}
+    return run
+
+
+@pytest.fixture
+def employee(db):
+    employee = Employee(employee_code='NV-DOC', full_name='Lê Văn C', gender=Gender.MALE,
+                        date_of_birth=date(1990, 1, 1), email='c@example.com', department_id=1,
+                        join_date=date(2020, 1, 1), status=EmployeeStatus.ACTIVE)
+    db.session.add(employee)
+    db.session.commit()
+    yield employee
+    Document.query.filter_by(employee_id=employee.id).delete()
+    db.session.delete(employee)
+    db.session.commit()
+
+
+def _document(db, employee, document_type, expiry_date):
+    document = Document(employee_id=employee.id, document_type=document_type, expiry_date=expiry_date,
+                        file_path='stored/test', is_verified=True)
+    db.session.add(document)
+    db.session.commit()
+    return document
+
+
+def test_each_stage_is_reminded_once(db, employee, sweep):
+    _document(db, employee, DocumentType.ID_CARD, TODAY + timedelta(days=45))
+
+    assert sweep(TODAY) == {DocumentType.ID_CARD.value: 45}
+    assert sweep(TODAY + timedelta(days=1)) == {}
+    # Mốc 30 ngày rơi vào ngày không chạy quét: nhắc ở lần quét kế tiếp
+    assert sweep(TODAY + timedelta(days=17)) == {DocumentType.ID_CARD.value: 28}
+    assert sweep(TODAY + timedelta(days=18)) == {}
+
+
+def test_expired_document_is_reminded_once(db, employee, sweep):
+    _document(db, employee, DocumentType.HEALTH_CERTIFICATE, TODAY - timedelta(days=3))
+
+    assert sweep(TODAY) == {DocumentType.HEALTH_CERTIFICATE.value: -3}
+    assert sweep(TODAY + timedelta(days=1)) == {}
+
+
+def test_renewed_document_is_reminded_again(db, employee, sweep):
+    document = _document(db, employee, DocumentType.INSURANCE_CARD, TODAY + timedelta(days=5))
+    assert sweep(TODAY) == {DocumentType.INSURANCE_CARD.value: 5}
+
+    document.expiry_date = TODAY + timedelta(days=20)
+    db.session.commit()
+    assert sweep(TODAY) == {DocumentType.INSURANCE_CARD.value: 20}
+
+
+def test_failed_notification_is_retried(db, employee, sweep):
+    _document(db, employee, DocumentType.ID_CARD, TODAY + timedelta(days=7))
+
+    assert sweep(TODAY, delivered=False) == {DocumentType.ID_CARD.value: 7}
+    assert sweep(TODAY + timedelta(days=1)) == {DocumentType.ID_CARD.value: 6}
+    assert sweep(TODAY + timedelta(days=2)) == {}
+
+
+def test_dry_run_does_not_record_reminders(db, employee):
+    _document(db, employee, DocumentType.ID_CARD, TODAY + timedelta(days=7))
+
+    assert utils_document.sweep_expiring_documents(TODAY, notify=False)['documents'] == 1
+    assert utils_document.sweep_expiring_documents(TODAY, notify=False)['documents'] == 1
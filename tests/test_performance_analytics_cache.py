@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+
+from models import Employee, Gender, PerformanceEvaluation, PerformanceRatingPeriod, PerformanceRatingStatus
+from utils_cache import cached
+from utils_performance_analytics import analytics_cache_key, invalidate_performance_analytics
+
+
+@pytest.fixture
+def evaluation(db):
+    employee = Employee(employee_code='NV-DG', full_name='Đỗ Thị F', gender=Gender.FEMALE,
+                        date_of_birth=date(1994, 7, 1), email='f@example.com', department_id=1,
+                        join_date=date(2022, 1, 1))
+    db.session.add(employee)
+    db.session.flush()
+    evaluation = PerformanceEvaluation(employee_id=employee.id, evaluator_id=1,
+                                       evaluation_period=PerformanceRatingPeriod.ANNUAL,
+                                       start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+                                       status=PerformanceRatingStatus.COMPLETED)
+    db.session.add(evaluation)
+    db.session.commit()
+    yield evaluation
+    PerformanceEvaluation.query.filter_by(employee_id=employee.id).delete()
+    db.session.delete(employee)
+    db.session.commit()
+
+
+def _cached_value(key):
+    return cached(key, lambda: 'mới')
+
+
+def test_analytics_cache_is_cleared_only_after_commit(db, evaluation):
+    key = analytics_cache_key('ANNUAL', 2025, 1)
+    assert cached(key, lambda: 'cũ') == 'cũ'
+
+    invalidate_performance_analytics(evaluation)
+    assert _cached_value(key) == 'cũ'
+    db.session.rollback()
+    assert _cached_value(key) == 'cũ'
+
+    invalidate_performance_analytics(evaluation)
+    db.session.delete(evaluation)
+    db.session.commit()
+    assert _cached_value(key) == 'mới'
@@ -0,0 +1,351 @@
+"""
+Bàn giao / thu hồi tài sản hàng loạt (đợt tiếp nhận, nghỉ việc) qua API JSON hoặc file CSV.
+
+- Toàn bộ tài sản, nhân viên, bàn giao đang mở của lô được đọc bằng một truy vấn cho mỗi loại.
+- Các dòng hợp lệ được ghi cùng một giao dịch bằng INSERT/UPDATE nhiều dòng: asset_assignments,
+  asset_events, asset_states và cột status/assignee_id của assets; trạng thái mới được tính bằng
+  apply_event() của utils_asset_events nên khớp với việc phát lại nhật ký.
+- Dòng không hợp lệ không chặn cả lô, được trả về kèm số dòng và lý do.
+"""
+import csv
+import io
+from datetime import date, datetime
+
+from sqlalchemy import select, insert, update
+
+from app import db
+from models import (Asset, AssetStatus, AssetAssignment, AssetEvent, AssetEventType, AssetState,
+                    Employee, EmployeeStatus)
+from utils_asset_events import initial_state, apply_event
+from utils_profile import mark_profiles_stale
+
+# Số dòng tối đa của một lô
+MAX_BULK_ROWS = 5000
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+ASSIGN_CSV_COLUMNS = ('asset_code', 'employee_code', 'assigned_date', 'condition', 'notes')
+RETURN_CSV_COLUMNS = ('asset_code', 'return_date', 'condition', 'notes')
+
+
+class BulkError(ValueError):
+    """Lỗi của cả lô (không đọc được file, quá số dòng...)"""
+
+
+def parse_date(value, default=None):
+    """
+    Đọc ngày dạng YYYY-MM-DD hoặc DD/MM/YYYY
+
+    Raises:
+        ValueError: Ngày không hợp lệ
+    """
+    if value in (None, ''):
+        return default
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Ngày không hợp lệ: {value}")
+
+
+def read_csv(file_storage, columns):
+    """
+    Đọc file CSV tải lên thành danh sách dict theo các cột cho trước
+
+    Raises:
+        BulkError: File không đọc được, thiếu cột hoặc quá số dòng cho phép
+    """
+    try:
+        text = file_storage.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise BulkError('File CSV phải được lưu với mã hóa UTF-8')
+    reader = csv.DictReader(io.StringIO(text))
+    header = [name.strip() for name in (reader.fieldnames or [])]
+    if 'asset_code' not in header:
+        raise BulkError(f"File CSV phải có dòng tiêu đề gồm các cột: {', '.join(columns)}")
+    reader.fieldnames = header
+    rows = [{key: (row.get(key) or '').strip() for key in columns} for row in reader]
+    if len(rows) > MAX_BULK_ROWS:
+        raise BulkError(f"Mỗi lần chỉ xử lý tối đa {MAX_BULK_ROWS} dòng")
+    return rows
+
+
+def _check_rows(rows):
+    if not isinstance(rows, list) or not rows:
+        raise BulkError('Danh sách trống')
+    if len(rows) > MAX_BULK_ROWS:
+        raise BulkError(f"Mỗi lần chỉ xử lý tối đa {MAX_BULK_ROWS} dòng")
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            raise BulkError(f"Dòng {index}: mỗi dòng phải là một đối tượng JSON")
+
+
+def _load_assets(rows, lock=True):
+    """Đọc các tài sản được nhắc tới trong lô theo mã hoặc ID (một truy vấn, khóa dòng nếu database hỗ trợ)"""
+    codes = {str(row.get('asset_code')).strip() for row in rows if row.get('asset_code')}
+    ids = {row.get('asset_id') for row in rows if isinstance(row.get('asset_id'), int)}
+    query = select(Asset.id, Asset.asset_code, Asset.status).where(
+        Asset.asset_code.in_(codes) | Asset.id.in_(ids)
+    )
+    if lock:
+        query = query.with_for_update()
+    found = db.session.execute(query).all()
+    return {row.asset_code: row for row in found}, {row.id: row for row in found}
+
+
+def _find_asset(row, by_code, by_id):
+    if row.get('asset_code'):
+        return by_code.get(str(row['asset_code']).strip())
+    return by_id.get(row.get('asset_id'))
+
+
+def _load_states(asset_ids):
+    """Trạng thái hiện tại của các tài sản đã có trạng thái (bản tạm, không gắn với session): {asset_id: AssetState}"""
+    rows = db.session.execute(
+        select(AssetState.asset_id, AssetState.status, AssetState.holder_id, AssetState.assignment_id,
+               AssetState.open_maintenance).where(AssetState.asset_id.in_(asset_ids))
+    ).all()
+    return {row.asset_id: AssetState(**row._asdict()) for row in rows}
+
+
+def _apply_events(items, event_type, statuses, states, event_ids):
+    """
+    Áp dụng sự kiện lên trạng thái của từng tài sản trong lô (cùng quy tắc apply_event của record_event)
+
+    Args:
+        items (list): dict {'asset_id', 'employee_id', 'assignment_id'}
+        statuses (dict): {asset_id: trạng thái trên assets} dùng khi tài sản chưa có trạng thái
+
+    Returns:
+        list: Các thay đổi cho _write_states()
+    """
+    changes = []
+    for item in items:
+        asset_id = item['asset_id']
+        state = states.get(asset_id) or initial_state(asset_id, statuses[asset_id])
+        apply_event(state, event_type, item.get('employee_id'), item.get('assignment_id'))
+        changes.append({
+            'asset_id': asset_id,
+            'status': state.status,
+            'holder_id': state.holder_id,
+            'assignment_id': state.assignment_id,
+            'open_maintenance': state.open_maintenance or 0,
+            'last_event_id': event_ids[asset_id],
+        })
+    return changes
+
+
+def _write_states(changes, states):
+    """Cập nhật hoặc tạo asset_states và đồng bộ assets cho các tài sản đã thay đổi (nhiều dòng mỗi lệnh)"""
+    updates = [change for change in changes if change['asset_id'] in states]
+    inserts = [change for change in changes if change['asset_id'] not in states]
+    now = datetime.now()
+    if updates:
+        db.session.execute(update(AssetState), [dict(change, updated_at=now) for change in updates])
+    if inserts:
+        db.session.execute(insert(AssetState), [dict(change, updated_at=now) for change in inserts])
+    db.session.execute(update(Asset), [
+        {'id': change['asset_id'], 'status': change['status'], 'assignee_id': change['holder_id'], 'updated_at': now}
+        for change in changes
+    ])
+
+
+def _insert_events(events):
+    """Ghi các sự kiện, trả về {asset_id: event_id}"""
+    result = db.session.execute(insert(AssetEvent).returning(AssetEvent.id, AssetEvent.asset_id), events)
+    return {asset_id: event_id for event_id, asset_id in result}
+
+
+def bulk_assign(rows, created_by_id=None, dry_run=False):
+    """
+    Bàn giao hàng loạt tài sản cho nhân viên (không commit)
+
+    Args:
+        rows (list): dict {asset_code | asset_id, employee_code | employee_id, assigned_date, condition, notes}
+        created_by_id (int): Người dùng thực hiện
+        dry_run (bool): Chỉ kiểm tra, không ghi
+
+    Returns:
+        dict: {'processed': số dòng hợp lệ, 'errors': [{'row', 'asset', 'error'}]}
+
+    Raises:
+        BulkError: Lô rỗng, quá lớn hoặc có dòng không phải đối tượng
+    """
+    _check_rows(rows)
+    by_code, by_id = _load_assets(rows, lock=not dry_run)
+
+    employee_codes = {str(row.get('employee_code')).strip() for row in rows if row.get('employee_code')}
+    employee_ids = {row.get('employee_id') for row in rows if isinstance(row.get('employee_id'), int)}
+    employees = db.session.execute(
+        select(Employee.id, Employee.employee_code, Employee.status)
+        .where(Employee.employee_code.in_(employee_codes) | Employee.id.in_(employee_ids))
+    ).all()
+    employees_by_code = {e.employee_code: e for e in employees}
+    employees_by_id = {e.id: e for e in employees}
+
+    errors, valid, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        label = row.get('asset_code') or row.get('asset_id')
+        asset = _find_asset(row, by_code, by_id)
+        if row.get('employee_code'):
+            employee = employees_by_code.get(str(row['employee_code']).strip())
+        else:
+            employee = employees_by_id.get(row.get('employee_id'))
+        try:
+            assigned_date = parse_date(row.get('assigned_date'), date.today())
+        except ValueError as e:
+            errors.append({'row': number, 'asset': label, 'error': str(e)})
+            continue
+
+        if asset is None:
+            error = 'Không tìm thấy tài sản'
+        elif asset.id in seen:
+            error = 'Tài sản xuất hiện nhiều lần trong lô'
+        elif asset.status != AssetStatus.AVAILABLE:
+            error = f"Tài sản không khả dụng ({asset.status.value})"
+        elif employee is None:
+            error = 'Không tìm thấy nhân viên'
+        elif employee.status != EmployeeStatus.ACTIVE:
+            error = 'Nhân viên không còn làm việc'
+        else:
+            error = None
+        if error:
+            errors.append({'row': number, 'asset': label, 'error': error})
+            continue
+
+        seen.add(asset.id)
+        valid.append({
+            'asset_id': asset.id,
+            'status': asset.status,
+            'employee_id': employee.id,
+            'assigned_date': assigned_date,
+            'condition_on_assignment': row.get('condition') or None,
+            'notes': row.get('notes') or None,
+        })
+
+    if valid and not dry_run:
+        now = datetime.now()
+        assignment_ids = {
+            asset_id: assignment_id for assignment_id, asset_id in db.session.execute(
+                insert(AssetAssignment).returning(AssetAssignment.id, AssetAssignment.asset_id),
+                [dict({key: value for key, value in item.items() if key != 'status'},
+                      assigned_by_id=created_by_id, is_returned=False, created_at=now, updated_at=now)
+                 for item in valid]
+            )
+        }
+        event_ids = _insert_events([{
+            'asset_id': item['asset_id'],
+            'event_type': AssetEventType.ASSIGNED,
+            'occurred_on': item['assigned_date'],
+            'employee_id': item['employee_id'],
+            'assignment_id': assignment_ids[item['asset_id']],
+            'note': item['notes'],
+            'created_by_id': created_by_id,
+            'created_at': now,
+        } for item in valid])
+        states = _load_states([item['asset_id'] for item in valid])
+        changes = _apply_events(
+            [dict(item, assignment_id=assignment_ids[item['asset_id']]) for item in valid], AssetEventType.ASSIGNED,
+            {item['asset_id']: item['status'] for item in valid}, states, event_ids
+        )
+        _write_states(changes, states)
+        mark_profiles_stale(*{item['employee_id'] for item in valid})
+
+    return {'processed': len(valid), 'errors': errors}
+
+
+def bulk_return(rows, created_by_id=None, dry_run=False):
+    """
+    Thu hồi hàng loạt tài sản đang bàn giao (không commit)
+
+    Args:
+        rows (list): dict {asset_code | asset_id, return_date, condition, notes}
+        created_by_id (int): Người dùng thực hiện
+        dry_run (bool): Chỉ kiểm tra, không ghi
+
+    Returns:
+        dict: {'processed': số dòng hợp lệ, 'errors': [{'row', 'asset', 'error'}]}
+
+    Raises:
+        BulkError: Lô rỗng, quá lớn hoặc có dòng không phải đối tượng
+    """
+    _check_rows(rows)
+    by_code, by_id = _load_assets(rows, lock=not dry_run)
+    asset_ids = [asset.id for asset in by_id.values()]
+    open_assignments = {
+        assignment.asset_id: assignment for assignment in db.session.execute(
+            select(AssetAssignment.id, AssetAssignment.asset_id, AssetAssignment.employee_id,
+                   AssetAssignment.assigned_date, AssetAssignment.notes)
+            .where(AssetAssignment.asset_id.in_(asset_ids), AssetAssignment.is_returned.is_(False))
+            .order_by(AssetAssignment.assigned_date)
+        )
+    }
+
+    errors, valid, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        label = row.get('asset_code') or row.get('asset_id')
+        asset = _find_asset(row, by_code, by_id)
+        try:
+            return_date = parse_date(row.get('return_date'), date.today())
+        except ValueError as e:
+            errors.append({'row': number, 'asset': label, 'error': str(e)})
+            continue
+
+        assignment = open_assignments.get(asset.id) if asset else None
+        if asset is None:
+            error = 'Không tìm thấy tài sản'
+        elif asset.id in seen:
+            error = 'Tài sản xuất hiện nhiều lần trong lô'
+        elif assignment is None:
+            error = 'Tài sản không đang được bàn giao'
+        elif return_date < assignment.assigned_date:
+            error = 'Ngày trả trước ngày bàn giao'
+        else:
+            error = None
+        if error:
+            errors.append({'row': number, 'asset': label, 'error': error})
+            continue
+
+        seen.add(asset.id)
+        valid.append({
+            'asset_id': asset.id,
+            'status': asset.status,
+            'assignment': assignment,
+            'return_date': return_date,
+            'condition': row.get('condition') or None,
+            'notes': row.get('notes') or None,
+        })
+
+    if valid and not dry_run:
+        now = datetime.now()
+        db.session.execute(update(AssetAssignment), [{
+            'id': item['assignment'].id,
+            'is_returned': True,
+            'return_date': item['return_date'],
+            'condition_on_return': item['condition'],
+            'notes': item['notes'] or item['assignment'].notes,
+            'updated_at': now,
+        } for item in valid])
+        event_ids = _insert_events([{
+            'asset_id': item['asset_id'],
+            'event_type': AssetEventType.RETURNED,
+            'occurred_on': item['return_date'],
+            'employee_id': item['assignment'].employee_id,
+            'assignment_id': item['assignment'].id,
+            'note': item['condition'],
+            'created_by_id': created_by_id,
+            'created_at': now,
+        } for item in valid])
+        states = _load_states([item['asset_id'] for item in valid])
+        changes = _apply_events(
+            [{'asset_id': item['asset_id'], 'employee_id': item['assignment'].employee_id,
+              'assignment_id': item['assignment'].id} for item in valid], AssetEventType.RETURNED,
+            {item['asset_id']: item['status'] for item in valid}, states, event_ids
+        )
+        _write_states(changes, states)
+        mark_profiles_stale(*{item['assignment'].employee_id for item in valid})
+
+    return {'processed': len(valid), 'errors': errors}
@@ -0,0 +1,306 @@
+"""
+Nhật ký sự kiện vòng đời tài sản và trạng thái hiện tại (projection).
+
+- Mỗi thao tác bàn giao, thu hồi, bảo trì, báo hỏng, thanh lý, khôi phục được ghi thành một dòng
+  asset_events (chỉ thêm); trạng thái tài sản không được sửa trực tiếp mà qua change_status().
+- Cùng giao dịch đó, asset_states của tài sản được cập nhật bằng apply_event(), nên câu hỏi
+  "ai đang giữ tài sản", "nhân viên X đang giữ gì" chỉ là một lần đọc theo khóa/index.
+- Trạng thái tại một thời điểm bất kỳ được dựng lại bằng cách phát lại sự kiện (replay_state).
+"""
+import logging
+from datetime import date
+
+from sqlalchemy import select
+
+from app import db
+from models import (Asset, AssetStatus, AssetAssignment, AssetMaintenance, MaintenanceStatus,
+                    AssetEvent, AssetEventType, AssetState, Employee)
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự các sự kiện cùng ngày khi dựng lại nhật ký từ dữ liệu cũ
+_BACKFILL_ORDER = {
+    AssetEventType.RETURNED: 0,
+    AssetEventType.MAINTENANCE_COMPLETED: 1,
+    AssetEventType.ASSIGNED: 2,
+    AssetEventType.MAINTENANCE_STARTED: 3,
+    AssetEventType.MARKED_BROKEN: 4,
+    AssetEventType.DISCARDED: 4,
+}
+
+# Trạng thái được chọn thủ công trên form sửa tài sản và sự kiện tương ứng;
+# các trạng thái còn lại do bàn giao/bảo trì quyết định
+MANUAL_STATUS_EVENTS = {
+    AssetStatus.BROKEN: AssetEventType.MARKED_BROKEN,
+    AssetStatus.DISCARDED: AssetEventType.DISCARDED,
+}
+
+
+def _new_state(asset_id, status=AssetStatus.AVAILABLE):
+    return AssetState(asset_id=asset_id, status=status, holder_id=None, assignment_id=None, open_maintenance=0)
+
+
+def initial_state(asset_id, status):
+    """
+    Trạng thái bắt đầu của tài sản chưa có sự kiện nào: giữ trạng thái hiện có nếu là hỏng
+    hoặc đã thanh lý (không có sự kiện tương ứng trong dữ liệu cũ), còn lại là sẵn sàng sử dụng
+    """
+    status = _as_status(status)
+    return _new_state(asset_id, status if status in MANUAL_STATUS_EVENTS else AssetStatus.AVAILABLE)
+
+
+def apply_event(state, event_type, employee_id=None, assignment_id=None):
+    """
+    Áp dụng một sự kiện lên trạng thái tài sản (dùng chung khi ghi sự kiện và khi phát lại)
+
+    Trạng thái suy ra: đã thanh lý giữ nguyên đến khi khôi phục; hỏng giữ nguyên đến khi khôi phục
+    hoặc đưa đi bảo trì; còn bảo trì đang thực hiện -> đang bảo trì; có người giữ -> đã bàn giao;
+    còn lại -> sẵn sàng sử dụng.
+    """
+    if event_type == AssetEventType.ASSIGNED:
+        state.holder_id = employee_id
+        state.assignment_id = assignment_id
+    elif event_type in (AssetEventType.RETURNED, AssetEventType.DISCARDED):
+        state.holder_id = None
+        state.assignment_id = None
+    elif event_type == AssetEventType.MAINTENANCE_STARTED:
+        state.open_maintenance = (state.open_maintenance or 0) + 1
+    elif event_type == AssetEventType.MAINTENANCE_COMPLETED:
+        state.open_maintenance = max((state.open_maintenance or 0) - 1, 0)
+
+    restored = event_type == AssetEventType.RESTORED
+    if event_type == AssetEventType.DISCARDED or (state.status == AssetStatus.DISCARDED and not restored):
+        state.status = AssetStatus.DISCARDED
+    elif event_type == AssetEventType.MARKED_BROKEN or (
+            state.status == AssetStatus.BROKEN and not restored
+            and event_type != AssetEventType.MAINTENANCE_STARTED):
+        state.status = AssetStatus.BROKEN
+    elif state.open_maintenance:
+        state.status = AssetStatus.UNDER_MAINTENANCE
+    elif state.holder_id:
+        state.status = AssetStatus.ASSIGNED
+    else:
+        state.status = AssetStatus.AVAILABLE
+    return state
+
+
+def record_event(asset, event_type, occurred_on=None, employee_id=None, assignment=None,
+                 maintenance=None, note=None, created_by_id=None):
+    """
+    Ghi một sự kiện tài sản và cập nhật trạng thái hiện tại (không commit)
+
+    Args:
+        asset (Asset): Tài sản
+        event_type (AssetEventType): Loại sự kiện
+        occurred_on (date): Ngày xảy ra, mặc định hôm nay
+        employee_id (int): Nhân viên nhận tài sản (sự kiện bàn giao)
+        assignment (AssetAssignment): Bản ghi bàn giao liên quan
+        maintenance (AssetMaintenance): Bản ghi bảo trì liên quan
+        note (str): Ghi chú
+        created_by_id (int): Người dùng thực hiện
+
+    Returns:
+        AssetEvent: Sự kiện vừa ghi
+    """
+    if (assignment is not None and assignment.id is None) or (maintenance is not None and maintenance.id is None):
+        db.session.flush()
+    if assignment is not None and employee_id is None:
+        employee_id = assignment.employee_id
+
+    event = AssetEvent(
+        asset_id=asset.id,
+        event_type=event_type,
+        occurred_on=occurred_on or date.today(),
+        employee_id=employee_id,
+        assignment_id=assignment.id if assignment is not None else None,
+        maintenance_id=maintenance.id if maintenance is not None else None,
+        note=note,
+        created_by_id=created_by_id
+    )
+    db.session.add(event)
+
+    state = db.session.get(AssetState, asset.id)
+    if state is None:
+        state = initial_state(asset.id, asset.status)
+        db.session.add(state)
+    apply_event(state, event_type, employee_id, event.assignment_id)
+    db.session.flush()
+    state.last_event_id = event.id
+
+    # Giữ các cột cũ của Asset đồng bộ cho các màn hình đang đọc trực tiếp
+    asset.status = state.status
+    asset.assignee_id = state.holder_id
+    return event
+
+
+def _as_status(status):
+    return AssetStatus[status] if isinstance(status, str) else status
+
+
+def manual_status_choices(status):
+    """
+    Các trạng thái chọn được trên form sửa tài sản: trạng thái hiện tại, báo hỏng, thanh lý;
+    tài sản hỏng hoặc đã thanh lý có thể khôi phục (sẵn sàng sử dụng)
+    """
+    status = _as_status(status)
+    choices = [status]
+    if status in MANUAL_STATUS_EVENTS:
+        choices.append(AssetStatus.AVAILABLE)
+    choices += [manual for manual in MANUAL_STATUS_EVENTS if manual != status]
+    return choices
+
+
+def change_status(asset, status, note=None, created_by_id=None):
+    """
+    Đổi trạng thái tài sản thủ công bằng một sự kiện (không commit)
+
+    Báo hỏng và thanh lý ghi sự kiện tương ứng (thanh lý đóng bàn giao đang hiệu lực); chọn lại
+    trạng thái sẵn sàng cho tài sản hỏng hoặc đã thanh lý ghi sự kiện khôi phục, trạng thái sau đó
+    được suy ra từ người giữ và bảo trì đang mở.
+
+    Returns:
+        AssetEvent: Sự kiện đã ghi, None nếu trạng thái không đổi
+
+    Raises:
+        ValueError: Trạng thái chỉ thay đổi qua bàn giao/bảo trì
+    """
+    current = _as_status(asset.status)
+    status = _as_status(status)
+    if status == current:
+        return None
+    if status in MANUAL_STATUS_EVENTS:
+        event_type = MANUAL_STATUS_EVENTS[status]
+    elif status == AssetStatus.AVAILABLE and current in MANUAL_STATUS_EVENTS:
+        event_type = AssetEventType.RESTORED
+    else:
+        raise ValueError(f"Trạng thái '{status.value}' chỉ thay đổi qua bàn giao, thu hồi hoặc bảo trì")
+
+    if event_type == AssetEventType.DISCARDED:
+        assignment = open_assignment(asset.id)
+        if assignment:
+            assignment.is_returned = True
+            assignment.return_date = date.today()
+    return record_event(asset, event_type, note=note, created_by_id=created_by_id)
+
+
+def get_state(asset_id):
+    """Trạng thái hiện tại của tài sản (None nếu chưa có sự kiện nào)"""
+    return db.session.get(AssetState, asset_id)
+
+
+def current_holder(asset_id):
+    """Nhân viên đang giữ tài sản, None nếu không có"""
+    return Employee.query.join(AssetState, AssetState.holder_id == Employee.id) \
+        .filter(AssetState.asset_id == asset_id).first()
+
+
+def assets_held_by(employee_id):
+    """Các tài sản nhân viên đang giữ (đọc qua ix_asset_state_holder)"""
+    return Asset.query.join(AssetState, AssetState.asset_id == Asset.id) \
+        .filter(AssetState.holder_id == employee_id).order_by(Asset.asset_code).all()
+
+
+def open_assignment(asset_id):
+    """Bản ghi bàn giao đang hiệu lực của tài sản"""
+    return AssetAssignment.query.join(AssetState, AssetState.assignment_id == AssetAssignment.id) \
+        .filter(AssetState.asset_id == asset_id).first()
+
+
+def asset_history(asset_id, limit=None):
+    """Nhật ký sự kiện của tài sản, mới nhất trước"""
+    query = AssetEvent.query.filter_by(asset_id=asset_id).order_by(AssetEvent.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def replay_state(asset_id, as_of=None):
+    """
+    Dựng lại trạng thái của tài sản bằng cách phát lại nhật ký (phục vụ kiểm tra, đối soát)
+
+    Args:
+        asset_id (int): ID tài sản
+        as_of (date): Chỉ phát lại các sự kiện đến hết ngày này (mặc định toàn bộ)
+
+    Returns:
+        AssetState: Trạng thái tạm (không gắn với session)
+    """
+    query = select(AssetEvent.event_type, AssetEvent.employee_id, AssetEvent.assignment_id, AssetEvent.id) \
+        .where(AssetEvent.asset_id == asset_id).order_by(AssetEvent.id)
+    if as_of is not None:
+        query = query.where(AssetEvent.occurred_on <= as_of)
+
+    state = _new_state(asset_id)
+    for event_type, employee_id, assignment_id, event_id in db.session.execute(query):
+        apply_event(state, event_type, employee_id, assignment_id)
+        state.last_event_id = event_id
+    return state
+
+
+def rebuild_states(asset_ids=None):
+    """
+    Dựng lại bảng asset_states từ nhật ký sự kiện (không commit)
+
+    Returns:
+        int: Số tài sản đã dựng lại
+    """
+    if asset_ids is None:
+        asset_ids = db.session.execute(select(AssetEvent.asset_id).distinct()).scalars().all()
+    for asset_id in asset_ids:
+        replayed = replay_state(asset_id)
+        state = db.session.get(AssetState, asset_id) or _new_state(asset_id)
+        for column in ('status', 'holder_id', 'assignment_id', 'open_maintenance', 'last_event_id'):
+            setattr(state, column, getattr(replayed, column))
+        db.session.add(state)
+        asset = db.session.get(Asset, asset_id)
+        # Trạng thái hỏng được đặt thủ công, không có sự kiện tương ứng
+        if not (asset.status == AssetStatus.BROKEN and state.status == AssetStatus.AVAILABLE):
+            asset.status = state.status
+        asset.assignee_id = state.holder_id
+    return len(asset_ids)
+
+
+def backfill_events():
+    """
+    Tạo nhật ký sự kiện cho các tài sản chưa có sự kiện từ dữ liệu bàn giao/bảo trì cũ (không commit)
+
+    Returns:
+        int: Số sự kiện đã tạo
+    """
+    has_events = select(AssetEvent.asset_id).distinct()
+    assets = Asset.query.filter(Asset.id.notin_(has_events)).all()
+    created = 0
+    for asset in assets:
+        events = []
+        for assignment in AssetAssignment.query.filter_by(asset_id=asset.id):
+            events.append((assignment.assigned_date, _BACKFILL_ORDER[AssetEventType.ASSIGNED], assignment.id,
+                           dict(event_type=AssetEventType.ASSIGNED, occurred_on=assignment.assigned_date,
+                                employee_id=assignment.employee_id, assignment_id=assignment.id)))
+            if assignment.is_returned:
+                returned_on = assignment.return_date or assignment.assigned_date
+                # Trả trong ngày bàn giao thì phải đứng sau sự kiện bàn giao
+                order = _BACKFILL_ORDER[AssetEventType.RETURNED] if returned_on > assignment.assigned_date else 5
+                events.append((returned_on, order, assignment.id,
+                               dict(event_type=AssetEventType.RETURNED, occurred_on=returned_on,
+                                    employee_id=assignment.employee_id, assignment_id=assignment.id)))
+        for record in AssetMaintenance.query.filter_by(asset_id=asset.id):
+            if record.status not in (MaintenanceStatus.IN_PROGRESS.name, MaintenanceStatus.COMPLETED.name):
+                continue
+            events.append((record.maintenance_date, _BACKFILL_ORDER[AssetEventType.MAINTENANCE_STARTED], record.id,
+                           dict(event_type=AssetEventType.MAINTENANCE_STARTED, occurred_on=record.maintenance_date,
+                                maintenance_id=record.id)))
+            if record.status == MaintenanceStatus.COMPLETED.name:
+                events.append((record.maintenance_date, 6, record.id,
+                               dict(event_type=AssetEventType.MAINTENANCE_COMPLETED, occurred_on=record.maintenance_date,
+                                    maintenance_id=record.id)))
+        if asset.status in MANUAL_STATUS_EVENTS:
+            event_type = MANUAL_STATUS_EVENTS[asset.status]
+            events.append((date.max, _BACKFILL_ORDER[event_type], 0,
+                           dict(event_type=event_type, occurred_on=date.today())))
+
+        events.sort(key=lambda item: item[:3])
+        for *_, values in events:
+            db.session.add(AssetEvent(asset_id=asset.id, note='Tạo từ dữ liệu cũ', **values))
+        created += len(events)
+    db.session.flush()
+    return created
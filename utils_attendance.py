@@ -0,0 +1,179 @@
+"""
+Tổng hợp dữ liệu chấm công theo nhân viên và phòng ban.
+
+Dữ liệu của cả kỳ được đọc một lần dưới dạng cột (pandas DataFrame), sau đó các chỉ số
+(đi muộn, giờ làm thêm, quên check-out) được tính bằng phép toán vectơ và group-by,
+không lặp qua từng bản ghi trong Python.
+"""
+import os
+from datetime import date, time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app import db
+from models import Attendance, Employee, Department
+
+# Giờ bắt đầu ca làm việc, dùng để tính đi muộn (HH:MM)
+SHIFT_START = os.environ.get("ATTENDANCE_SHIFT_START", "08:00")
+
+# Số phút cho phép đến muộn mà không bị tính là đi muộn
+LATE_GRACE_MINUTES = int(os.environ.get("ATTENDANCE_LATE_GRACE_MINUTES", "0"))
+
+# Số giờ làm việc tiêu chuẩn trong ngày, phần vượt quá được tính là làm thêm
+STANDARD_HOURS = float(os.environ.get("ATTENDANCE_STANDARD_HOURS", "8"))
+
+
+def _parse_shift_start(value):
+    hour, minute = value.split(':')
+    return time(int(hour), int(minute))
+
+
+def load_attendance_frame(start_date, end_date, employee_id=None, department_id=None):
+    """
+    Đọc dữ liệu chấm công trong kỳ thành DataFrame (một truy vấn duy nhất)
+
+    Args:
+        start_date (date): Ngày bắt đầu
+        end_date (date): Ngày kết thúc
+        employee_id (int): Lọc theo nhân viên (tùy chọn)
+        department_id (int): Lọc theo phòng ban (tùy chọn)
+
+    Returns:
+        DataFrame: Các cột employee_id, employee_code, full_name, department_id,
+                   department_name, date, check_in, check_out, total_hours
+    """
+    query = select(
+        Attendance.employee_id,
+        Employee.employee_code,
+        Employee.full_name,
+        Employee.department_id,
+        Department.name.label('department_name'),
+        Attendance.date,
+        Attendance.check_in,
+        Attendance.check_out,
+        Attendance.total_hours
+    ).join(
+        Employee, Attendance.employee_id == Employee.id
+    ).join(
+        Department, Employee.department_id == Department.id
+    ).where(
+        Attendance.date.between(start_date, end_date)
+    )
+    if employee_id:
+        query = query.where(Attendance.employee_id == employee_id)
+    if department_id:
+        query = query.where(Employee.department_id == department_id)
+
+    df = pd.read_sql(query, db.session.connection())
+    df['date'] = pd.to_datetime(df['date'])
+    df['check_in'] = pd.to_datetime(df['check_in'])
+    df['check_out'] = pd.to_datetime(df['check_out'])
+    df['total_hours'] = pd.to_numeric(df['total_hours'], errors='coerce')
+    return df
+
+
+def compute_attendance_metrics(df, shift_start=None, standard_hours=None, grace_minutes=None, today=None):
+    """
+    Tính các chỉ số cho từng bản ghi chấm công (vectơ hóa)
+
+    Thêm các cột: hours, late_minutes, is_late, overtime_hours, missing_checkout
+
+    Args:
+        df (DataFrame): Dữ liệu từ load_attendance_frame
+        shift_start (str): Giờ bắt đầu ca (HH:MM), mặc định SHIFT_START
+        standard_hours (float): Số giờ tiêu chuẩn, mặc định STANDARD_HOURS
+        grace_minutes (int): Số phút cho phép đến muộn, mặc định LATE_GRACE_MINUTES
+        today (date): Ngày hiện tại (các ngày trước đó chưa check-out bị tính là quên check-out)
+
+    Returns:
+        DataFrame: df đã thêm các cột chỉ số
+    """
+    shift = _parse_shift_start(shift_start or SHIFT_START)
+    standard_hours = STANDARD_HOURS if standard_hours is None else standard_hours
+    grace_minutes = LATE_GRACE_MINUTES if grace_minutes is None else grace_minutes
+    today = pd.Timestamp(today or date.today())
+
+    shift_offset = pd.Timedelta(hours=shift.hour, minutes=shift.minute)
+    late_minutes = (df['check_in'] - (df['date'] + shift_offset)).dt.total_seconds() / 60
+    df['late_minutes'] = late_minutes.clip(lower=0).fillna(0)
+    df['is_late'] = df['late_minutes'] > grace_minutes
+
+    # Ưu tiên total_hours đã lưu, nếu chưa có thì tính từ check-in/check-out
+    computed_hours = (df['check_out'] - df['check_in']).dt.total_seconds() / 3600
+    df['hours'] = df['total_hours'].fillna(computed_hours).fillna(0)
+    df['overtime_hours'] = np.maximum(df['hours'].to_numpy() - standard_hours, 0)
+
+    df['missing_checkout'] = df['check_in'].notna() & df['check_out'].isna() & (df['date'] < today)
+    return df
+
+
+_AGGREGATIONS = dict(
+    days_present=('date', 'nunique'),
+    late_count=('is_late', 'sum'),
+    late_minutes=('late_minutes', 'sum'),
+    total_hours=('hours', 'sum'),
+    overtime_hours=('overtime_hours', 'sum'),
+    missing_checkouts=('missing_checkout', 'sum'),
+)
+
+
+def summarize_by_employee(df):
+    """Tổng hợp chỉ số theo nhân viên"""
+    if df.empty:
+        return []
+    summary = df.groupby(
+        ['employee_id', 'employee_code', 'full_name', 'department_name'], sort=False
+    ).agg(**_AGGREGATIONS).reset_index()
+    summary['average_hours'] = summary['total_hours'] / summary['days_present']
+    return _to_records(summary.sort_values('employee_code'))
+
+
+def summarize_by_department(df):
+    """Tổng hợp chỉ số theo phòng ban"""
+    if df.empty:
+        return []
+    aggregations = {key: value for key, value in _AGGREGATIONS.items() if key != 'days_present'}
+    aggregations.update(employees=('employee_id', 'nunique'), records=('date', 'size'))
+    summary = df.groupby(['department_id', 'department_name'], sort=False).agg(**aggregations).reset_index()
+    summary['late_rate'] = summary['late_count'] / summary['records']
+    return _to_records(summary.sort_values('department_name'))
+
+
+def _to_records(frame):
+    # Chuyển kiểu NumPy sang kiểu Python để render template và trả JSON
+    frame = frame.round(2)
+    return [
+        {key: (value.item() if hasattr(value, 'item') else value) for key, value in row.items()}
+        for row in frame.to_dict(orient='records')
+    ]
+
+
+def attendance_summary(start_date, end_date, employee_id=None, department_id=None):
+    """
+    Báo cáo tổng hợp chấm công trong kỳ
+
+    Returns:
+        dict: {'period', 'settings', 'totals', 'employees', 'departments'}
+    """
+    df = compute_attendance_metrics(load_attendance_frame(start_date, end_date, employee_id, department_id))
+
+    return {
+        'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+        'settings': {
+            'shift_start': SHIFT_START,
+            'late_grace_minutes': LATE_GRACE_MINUTES,
+            'standard_hours': STANDARD_HOURS,
+        },
+        'totals': {
+            'records': int(len(df)),
+            'employees': int(df['employee_id'].nunique()),
+            'late_count': int(df['is_late'].sum()),
+            'total_hours': round(float(df['hours'].sum()), 2),
+            'overtime_hours': round(float(df['overtime_hours'].sum()), 2),
+            'missing_checkouts': int(df['missing_checkout'].sum()),
+        },
+        'employees': summarize_by_employee(df),
+        'departments': summarize_by_department(df),
+    }
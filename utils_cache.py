@@ -0,0 +1,206 @@
+"""
+Bộ nhớ đệm (cache) cho dữ liệu tham chiếu ít thay đổi: phòng ban, chức vụ,
+bậc lương, quyền và danh sách nhân viên dùng cho các ô chọn trong form.
+
+Mặc định dùng cache trong tiến trình. Nếu có biến môi trường CACHE_REDIS_URL
+(và thư viện redis đã được cài) thì dùng Redis để các worker dùng chung cache.
+Các route tạo/sửa/xóa phải gọi invalidate() để xóa cache tương ứng.
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Thời gian sống mặc định của một mục cache (giây)
+DEFAULT_TTL = int(os.environ.get("CACHE_DEFAULT_TTL", "300"))
+
+# Các khóa cache dữ liệu tham chiếu
+DEPARTMENTS = 'ref:departments'
+CUSTOM_POSITIONS = 'ref:custom_positions'
+SALARY_GRADES = 'ref:salary_grades'
+PERMISSIONS = 'ref:permissions'
+ACTIVE_EMPLOYEES = 'ref:employees:active'
+
+# Nhóm khóa liên quan đến nhân viên, dùng khi thêm/sửa/chuyển trạng thái nhân viên
+EMPLOYEE_KEYS = (ACTIVE_EMPLOYEES,)
+
+
+class MemoryCacheBackend:
+    """Cache trong bộ nhớ của tiến trình, có TTL cho từng khóa"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCacheBackend:
+    """Cache dùng chung giữa các worker thông qua Redis (giá trị lưu dạng JSON)"""
+
+    def __init__(self, url, prefix='hrm:'):
+        import redis  # Chỉ import khi thực sự dùng Redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, json.dumps(value, default=str), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*[self._prefix + key for key in keys])
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self._prefix + '*'):
+            self._client.delete(key)
+
+
+def _create_backend():
+    """Chọn backend theo cấu hình, quay về cache trong tiến trình nếu Redis không dùng được"""
+    redis_url = os.environ.get("CACHE_REDIS_URL")
+    if redis_url:
+        try:
+            return RedisCacheBackend(redis_url)
+        except Exception as e:
+            logger.warning(f"Không thể khởi tạo Redis cache, dùng cache trong bộ nhớ: {e}")
+    return MemoryCacheBackend()
+
+
+_backend = _create_backend()
+
+
+def get_backend():
+    """Trả về backend cache đang dùng"""
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Thay backend cache (ví dụ khi cấu hình backend tùy chỉnh)
+
+    Args:
+        backend: Đối tượng có các phương thức get, set, delete, clear
+    """
+    global _backend
+    _backend = backend
+
+
+def cached(key, loader, ttl=None):
+    """
+    Lấy giá trị từ cache, nếu chưa có thì gọi loader để nạp và lưu lại
+
+    Args:
+        key (str): Khóa cache
+        loader (callable): Hàm trả về giá trị (phải serialize được sang JSON)
+        ttl (int): Thời gian sống (giây), mặc định DEFAULT_TTL
+
+    Returns:
+        Giá trị đã cache
+    """
+    try:
+        value = _backend.get(key)
+    except Exception as e:
+        logger.warning(f"Lỗi khi đọc cache {key}: {e}")
+        return loader()
+
+    if value is None:
+        value = loader()
+        try:
+            _backend.set(key, value, ttl if ttl is not None else DEFAULT_TTL)
+        except Exception as e:
+            logger.warning(f"Lỗi khi ghi cache {key}: {e}")
+    return value
+
+
+def invalidate(*keys):
+    """
+    Xóa các khóa khỏi cache sau khi dữ liệu gốc thay đổi
+
+    Args:
+        *keys (str): Các khóa cần xóa
+    """
+    try:
+        _backend.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Lỗi khi xóa cache {keys}: {e}")
+
+
+def _as_choices(rows):
+    # JSON (Redis) trả về list thay vì tuple, chuyển lại cho WTForms
+    return [tuple(row) for row in rows]
+
+
+def get_department_choices():
+    """Danh sách (id, tên) phòng ban"""
+    def load():
+        from models import Department
+        return [(d.id, d.name) for d in Department.query.order_by(Department.id).all()]
+    return _as_choices(cached(DEPARTMENTS, load))
+
+
+def get_custom_position_choices():
+    """Danh sách (tên, tên) chức vụ tùy chỉnh"""
+    def load():
+        from models import CustomPosition
+        return [(p.name, p.name) for p in CustomPosition.query.order_by(CustomPosition.id).all()]
+    return _as_choices(cached(CUSTOM_POSITIONS, load))
+
+
+def get_salary_grade_choices():
+    """Danh sách (id, nhãn) bậc lương"""
+    def load():
+        from models import SalaryGrade
+        return [(g.id, f"{g.code} - {g.name} (Hệ số: {g.base_coefficient})")
+                for g in SalaryGrade.query.order_by(SalaryGrade.id).all()]
+    return _as_choices(cached(SALARY_GRADES, load))
+
+
+def get_permission_choices():
+    """Danh sách (id, nhãn) quyền, dùng cho form vai trò"""
+    def load():
+        from models import Permission
+        return [(p.id, f"{p.name} ({p.module})") for p in Permission.query.order_by(Permission.id).all()]
+    return _as_choices(cached(PERMISSIONS, load))
+
+
+def get_active_employee_choices():
+    """Danh sách (id, "mã - họ tên") nhân viên đang làm việc"""
+    def load():
+        from models import Employee, EmployeeStatus
+        rows = Employee.query.with_entities(Employee.id, Employee.employee_code, Employee.full_name) \
+            .filter(Employee.status == EmployeeStatus.ACTIVE).order_by(Employee.id).all()
+        return [(e.id, f"{e.employee_code} - {e.full_name}") for e in rows]
+    return _as_choices(cached(ACTIVE_EMPLOYEES, load))
+
@@ -0,0 +1,286 @@
+"""
+Vòng đời hợp đồng: chuyển trạng thái hết hạn theo lô và đồng bộ ngày hợp đồng của nhân viên.
+
+- Hợp đồng đang hiệu lực đã qua ngày kết thúc được chuyển sang hết hạn bằng một lệnh UPDATE
+  (dùng ix_contract_status_end_date); sự kiện thay đổi được ghi bằng một lệnh INSERT ... SELECT
+  cùng điều kiện, trước khi UPDATE, trong cùng giao dịch.
+- Employee.contract_start_date / contract_end_date được đồng bộ từ hợp đồng đang hiệu lực mới nhất
+  bằng một lệnh UPDATE với truy vấn con tương quan, chỉ chạm vào nhân viên có giá trị khác.
+- Khi một hợp đồng được thêm, sửa hoặc xóa qua ORM, sự kiện trong models.py chạy lại lệnh UPDATE đó
+  cho nhân viên liên quan trong cùng giao dịch, nên các màn hình có thể đọc thẳng bản sao trên Employee.
+- find_contract_date_drift() so sánh hai nguồn trong một truy vấn để phát hiện bản sao bị lệch
+  (do UPDATE hàng loạt, nhập dữ liệu, sửa tay) và repair_contract_date_drift() sửa lại theo lô.
+- Các lệnh UPDATE hàng loạt trả về (RETURNING) nhân viên bị ảnh hưởng để xóa cache hồ sơ khi commit.
+"""
+import time
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import select, update, insert, literal, and_, or_, func, inspect, Date, DateTime, String
+
+from app import db
+from models import Contract, ContractStatus, ContractEvent, Employee
+from utils_profile import mark_profiles_stale
+
+logger = logging.getLogger(__name__)
+
+# Nguồn của sự kiện do job hằng đêm tạo
+EXPIRY_JOB_SOURCE = 'expiry_job'
+
+# Các cột của Contract quyết định ngày hợp đồng của nhân viên
+CONTRACT_DATE_SOURCES = ('employee_id', 'status', 'start_date', 'end_date')
+
+# Số nhân viên bị lệch tối đa ghi vào log khi đối soát
+DRIFT_LOG_LIMIT = 20
+
+
+def _status(value):
+    """Chuẩn hóa trạng thái (tên enum hoặc enum) thành ContractStatus"""
+    return ContractStatus[value] if isinstance(value, str) else value
+
+
+@contextmanager
+def _timed(step, timings):
+    started = time.perf_counter()
+    yield
+    timings[step] = round(time.perf_counter() - started, 3)
+    logger.info(f"{step}: {timings[step]:.3f} giây")
+
+
+def record_status_change(contract, to_status, created_by_id=None, changed_on=None, source='manual'):
+    """
+    Đổi trạng thái hợp đồng và ghi sự kiện thay đổi (không commit)
+
+    Returns:
+        ContractEvent: Sự kiện đã ghi, None nếu trạng thái không đổi
+    """
+    from_status = _status(contract.status)
+    to_status = _status(to_status)
+    contract.status = to_status
+    if from_status == to_status:
+        return None
+
+    event = ContractEvent(
+        contract=contract,
+        from_status=from_status,
+        to_status=to_status,
+        changed_on=changed_on or date.today(),
+        source=source,
+        created_by_id=created_by_id
+    )
+    db.session.add(event)
+    return event
+
+
+def expire_contracts(today=None):
+    """
+    Chuyển các hợp đồng đang hiệu lực có ngày kết thúc trước hôm nay sang hết hạn (không commit)
+
+    Returns:
+        int: Số hợp đồng đã chuyển trạng thái
+    """
+    today = today or date.today()
+    now = datetime.now()
+    overdue = and_(
+        Contract.status == ContractStatus.ACTIVE,
+        Contract.end_date.isnot(None),
+        Contract.end_date < today
+    )
+
+    events = ContractEvent.__table__
+    db.session.execute(insert(events).from_select(
+        ['contract_id', 'from_status', 'to_status', 'changed_on', 'source', 'created_at'],
+        select(
+            Contract.id,
+            Contract.status,
+            literal(ContractStatus.EXPIRED, events.c.to_status.type),
+            literal(today, Date),
+            literal(EXPIRY_JOB_SOURCE, String),
+            literal(now, DateTime)
+        ).where(overdue)
+    ))
+    employee_ids = db.session.execute(
+        update(Contract).where(overdue).values(status=ContractStatus.EXPIRED, updated_at=now)
+        .returning(Contract.employee_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    mark_profiles_stale(*set(employee_ids))
+    return len(employee_ids)
+
+
+def current_contract_columns():
+    """Truy vấn con tương quan: ngày bắt đầu, kết thúc của hợp đồng đang hiệu lực mới nhất của nhân viên"""
+    def latest(column):
+        return select(column).where(
+            Contract.employee_id == Employee.id,
+            Contract.status == ContractStatus.ACTIVE
+        ).order_by(Contract.start_date.desc(), Contract.id.desc()).limit(1).correlate(Employee).scalar_subquery()
+
+    return latest(Contract.start_date), latest(Contract.end_date)
+
+
+def sync_statement(employee_ids=None):
+    """
+    Lệnh UPDATE đồng bộ ngày hợp đồng của nhân viên từ hợp đồng đang hiệu lực mới nhất
+
+    Args:
+        employee_ids (iterable): Chỉ đồng bộ các nhân viên này (mặc định tất cả)
+    """
+    start_date, end_date = current_contract_columns()
+    conditions = [
+        Employee.id.in_(select(Contract.employee_id).where(Contract.status == ContractStatus.ACTIVE)),
+        or_(
+            Employee.contract_start_date.is_distinct_from(start_date),
+            Employee.contract_end_date.is_distinct_from(end_date)
+        )
+    ]
+    if employee_ids is not None:
+        conditions.append(Employee.id.in_(list(employee_ids)))
+    return update(Employee).where(*conditions) \
+        .values(contract_start_date=start_date, contract_end_date=end_date) \
+        .execution_options(synchronize_session=False)
+
+
+def sync_employee_contract_dates(employee_ids=None):
+    """
+    Đồng bộ ngày hợp đồng của nhân viên từ hợp đồng đang hiệu lực mới nhất (không commit)
+
+    Nhân viên không còn hợp đồng hiệu lực giữ nguyên ngày của hợp đồng gần nhất.
+
+    Args:
+        employee_ids (iterable): Chỉ đồng bộ các nhân viên này (mặc định tất cả)
+
+    Returns:
+        int: Số nhân viên đã cập nhật
+    """
+    if employee_ids is not None and not employee_ids:
+        return 0
+    updated = db.session.execute(sync_statement(employee_ids).returning(Employee.id)).scalars().all()
+    mark_profiles_stale(*updated)
+    return len(updated)
+
+
+def affected_employee_ids(contract, deleted=False):
+    """
+    Nhân viên cần đồng bộ lại ngày hợp đồng khi hợp đồng được ghi xuống database
+    (gọi từ sự kiện after_insert/after_update/after_delete của Contract)
+
+    Args:
+        contract (Contract): Hợp đồng vừa được ghi
+        deleted (bool): Hợp đồng vừa bị xóa
+
+    Returns:
+        set: ID nhân viên (rỗng nếu không cột nào liên quan thay đổi)
+    """
+    if deleted:
+        return {contract.employee_id}
+
+    state = inspect(contract)
+    histories = [state.attrs[column].history for column in CONTRACT_DATE_SOURCES]
+    if not any(history.has_changes() for history in histories):
+        return set()
+    # Hợp đồng chuyển sang nhân viên khác thì nhân viên cũ cũng phải tính lại
+    employee_history = histories[0]
+    return {employee_id for employee_id in [contract.employee_id, *employee_history.deleted] if employee_id}
+
+
+def current_contracts():
+    """Subquery: hợp đồng đang hiệu lực mới nhất của mỗi nhân viên (employee_id, start_date, end_date)"""
+    rank = func.row_number().over(
+        partition_by=Contract.employee_id,
+        order_by=(Contract.start_date.desc(), Contract.id.desc())
+    ).label('rank')
+    ranked = select(Contract.employee_id, Contract.start_date, Contract.end_date, rank) \
+        .where(Contract.status == ContractStatus.ACTIVE).subquery('ranked_contracts')
+    return select(ranked.c.employee_id, ranked.c.start_date, ranked.c.end_date) \
+        .where(ranked.c.rank == 1).subquery('current_contracts')
+
+
+def find_contract_date_drift():
+    """
+    Nhân viên có ngày hợp đồng (bản sao trên Employee) khác hợp đồng đang hiệu lực mới nhất
+
+    Hai nguồn được so sánh trong một truy vấn: các cặp (nhân viên, hợp đồng hiện hành) không khớp
+    bộ (ngày bắt đầu, ngày kết thúc), so sánh có tính NULL.
+
+    Returns:
+        list: dict {'employee_id', 'employee_code', 'stored_start', 'stored_end', 'start_date', 'end_date'}
+    """
+    current = current_contracts()
+    rows = db.session.execute(
+        select(
+            Employee.id, Employee.employee_code, Employee.contract_start_date, Employee.contract_end_date,
+            current.c.start_date, current.c.end_date
+        ).join(
+            current, current.c.employee_id == Employee.id
+        ).where(
+            or_(
+                Employee.contract_start_date.is_distinct_from(current.c.start_date),
+                Employee.contract_end_date.is_distinct_from(current.c.end_date)
+            )
+        ).order_by(Employee.id)
+    ).all()
+    return [
+        {
+            'employee_id': employee_id,
+            'employee_code': employee_code,
+            'stored_start': stored_start,
+            'stored_end': stored_end,
+            'start_date': start_date,
+            'end_date': end_date,
+        }
+        for employee_id, employee_code, stored_start, stored_end, start_date, end_date in rows
+    ]
+
+
+def repair_contract_date_drift(commit=True):
+    """
+    Đối soát ngày hợp đồng của nhân viên và sửa các bản sao bị lệch bằng một lệnh UPDATE
+
+    Args:
+        commit (bool): Commit sau khi sửa
+
+    Returns:
+        dict: {'drift': số nhân viên bị lệch, 'repaired': số nhân viên đã sửa, 'samples': vài dòng lệch đầu tiên}
+    """
+    drift = find_contract_date_drift()
+    for row in drift[:DRIFT_LOG_LIMIT]:
+        logger.warning(
+            f"Lệch ngày hợp đồng của nhân viên {row['employee_code']}: "
+            f"{row['stored_start']} - {row['stored_end']}, hợp đồng hiện hành {row['start_date']} - {row['end_date']}"
+        )
+
+    repaired = 0
+    if drift:
+        try:
+            repaired = sync_employee_contract_dates([row['employee_id'] for row in drift])
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return {'drift': len(drift), 'repaired': repaired, 'samples': drift[:DRIFT_LOG_LIMIT]}
+
+
+def run_contract_lifecycle(today=None):
+    """
+    Job hằng đêm: chuyển hợp đồng hết hạn, đồng bộ ngày hợp đồng nhân viên, commit một lần
+
+    Returns:
+        dict: {'expired', 'employees_synced', 'timings'}
+    """
+    timings = {}
+    try:
+        with _timed('expire_contracts', timings):
+            expired = expire_contracts(today)
+        with _timed('sync_employee_contract_dates', timings):
+            synced = sync_employee_contract_dates()
+        with _timed('commit', timings):
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Đã chuyển {expired} hợp đồng sang hết hạn, cập nhật ngày hợp đồng của {synced} nhân viên")
+    return {'expired': expired, 'employees_synced': synced, 'timings': timings}
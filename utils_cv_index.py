@@ -0,0 +1,317 @@
+"""
+Trích xuất văn bản CV của ứng viên và xếp hạng ứng viên theo kỹ năng yêu cầu (BM25).
+
+- Trích xuất chạy ngoại tuyến (index_candidate_cvs.py) trong một process pool:
+  PDF (pypdf), DOCX (đọc trực tiếp word/document.xml), HTML (trafilatura), TXT.
+- Văn bản được chuẩn hóa (chữ thường, bỏ dấu tiếng Việt) và tách token; bảng candidate_tokens
+  lưu số lần xuất hiện (tf) của mỗi token trong CV, candidate_cv_index lưu độ dài CV.
+- Xếp hạng đọc posting list của các token trong kỹ năng yêu cầu bằng index (token, candidate_id)
+  và tính điểm BM25 vectơ hóa bằng numpy, nên chỉ phụ thuộc số posting của các token được hỏi.
+"""
+import os
+import re
+import logging
+import zipfile
+import unicodedata
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime
+from xml.etree import ElementTree
+
+import numpy as np
+from pypdf import PdfReader
+from sqlalchemy import select, func, delete, insert, or_
+
+from app import db
+from models import Candidate, CandidateCvIndex, CandidateToken
+from utils_storage import local_copy, file_extension
+
+logger = logging.getLogger(__name__)
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Số CV xử lý trong mỗi lô (mỗi lô commit một lần)
+INDEX_BATCH_SIZE = 200
+
+# Độ dài tối đa của token được lưu
+MAX_TOKEN_LENGTH = 64
+
+# Số ký tự văn bản tối đa đọc từ một CV
+MAX_TEXT_LENGTH = 200_000
+
+# Token: chữ/số, cho phép các ký tự trong tên công nghệ như c++, c#, node.js
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+# Từ phổ biến không mang nghĩa kỹ năng (đã bỏ dấu)
+STOPWORDS = frozenset("""
+and or the of in on at to for with a an is are be by as from
+va hoac cua cac nhung trong tren voi cho la co duoc khi de tu mot
+""".split())
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def normalize_text(text):
+    """Chữ thường và bỏ dấu tiếng Việt ('Kỹ năng Đàm phán' -> 'ky nang dam phan')"""
+    text = text.lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    """
+    Tách văn bản thành danh sách token đã chuẩn hóa
+
+    Returns:
+        list: Token theo thứ tự xuất hiện (có lặp)
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize_text(text or '')):
+        token = token.rstrip('.')
+        if (len(token) < 2 and not token.isdigit()) or token in STOPWORDS:
+            continue
+        tokens.append(token[:MAX_TOKEN_LENGTH])
+    return tokens
+
+
+def query_terms(skills_text):
+    """Các token khác nhau trong chuỗi kỹ năng yêu cầu (giữ thứ tự)"""
+    return list(dict.fromkeys(tokenize(skills_text)))
+
+
+def _extract_docx(path):
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read('word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(_WORD_NS + 'p'):
+        paragraphs.append(''.join(node.text or '' for node in paragraph.iter(_WORD_NS + 't')))
+    return '\n'.join(paragraphs)
+
+
+def _extract_pdf(path):
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def _extract_html(path):
+    import trafilatura
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return trafilatura.extract(f.read()) or ''
+
+
+def extract_text(path, extension=None):
+    """
+    Trích xuất văn bản từ file CV theo phần mở rộng
+
+    Args:
+        path (str): Đường dẫn file cục bộ
+        extension (str): Phần mở rộng của file gốc, ví dụ '.pdf' (mặc định lấy từ path;
+            đối tượng lưu theo nội dung không có phần mở rộng trong đường dẫn)
+
+    Returns:
+        str: Văn bản của CV
+
+    Raises:
+        ValueError: Định dạng không được hỗ trợ
+    """
+    extension = (extension or os.path.splitext(path)[1]).lower()
+    if extension == '.pdf':
+        text = _extract_pdf(path)
+    elif extension == '.docx':
+        text = _extract_docx(path)
+    elif extension in ('.html', '.htm'):
+        text = _extract_html(path)
+    elif extension == '.txt':
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            text = f.read()
+    else:
+        raise ValueError(f"Định dạng CV không được hỗ trợ: {extension or 'không rõ'}")
+    return text[:MAX_TEXT_LENGTH]
+
+
+def extract_tokens(job):
+    """
+    Trích xuất và đếm token của một CV (chạy trong process con, không truy cập database)
+
+    Args:
+        job (tuple): (candidate_id, đường dẫn file, phần mở rộng của file gốc)
+
+    Returns:
+        tuple: (candidate_id, {token: tf} hoặc None, thông báo lỗi hoặc None)
+    """
+    candidate_id, path, extension = job
+    try:
+        return candidate_id, dict(Counter(tokenize(extract_text(path, extension)))), None
+    except Exception as e:
+        return candidate_id, None, str(e)[:255]
+
+
+def pending_candidates(limit=INDEX_BATCH_SIZE):
+    """
+    Ứng viên có CV chưa được đánh index hoặc đã đổi CV kể từ lần đánh index trước
+
+    Returns:
+        list: Danh sách (candidate_id, cv_file)
+    """
+    query = select(Candidate.id, Candidate.cv_file).outerjoin(
+        CandidateCvIndex, CandidateCvIndex.candidate_id == Candidate.id
+    ).where(
+        Candidate.cv_file.isnot(None),
+        or_(CandidateCvIndex.candidate_id.is_(None), CandidateCvIndex.cv_file != Candidate.cv_file)
+    ).order_by(Candidate.id).limit(limit)
+    return db.session.execute(query).all()
+
+
+def save_candidate_tokens(candidate_id, cv_file, counts, error=None):
+    """
+    Ghi lại index của một ứng viên: xóa token cũ, chèn token mới, cập nhật độ dài CV (không commit)
+
+    Args:
+        candidate_id (int): ID ứng viên
+        cv_file (str): Tham chiếu CV đã xử lý
+        counts (dict): {token: tf}, None nếu trích xuất lỗi
+        error (str): Thông báo lỗi trích xuất
+    """
+    counts = counts or {}
+    db.session.execute(delete(CandidateToken).where(CandidateToken.candidate_id == candidate_id))
+    if counts:
+        db.session.execute(insert(CandidateToken), [
+            {'candidate_id': candidate_id, 'token': token, 'tf': tf} for token, tf in counts.items()
+        ])
+    db.session.merge(CandidateCvIndex(
+        candidate_id=candidate_id,
+        cv_file=cv_file,
+        doc_length=sum(counts.values()),
+        error=error,
+        indexed_at=datetime.now()
+    ))
+
+
+def index_candidate_cvs(workers=None, batch_size=INDEX_BATCH_SIZE):
+    """
+    Trích xuất và đánh index CV của mọi ứng viên chưa được xử lý
+
+    Args:
+        workers (int): Số process trích xuất, mặc định bằng số CPU
+        batch_size (int): Số CV mỗi lô
+
+    Returns:
+        tuple: (số CV đã đánh index, số CV lỗi)
+    """
+    indexed = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # CV lỗi cũng được ghi vào candidate_cv_index nên không bị lấy lại ở lô sau
+            batch = pending_candidates(batch_size)
+            if not batch:
+                break
+
+            with ExitStack() as stack:
+                jobs = []
+                for candidate_id, cv_file in batch:
+                    try:
+                        jobs.append((candidate_id, stack.enter_context(local_copy(cv_file)), file_extension(cv_file)))
+                    except Exception as e:
+                        jobs.append((candidate_id, None, None))
+                        logger.warning(f"Không đọc được CV của ứng viên {candidate_id}: {e}")
+                results = executor.map(extract_tokens, [job for job in jobs if job[1]])
+                results = {candidate_id: (counts, error) for candidate_id, counts, error in results}
+
+            cv_files = dict(batch)
+            for candidate_id, *_ in jobs:
+                counts, error = results.get(candidate_id, (None, 'Không đọc được file CV'))
+                save_candidate_tokens(candidate_id, cv_files[candidate_id], counts, error)
+                if error:
+                    failed += 1
+                else:
+                    indexed += 1
+            db.session.commit()
+    return indexed, failed
+
+
+def _corpus_stats():
+    """Số CV đã đánh index và độ dài CV trung bình"""
+    count, average = db.session.execute(
+        select(func.count(CandidateCvIndex.candidate_id), func.avg(CandidateCvIndex.doc_length))
+        .where(CandidateCvIndex.doc_length > 0)
+    ).one()
+    return count or 0, float(average or 0)
+
+
+def rank_candidates(skills_text, opening_id=None, limit=10):
+    """
+    Xếp hạng ứng viên theo mức độ phù hợp của CV với kỹ năng yêu cầu (BM25)
+
+    IDF được tính trên toàn bộ CV đã đánh index; điểm chỉ tính cho ứng viên của
+    đợt tuyển dụng nếu có opening_id.
+
+    Args:
+        skills_text (str): Kỹ năng yêu cầu (JobPosition.skills_required)
+        opening_id (int): Giới hạn theo đợt tuyển dụng (tùy chọn)
+        limit (int): Số ứng viên trả về
+
+    Returns:
+        list: dict {'candidate', 'score', 'matched'} theo điểm giảm dần
+    """
+    terms = query_terms(skills_text)
+    if not terms:
+        return []
+    total_docs, average_length = _corpus_stats()
+    if not total_docs:
+        return []
+
+    doc_freq = dict(db.session.execute(
+        select(CandidateToken.token, func.count(CandidateToken.candidate_id))
+        .where(CandidateToken.token.in_(terms))
+        .group_by(CandidateToken.token)
+    ).all())
+    terms = [term for term in terms if doc_freq.get(term)]
+    if not terms:
+        return []
+
+    postings_query = select(
+        CandidateToken.candidate_id, CandidateToken.token, CandidateToken.tf, CandidateCvIndex.doc_length
+    ).join(
+        CandidateCvIndex, CandidateCvIndex.candidate_id == CandidateToken.candidate_id
+    ).where(CandidateToken.token.in_(terms))
+    if opening_id is not None:
+        postings_query = postings_query.join(Candidate, Candidate.id == CandidateToken.candidate_id) \
+            .where(Candidate.job_opening_id == opening_id)
+    postings = db.session.execute(postings_query).all()
+    if not postings:
+        return []
+
+    candidate_ids, tokens, tf, doc_length = (np.asarray(column) for column in zip(*postings))
+    term_index = {term: i for i, term in enumerate(terms)}
+    df = np.array([doc_freq[term] for term in terms], dtype=float)
+    idf = np.log1p((total_docs - df + 0.5) / (df + 0.5))
+
+    token_ids = np.array([term_index[token] for token in tokens])
+    tf = tf.astype(float)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length.astype(float) / average_length)
+    weights = idf[token_ids] * tf * (BM25_K1 + 1) / (tf + norm)
+
+    unique_ids, inverse = np.unique(candidate_ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=weights)
+    top = np.argsort(-scores)[:limit] if len(scores) <= limit else \
+        np.argpartition(-scores, limit)[:limit]
+    top = top[np.argsort(-scores[top])]
+
+    top_ids = [int(unique_ids[i]) for i in top]
+    matched = {candidate_id: [] for candidate_id in top_ids}
+    for candidate_id, token in zip(candidate_ids, tokens):
+        if int(candidate_id) in matched:
+            matched[int(candidate_id)].append(token)
+
+    candidates = {c.id: c for c in Candidate.query.filter(Candidate.id.in_(top_ids))}
+    return [
+        {
+            'candidate': candidates[candidate_id],
+            'score': round(float(scores[i]), 3),
+            'matched': sorted(matched[candidate_id], key=term_index.get),
+        }
+        for i, candidate_id in zip(top, top_ids) if candidate_id in candidates
+    ]
@@ -0,0 +1,252 @@
+"""
+Tính khấu hao và giá trị còn lại của toàn bộ tài sản, báo cáo tài sản sắp hết hạn bảo hành.
+
+- Phương pháp khấu hao cấu hình theo danh mục (AssetCategoryModel): đường thẳng hoặc số dư giảm dần,
+  theo số tháng sử dụng hữu ích; tháng mua được tính là một tháng khấu hao.
+- Toàn bộ sổ tài sản được đọc một lần thành các mảng numpy và tính vectơ hóa trên mọi tài sản
+  (số dư giảm dần lặp theo tháng, mỗi tháng một phép tính trên cả mảng), kết quả lưu thành ảnh chụp theo tháng (asset_book_values) để báo cáo không phải tính lại.
+"""
+import logging
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import Asset, AssetStatus, AssetCategoryModel, AssetBookValue, DepreciationMethod
+
+logger = logging.getLogger(__name__)
+
+# Số dòng mỗi lệnh INSERT khi lưu ảnh chụp
+SNAPSHOT_CHUNK_SIZE = 5000
+
+# Số ngày mặc định của báo cáo bảo hành
+WARRANTY_REPORT_DAYS = 90
+
+_METHOD_CODES = {method: i for i, method in enumerate(DepreciationMethod)}
+_STRAIGHT_LINE = _METHOD_CODES[DepreciationMethod.STRAIGHT_LINE]
+_DECLINING_BALANCE = _METHOD_CODES[DepreciationMethod.DECLINING_BALANCE]
+
+
+def month_start(value):
+    """Ngày đầu tháng của một ngày"""
+    return value.replace(day=1)
+
+
+def load_register(as_of):
+    """
+    Đọc sổ tài sản cần tính khấu hao (có ngày mua, nguyên giá, chưa thanh lý, mua trước cuối kỳ)
+
+    Args:
+        as_of (date): Ngày bất kỳ trong kỳ tính
+
+    Returns:
+        dict: Các mảng numpy cùng độ dài (asset_id, category_id, purchase_month, cost,
+              method, life, salvage_rate, factor)
+    """
+    next_period = month_start(month_start(as_of) + timedelta(days=32))
+    rows = db.session.execute(
+        select(
+            Asset.id, Asset.category_id, Asset.purchase_date, Asset.purchase_price,
+            AssetCategoryModel.depreciation_method, AssetCategoryModel.useful_life_months,
+            AssetCategoryModel.salvage_rate, AssetCategoryModel.declining_factor
+        ).outerjoin(
+            AssetCategoryModel, Asset.category_id == AssetCategoryModel.id
+        ).where(
+            Asset.purchase_date.isnot(None),
+            Asset.purchase_price.isnot(None),
+            Asset.purchase_date < next_period,
+            Asset.status != AssetStatus.DISCARDED
+        )
+    ).all()
+
+    if not rows:
+        return None
+    ids, category_ids, purchase_dates, costs, methods, lives, salvage_rates, factors = zip(*rows)
+    none_code = _METHOD_CODES[DepreciationMethod.NONE]
+    return {
+        'asset_id': np.array(ids, dtype=np.int64),
+        'category_id': np.array([c if c is not None else -1 for c in category_ids], dtype=np.int64),
+        'purchase_month': np.array(purchase_dates, dtype='datetime64[M]'),
+        'cost': np.array(costs, dtype=float),
+        'method': np.array([_METHOD_CODES[m] if m else none_code for m in methods], dtype=np.int8),
+        'life': np.array([life or 0 for life in lives], dtype=float),
+        'salvage_rate': np.array([rate or 0 for rate in salvage_rates], dtype=float) / 100,
+        'factor': np.array([factor or 2.0 for factor in factors], dtype=float),
+    }
+
+
+def declining_balance_values(cost, salvage, life, rate, used):
+    """
+    Giá trị còn lại theo số dư giảm dần có chuyển sang đường thẳng
+
+    Mỗi tháng khấu hao phần lớn hơn giữa giá trị còn lại * tỷ lệ và khấu hao đường thẳng
+    của giá trị còn lại trên số tháng còn lại, không xuống dưới giá trị thu hồi; tài sản
+    chuyển sang đường thẳng từ tháng đường thẳng lớn hơn và về đúng giá trị thu hồi khi hết hạn.
+
+    Args:
+        cost, salvage, life, rate, used: Các mảng numpy cùng độ dài (nguyên giá, giá trị thu hồi,
+            số tháng hữu ích, tỷ lệ khấu hao tháng, số tháng đã dùng)
+
+    Returns:
+        ndarray: Giá trị còn lại sau số tháng đã dùng
+    """
+    book = cost.astype(float)
+    for month in range(int(used.max(initial=0))):
+        remaining = np.maximum(life - month, 1)
+        charge = np.maximum(book * rate, (book - salvage) / remaining)
+        charge = np.clip(charge, 0, np.maximum(book - salvage, 0))
+        book = np.where(used > month, book - charge, book)
+    return book
+
+
+def compute_book_values(register, as_of):
+    """
+    Tính khấu hao lũy kế và giá trị còn lại vào cuối kỳ cho toàn bộ sổ tài sản
+
+    - Đường thẳng: (nguyên giá - giá trị thu hồi) * số tháng đã dùng / số tháng hữu ích
+    - Số dư giảm dần: tỷ lệ hệ số / số tháng hữu ích trên giá trị còn lại, chuyển sang đường thẳng
+      khi có lợi hơn (declining_balance_values), bằng giá trị thu hồi khi hết thời gian sử dụng
+    - Danh mục không khấu hao hoặc chưa cấu hình số tháng: giữ nguyên giá
+
+    Args:
+        register (dict): Kết quả của load_register()
+        as_of (date): Ngày bất kỳ trong kỳ tính
+
+    Returns:
+        tuple: (mảng khấu hao lũy kế, mảng giá trị còn lại)
+    """
+    cost = register['cost']
+    life = register['life']
+    salvage = cost * np.clip(register['salvage_rate'], 0, 1)
+    elapsed = (np.datetime64(as_of, 'M') - register['purchase_month']).astype(np.int64) + 1
+    has_life = life > 0
+    used = np.clip(elapsed, 0, np.where(has_life, life, 0))
+    safe_life = np.where(has_life, life, 1)
+
+    straight = cost - (cost - salvage) * used / safe_life
+
+    method = register['method']
+    book_value = np.where(has_life & (method == _STRAIGHT_LINE), straight, cost)
+
+    declining = np.flatnonzero(has_life & (method == _DECLINING_BALANCE))
+    if declining.size:
+        rate = np.clip(register['factor'][declining] / safe_life[declining], 0, 1)
+        book_value[declining] = declining_balance_values(
+            cost[declining], salvage[declining], life[declining], rate, used[declining]
+        )
+    book_value = np.round(book_value, 2)
+    return np.round(cost - book_value, 2), book_value
+
+
+def save_snapshot(as_of=None):
+    """
+    Tính và lưu ảnh chụp giá trị còn lại của kỳ chứa as_of (ghi đè ảnh chụp cũ của kỳ)
+
+    Args:
+        as_of (date): Ngày trong kỳ cần tính, mặc định hôm nay
+
+    Returns:
+        int: Số tài sản đã lưu
+    """
+    as_of = as_of or date.today()
+    period = month_start(as_of)
+    register = load_register(as_of)
+
+    db.session.execute(delete(AssetBookValue).where(AssetBookValue.period == period))
+    if register is None:
+        db.session.commit()
+        return 0
+
+    accumulated, book_value = compute_book_values(register, as_of)
+    computed_at = datetime.now()
+    rows = [
+        {
+            'period': period,
+            'asset_id': asset_id,
+            'category_id': category_id if category_id >= 0 else None,
+            'cost': cost,
+            'accumulated_depreciation': acc,
+            'book_value': value,
+            'computed_at': computed_at,
+        }
+        for asset_id, category_id, cost, acc, value in zip(
+            register['asset_id'].tolist(), register['category_id'].tolist(), register['cost'].tolist(),
+            accumulated.tolist(), book_value.tolist()
+        )
+    ]
+    for start in range(0, len(rows), SNAPSHOT_CHUNK_SIZE):
+        db.session.execute(insert(AssetBookValue), rows[start:start + SNAPSHOT_CHUNK_SIZE])
+    db.session.commit()
+    logger.info(f"Đã lưu giá trị còn lại kỳ {period:%m/%Y} cho {len(rows)} tài sản")
+    return len(rows)
+
+
+def latest_snapshot_period():
+    """Kỳ gần nhất đã có ảnh chụp giá trị còn lại"""
+    return db.session.query(func.max(AssetBookValue.period)).scalar()
+
+
+def depreciation_summary(period):
+    """
+    Tổng hợp nguyên giá, khấu hao lũy kế và giá trị còn lại theo danh mục của một kỳ
+
+    Returns:
+        list: dict {'category', 'count', 'cost', 'accumulated_depreciation', 'book_value'}
+    """
+    rows = db.session.execute(
+        select(
+            AssetCategoryModel.name,
+            func.count(AssetBookValue.asset_id),
+            func.sum(AssetBookValue.cost),
+            func.sum(AssetBookValue.accumulated_depreciation),
+            func.sum(AssetBookValue.book_value)
+        ).select_from(AssetBookValue).outerjoin(
+            AssetCategoryModel, AssetBookValue.category_id == AssetCategoryModel.id
+        ).where(
+            AssetBookValue.period == period
+        ).group_by(AssetCategoryModel.name).order_by(AssetCategoryModel.name)
+    ).all()
+    return [
+        {
+            'category': name or 'Chưa phân loại',
+            'count': count,
+            'cost': cost or 0,
+            'accumulated_depreciation': accumulated or 0,
+            'book_value': book_value or 0,
+        }
+        for name, count, cost, accumulated, book_value in rows
+    ]
+
+
+def snapshot_rows(period):
+    """Các dòng ảnh chụp của một kỳ kèm mã, tên tài sản (đọc theo lô, dùng cho xuất CSV)"""
+    return db.session.execute(
+        select(
+            Asset.asset_code, Asset.name, AssetCategoryModel.name, Asset.purchase_date,
+            AssetBookValue.cost, AssetBookValue.accumulated_depreciation, AssetBookValue.book_value
+        ).select_from(AssetBookValue).join(
+            Asset, Asset.id == AssetBookValue.asset_id
+        ).outerjoin(
+            AssetCategoryModel, AssetBookValue.category_id == AssetCategoryModel.id
+        ).where(
+            AssetBookValue.period == period
+        ).order_by(Asset.asset_code).execution_options(yield_per=SNAPSHOT_CHUNK_SIZE)
+    )
+
+
+def expiring_warranties(days=WARRANTY_REPORT_DAYS, today=None):
+    """
+    Tài sản hết hạn bảo hành trong khoảng [hôm nay, hôm nay + days] (dùng ix_asset_warranty_expiry)
+
+    Returns:
+        list: Danh sách Asset theo ngày hết hạn tăng dần
+    """
+    today = today or date.today()
+    return Asset.query.options(
+        joinedload(Asset.asset_category), joinedload(Asset.department), joinedload(Asset.assignee)
+    ).filter(
+        Asset.warranty_expiry.between(today, today + timedelta(days=days)),
+        Asset.status != AssetStatus.DISCARDED
+    ).order_by(Asset.warranty_expiry, Asset.id).all()
@@ -0,0 +1,247 @@
+"""
+Quét giấy tờ nhân viên sắp hết hạn (CCCD, giấy khám sức khỏe, thẻ bảo hiểm...) và gửi nhắc nhở.
+
+- Mỗi loại giấy tờ có các mốc nhắc trước hạn (số ngày), ví dụ CCCD nhắc trước 60, 30 và 7 ngày;
+  giấy tờ đã hết hạn (trong EXPIRED_REMINDER_DAYS ngày) được nhắc thêm một lần.
+- Giấy tờ được nhắc khi đã tới một mốc mà chưa được nhắc ở mốc đó: mốc đã gửi lưu trên giấy tờ
+  (expiry_reminder_stage, expiry_reminded_for), nên bỏ lỡ một ngày quét không làm mất nhắc nhở
+  và giấy tờ không bị nhắc lặp lại; đổi ngày hết hạn (gia hạn) thì các mốc được tính lại.
+- Truy vấn lọc theo khoảng expiry_date và is_verified (ix_document_expiry_verified),
+  đọc theo lô (yield_per) sắp theo nhân viên nên không nạp toàn bộ giấy tờ vào bộ nhớ.
+- Mỗi nhân viên nhận một email gồm mọi giấy tờ của mình; bộ phận nhân sự nhận một bản tổng hợp
+  (số lượng theo loại và các giấy tờ hết hạn sớm nhất).
+"""
+import os
+import heapq
+import logging
+from datetime import date, timedelta
+from itertools import groupby
+
+from sqlalchemy import select, update, and_, or_
+
+from app import db
+from models import Document, DocumentType, Employee, EmployeeStatus
+from notifications import send_document_expiry_notification, send_document_expiry_digest
+
+logger = logging.getLogger(__name__)
+
+# Các mốc nhắc trước hạn (số ngày) theo loại giấy tờ; loại không có trong bảng dùng mốc mặc định
+DEFAULT_REMINDER_DAYS = (30, 7)
+REMINDER_DAYS = {
+    DocumentType.ID_CARD: (60, 30, 7),
+    DocumentType.HEALTH_CERTIFICATE: (30, 7),
+    DocumentType.INSURANCE_CARD: (30, 7),
+    DocumentType.CERTIFICATE: (60, 30),
+    DocumentType.CV: (),
+    DocumentType.TAX_CODE: (),
+}
+
+# Số ngày sau khi hết hạn giấy tờ vẫn được nhắc (một lần)
+EXPIRED_REMINDER_DAYS = int(os.environ.get('DOCUMENT_EXPIRED_REMINDER_DAYS', '30'))
+
+# Mốc nhắc của giấy tờ đã hết hạn (Document.expiry_reminder_stage)
+EXPIRED_STAGE = -1
+
+# Số dòng mỗi lần đọc khi quét
+SWEEP_BATCH_SIZE = 1000
+
+# Số giấy tờ hết hạn sớm nhất đưa vào bản tổng hợp gửi bộ phận nhân sự
+DIGEST_LIMIT = 200
+
+
+def parse_reminder_days(value):
+    """
+    Đọc cấu hình mốc nhắc dạng "ID_CARD=60/30/7;HEALTH_CERTIFICATE=30" (biến môi trường DOCUMENT_EXPIRY_REMINDERS)
+
+    Returns:
+        dict: {DocumentType: tuple số ngày}
+    """
+    result = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(';'))):
+        try:
+            name, days = item.split('=', 1)
+            result[DocumentType[name.strip()]] = tuple(int(day) for day in days.split('/') if day.strip())
+        except (ValueError, KeyError):
+            logger.warning(f"Bỏ qua cấu hình mốc nhắc không hợp lệ: {item}")
+    return result
+
+
+REMINDER_DAYS.update(parse_reminder_days(os.environ.get('DOCUMENT_EXPIRY_REMINDERS')))
+
+
+def reminder_days(document_type):
+    """Các mốc nhắc trước hạn của một loại giấy tờ"""
+    return REMINDER_DAYS.get(document_type, DEFAULT_REMINDER_DAYS)
+
+
+def reminder_stage(document_type, days_remaining):
+    """
+    Mốc nhắc hiện tại của giấy tờ: mốc nhỏ nhất không nhỏ hơn số ngày còn lại
+
+    Returns:
+        int: Số ngày của mốc, EXPIRED_STAGE nếu đã hết hạn, None nếu chưa tới mốc nào
+    """
+    stages = reminder_days(document_type)
+    if not stages:
+        return None
+    if days_remaining < 0:
+        return EXPIRED_STAGE
+    due = [days for days in stages if days >= days_remaining]
+    return min(due) if due else None
+
+
+def _not_reminded(stage):
+    """Giấy tờ chưa được nhắc ở mốc này hoặc mốc muộn hơn cho ngày hết hạn hiện tại"""
+    return or_(
+        Document.expiry_reminder_stage.is_(None),
+        Document.expiry_reminded_for.is_(None),
+        Document.expiry_reminded_for != Document.expiry_date,
+        Document.expiry_reminder_stage > stage
+    )
+
+
+def expiry_condition(today):
+    """
+    Điều kiện giấy tờ đã tới một mốc nhắc của loại giấy tờ đó mà chưa được nhắc ở mốc này
+
+    Mỗi mốc ứng với một khoảng ngày hết hạn (sau mốc nhỏ hơn kế tiếp đến hết mốc); giấy tờ
+    hết hạn trong EXPIRED_REMINDER_DAYS ngày gần nhất ứng với EXPIRED_STAGE.
+
+    Returns:
+        ClauseElement: None nếu không loại giấy tờ nào có mốc nhắc
+    """
+    earliest = today - timedelta(days=EXPIRED_REMINDER_DAYS)
+    latest = None
+    bands = []
+    for document_type in DocumentType:
+        stages = sorted(set(reminder_days(document_type)))
+        if not stages:
+            continue
+        of_type = Document.document_type == document_type
+        bands.append(and_(of_type, Document.expiry_date.between(earliest, today - timedelta(days=1)),
+                          _not_reminded(EXPIRED_STAGE)))
+        lower = today
+        for stage in stages:
+            upper = today + timedelta(days=stage)
+            bands.append(and_(of_type, Document.expiry_date.between(lower, upper), _not_reminded(stage)))
+            lower = upper + timedelta(days=1)
+        latest = max(latest or upper, upper)
+    if not bands:
+        return None
+    # Điều kiện khoảng trên expiry_date đứng riêng để database dùng được index
+    return and_(Document.expiry_date.between(earliest, latest), or_(*bands))
+
+
+def expiring_documents(today=None, verified_only=True):
+    """
+    Giấy tờ đã tới mốc nhắc mà chưa được nhắc của nhân viên đang làm việc, sắp theo nhân viên (đọc theo lô)
+
+    Returns:
+        Result: Các dòng (employee_id, employee_code, full_name, email, document_id, document_type,
+                document_number, expiry_date)
+    """
+    today = today or date.today()
+    condition = expiry_condition(today)
+    if condition is None:
+        return []
+
+    query = select(
+        Employee.id, Employee.employee_code, Employee.full_name, Employee.email,
+        Document.id, Document.document_type, Document.document_number, Document.expiry_date
+    ).join(
+        Employee, Employee.id == Document.employee_id
+    ).where(
+        condition,
+        Employee.status == EmployeeStatus.ACTIVE
+    )
+    if verified_only:
+        query = query.where(Document.is_verified == True)
+    return db.session.execute(
+        query.order_by(Employee.id, Document.expiry_date, Document.id)
+        .execution_options(yield_per=SWEEP_BATCH_SIZE)
+    )
+
+
+def mark_reminded(stages):
+    """
+    Ghi mốc nhắc đã gửi cho các giấy tờ (không commit)
+
+    Args:
+        stages (dict): {mốc: [document_id]}
+    """
+    for stage, document_ids in stages.items():
+        for start in range(0, len(document_ids), SWEEP_BATCH_SIZE):
+            db.session.execute(
+                update(Document).where(Document.id.in_(document_ids[start:start + SWEEP_BATCH_SIZE]))
+                .values(expiry_reminder_stage=stage, expiry_reminded_for=Document.expiry_date,
+                        updated_at=Document.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+
+
+def sweep_expiring_documents(today=None, verified_only=True, notify=True):
+    """
+    Quét giấy tờ tới mốc nhắc, gửi một thông báo cho mỗi nhân viên và một bản tổng hợp cho nhân sự,
+    rồi ghi lại mốc đã nhắc (commit). Chỉ giấy tờ của nhân viên đã gửi thông báo thành công được ghi
+    mốc, giấy tờ gửi lỗi sẽ được nhắc lại ở lần quét sau.
+
+    Args:
+        today (date): Ngày quét, mặc định hôm nay
+        verified_only (bool): Chỉ xét giấy tờ đã được xác minh
+        notify (bool): False để chỉ đếm, không gửi thông báo và không ghi mốc đã nhắc
+
+    Returns:
+        dict: {'documents', 'employees', 'employees_notified', 'digest_recipients', 'summary'}
+    """
+    today = today or date.today()
+    total = 0
+    employees = 0
+    notified = 0
+    summary = {}
+    soonest = []  # heap (-ngày hết hạn, thứ tự, giấy tờ) giữ DIGEST_LIMIT giấy tờ hết hạn sớm nhất
+    stages = {}
+
+    for employee_id, rows in groupby(expiring_documents(today, verified_only), key=lambda row: row[0]):
+        documents = []
+        employee_stages = {}
+        for _, employee_code, full_name, email, document_id, document_type, document_number, expiry_date in rows:
+            days_remaining = (expiry_date - today).days
+            employee_stages.setdefault(reminder_stage(document_type, days_remaining), []).append(document_id)
+            document = {
+                'employee_code': employee_code,
+                'employee_name': full_name,
+                'document_type': document_type.value,
+                'document_number': document_number,
+                'expiry_date': expiry_date,
+                'days_remaining': days_remaining,
+            }
+            documents.append(document)
+            summary[document_type.value] = summary.get(document_type.value, 0) + 1
+            entry = (-expiry_date.toordinal(), -total, document)
+            if len(soonest) < DIGEST_LIMIT:
+                heapq.heappush(soonest, entry)
+            else:
+                heapq.heappushpop(soonest, entry)
+            total += 1
+
+        employees += 1
+        if notify and send_document_expiry_notification(email, full_name, documents):
+            notified += 1
+            for stage, document_ids in employee_stages.items():
+                stages.setdefault(stage, []).extend(document_ids)
+
+    digest = [document for *_, document in sorted(soonest, reverse=True)]
+    digest_recipients = send_document_expiry_digest(digest, total, summary) if notify else 0
+    if notify:
+        mark_reminded(stages)
+        db.session.commit()
+
+    logger.info(f"Đã quét {total} giấy tờ sắp hết hạn của {employees} nhân viên, "
+                f"gửi {notified} thông báo nhân viên, {digest_recipients} bản tổng hợp")
+    return {
+        'documents': total,
+        'employees': employees,
+        'employees_notified': notified,
+        'digest_recipients': digest_recipients,
+        'summary': summary,
+    }
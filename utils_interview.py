@@ -0,0 +1,343 @@
+"""
+Kiểm tra trùng lịch phỏng vấn và tìm giờ trống chung.
+
+- Mỗi buổi phỏng vấn có thời lượng (end_time = scheduled_date + duration_minutes), phòng
+  và danh sách người phỏng vấn (interview_panelists, sao chép khoảng thời gian của buổi phỏng vấn).
+- Kiểm tra trùng là các truy vấn range trên index (employee_id, start_time, end_time) của
+  interview_panelists, (room_id, scheduled_date, end_time) của interviews, cùng với lịch công tác
+  và đơn nghỉ phép đã duyệt (utils_overlap).
+- Giờ trống được tìm bằng sweep-line: mọi khoảng bận của người phỏng vấn (phỏng vấn, lịch công tác,
+  nghỉ phép, ngoài giờ làm việc) được sắp xếp một lần và gộp lại, sau đó ghép với lịch của từng phòng.
+"""
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from models import (Employee, Interview, InterviewPanelist, InterviewRoom, InterviewStatus,
+                    LeaveStatus, WorkSchedule, WorkScheduleParticipant)
+from utils_overlap import ACTIVE_SCHEDULE_STATUSES, find_schedule_conflicts, leave_overlap_query
+
+# Trạng thái phỏng vấn còn chiếm thời gian của người phỏng vấn và phòng
+ACTIVE_INTERVIEW_STATUSES = (InterviewStatus.SCHEDULED, InterviewStatus.RESCHEDULED)
+
+# Thời lượng mặc định của một buổi phỏng vấn (phút)
+DEFAULT_DURATION_MINUTES = 60
+
+# Giờ làm việc trong ngày (thứ Hai - thứ Sáu) dùng khi tìm giờ trống
+WORK_DAY_START = time(8, 0)
+WORK_DAY_END = time(17, 30)
+
+# Giờ bắt đầu gợi ý được làm tròn lên bội số của số phút này
+SLOT_GRANULARITY_MINUTES = 15
+
+
+def interview_end(start, duration_minutes=None):
+    """Thời gian kết thúc của buổi phỏng vấn"""
+    return start + timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+
+
+def set_interview_schedule(interview, start, duration_minutes=None, room_id=None, interviewer_ids=None):
+    """
+    Gán thời gian, phòng và người phỏng vấn cho buổi phỏng vấn (không commit)
+
+    Args:
+        interview (Interview): Buổi phỏng vấn
+        start (datetime): Thời gian bắt đầu
+        duration_minutes (int): Thời lượng (phút)
+        room_id (int): ID phòng, None nếu không dùng phòng
+        interviewer_ids (list): ID nhân viên phỏng vấn; None để giữ nguyên danh sách hiện tại
+    """
+    interview.scheduled_date = start
+    interview.duration_minutes = duration_minutes or DEFAULT_DURATION_MINUTES
+    interview.end_time = interview_end(start, interview.duration_minutes)
+    interview.room_id = room_id or None
+
+    if interviewer_ids is None:
+        interviewer_ids = [panelist.employee_id for panelist in interview.panelists]
+    interview.panelists = [
+        InterviewPanelist(employee_id=employee_id, start_time=interview.scheduled_date, end_time=interview.end_time)
+        for employee_id in dict.fromkeys(interviewer_ids)
+    ]
+
+
+def find_interview_conflicts(start, end, interviewer_ids=(), room_id=None, exclude_interview_id=None):
+    """
+    Tìm các lịch trùng với buổi phỏng vấn dự kiến
+
+    Args:
+        start (datetime): Thời gian bắt đầu
+        end (datetime): Thời gian kết thúc
+        interviewer_ids (list): ID nhân viên phỏng vấn
+        room_id (int): ID phòng (tùy chọn)
+        exclude_interview_id (int): ID buổi phỏng vấn đang sửa
+
+    Returns:
+        dict: {'interviewers': [...], 'room': [...], 'schedules': [...], 'leaves': [...]}
+    """
+    interviewer_ids = list(interviewer_ids or [])
+    conflicts = {'interviewers': [], 'room': [], 'schedules': [], 'leaves': []}
+
+    if interviewer_ids:
+        query = select(
+            InterviewPanelist.employee_id, Employee.employee_code, Employee.full_name,
+            InterviewPanelist.interview_id, InterviewPanelist.start_time, InterviewPanelist.end_time
+        ).join(
+            Interview, Interview.id == InterviewPanelist.interview_id
+        ).join(
+            Employee, Employee.id == InterviewPanelist.employee_id
+        ).where(
+            InterviewPanelist.employee_id.in_(interviewer_ids),
+            InterviewPanelist.start_time < end,
+            InterviewPanelist.end_time > start,
+            Interview.status.in_(ACTIVE_INTERVIEW_STATUSES)
+        )
+        if exclude_interview_id is not None:
+            query = query.where(InterviewPanelist.interview_id != exclude_interview_id)
+        conflicts['interviewers'] = db.session.execute(query.order_by(InterviewPanelist.start_time)).all()
+        conflicts['schedules'] = find_schedule_conflicts(interviewer_ids, start, end)
+        conflicts['leaves'] = db.session.execute(
+            leave_overlap_query(interviewer_ids, start.date(), end.date(), statuses=(LeaveStatus.APPROVED,))
+        ).all()
+
+    if room_id:
+        query = select(Interview.id, Interview.scheduled_date, Interview.end_time).where(
+            Interview.room_id == room_id,
+            Interview.scheduled_date < end,
+            Interview.end_time > start,
+            Interview.status.in_(ACTIVE_INTERVIEW_STATUSES)
+        )
+        if exclude_interview_id is not None:
+            query = query.where(Interview.id != exclude_interview_id)
+        conflicts['room'] = db.session.execute(query.order_by(Interview.scheduled_date)).all()
+
+    return conflicts
+
+
+def describe_conflicts(conflicts):
+    """
+    Mô tả ngắn các lịch trùng để hiển thị cho người dùng
+
+    Returns:
+        list: Các câu mô tả, rỗng nếu không trùng
+    """
+    messages = []
+    if conflicts['interviewers']:
+        names = ', '.join(sorted({f"{c.employee_code} - {c.full_name}" for c in conflicts['interviewers']}))
+        messages.append(f'Người phỏng vấn đã có lịch phỏng vấn khác: {names}.')
+    if conflicts['schedules']:
+        names = ', '.join(sorted({f"{c.employee_code} - {c.full_name}" for c in conflicts['schedules']}))
+        messages.append(f'Người phỏng vấn bị trùng lịch công tác: {names}.')
+    if conflicts['leaves']:
+        messages.append(f"Có {len({l.employee_id for l in conflicts['leaves']})} người phỏng vấn đang nghỉ phép.")
+    if conflicts['room']:
+        times = ', '.join(f"{c.scheduled_date.strftime('%H:%M')}-{c.end_time.strftime('%H:%M')}" for c in conflicts['room'])
+        messages.append(f'Phòng phỏng vấn đã được đặt: {times}.')
+    return messages
+
+
+def conflicts_to_dict(conflicts):
+    """Dữ liệu JSON của kết quả find_interview_conflicts"""
+    return {
+        'interviewers': [
+            {'employee_id': c.employee_id, 'full_name': c.full_name, 'interview_id': c.interview_id,
+             'start': c.start_time.isoformat(), 'end': c.end_time.isoformat()}
+            for c in conflicts['interviewers']
+        ],
+        'schedules': [
+            {'employee_id': c.employee_id, 'full_name': c.full_name, 'schedule_id': c.schedule_id,
+             'title': c.title, 'start': c.start_time.isoformat(), 'end': c.end_time.isoformat()}
+            for c in conflicts['schedules']
+        ],
+        'leaves': [
+            {'leave_id': c.id, 'employee_id': c.employee_id,
+             'start': c.start_date.isoformat(), 'end': c.end_date.isoformat()}
+            for c in conflicts['leaves']
+        ],
+        'room': [
+            {'interview_id': c.id, 'start': c.scheduled_date.isoformat(), 'end': c.end_time.isoformat()}
+            for c in conflicts['room']
+        ],
+    }
+
+
+def _people_busy_intervals(interviewer_ids, window_start, window_end, exclude_interview_id=None):
+    """Các khoảng bận của người phỏng vấn trong cửa sổ: phỏng vấn, lịch công tác, nghỉ phép đã duyệt"""
+    if not interviewer_ids:
+        return []
+
+    query = select(InterviewPanelist.start_time, InterviewPanelist.end_time).join(
+        Interview, Interview.id == InterviewPanelist.interview_id
+    ).where(
+        InterviewPanelist.employee_id.in_(interviewer_ids),
+        InterviewPanelist.start_time < window_end,
+        InterviewPanelist.end_time > window_start,
+        Interview.status.in_(ACTIVE_INTERVIEW_STATUSES)
+    )
+    if exclude_interview_id is not None:
+        query = query.where(InterviewPanelist.interview_id != exclude_interview_id)
+    busy = [tuple(row) for row in db.session.execute(query)]
+
+    busy += [tuple(row) for row in db.session.execute(
+        select(WorkSchedule.start_time, WorkSchedule.end_time).join(
+            WorkScheduleParticipant, WorkScheduleParticipant.schedule_id == WorkSchedule.id
+        ).where(
+            WorkScheduleParticipant.employee_id.in_(interviewer_ids),
+            WorkSchedule.start_time < window_end,
+            WorkSchedule.end_time > window_start,
+            WorkSchedule.status.in_(ACTIVE_SCHEDULE_STATUSES)
+        )
+    )]
+
+    leaves = db.session.execute(
+        leave_overlap_query(interviewer_ids, window_start.date(), window_end.date(), statuses=(LeaveStatus.APPROVED,))
+    ).all()
+    busy += [(datetime.combine(l.start_date, time.min), datetime.combine(l.end_date + timedelta(days=1), time.min))
+             for l in leaves]
+    return busy
+
+
+def _room_busy_intervals(room_ids, window_start, window_end, exclude_interview_id=None):
+    """Các khoảng đã đặt của từng phòng trong cửa sổ"""
+    busy = {room_id: [] for room_id in room_ids}
+    if not room_ids:
+        return busy
+    query = select(Interview.room_id, Interview.scheduled_date, Interview.end_time).where(
+        Interview.room_id.in_(room_ids),
+        Interview.scheduled_date < window_end,
+        Interview.end_time > window_start,
+        Interview.status.in_(ACTIVE_INTERVIEW_STATUSES)
+    )
+    if exclude_interview_id is not None:
+        query = query.where(Interview.id != exclude_interview_id)
+    for room_id, start, end in db.session.execute(query):
+        busy[room_id].append((start, end))
+    return busy
+
+
+def _off_hours(window_start, window_end):
+    """Các khoảng ngoài giờ làm việc (buổi tối, cuối tuần) trong cửa sổ"""
+    intervals = []
+    day = window_start.date()
+    while day <= window_end.date():
+        day_start = datetime.combine(day, time.min)
+        next_day = day_start + timedelta(days=1)
+        if day.weekday() >= 5:
+            intervals.append((day_start, next_day))
+        else:
+            intervals.append((day_start, datetime.combine(day, WORK_DAY_START)))
+            intervals.append((datetime.combine(day, WORK_DAY_END), next_day))
+        day += timedelta(days=1)
+    return intervals
+
+
+def merge_intervals(intervals):
+    """
+    Gộp các khoảng bận chồng lấn bằng sweep-line (sắp xếp theo thời điểm bắt đầu)
+
+    Returns:
+        list: Các khoảng (start, end) rời nhau, tăng dần
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def free_gaps(busy, window_start, window_end):
+    """
+    Các khoảng trống trong cửa sổ, với busy là danh sách khoảng rời nhau đã sắp xếp
+
+    Returns:
+        list: Các khoảng (start, end) trống
+    """
+    gaps = []
+    cursor = window_start
+    for start, end in busy:
+        if end <= cursor:
+            continue
+        if start >= window_end:
+            break
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    return gaps
+
+
+def _round_up(moment):
+    """Làm tròn lên bội số SLOT_GRANULARITY_MINUTES"""
+    moment = moment.replace(second=0, microsecond=0)
+    remainder = moment.minute % SLOT_GRANULARITY_MINUTES
+    if remainder:
+        moment += timedelta(minutes=SLOT_GRANULARITY_MINUTES - remainder)
+    return moment
+
+
+def _slots_in_gaps(gaps, duration, limit):
+    slots = []
+    for gap_start, gap_end in gaps:
+        start = _round_up(gap_start)
+        while start + duration <= gap_end and len(slots) < limit:
+            slots.append((start, start + duration))
+            start += duration
+        if len(slots) >= limit:
+            break
+    return slots
+
+
+def find_free_slots(interviewer_ids, duration_minutes=DEFAULT_DURATION_MINUTES, window_start=None,
+                    window_end=None, room_ids=None, limit=5, exclude_interview_id=None):
+    """
+    Tìm các giờ trống sớm nhất mà mọi người phỏng vấn (và một trong các phòng, nếu có) đều rảnh
+
+    Args:
+        interviewer_ids (list): ID nhân viên phỏng vấn
+        duration_minutes (int): Thời lượng buổi phỏng vấn (phút)
+        window_start (datetime): Tìm từ thời điểm này, mặc định bây giờ
+        window_end (datetime): Tìm đến thời điểm này, mặc định sau 7 ngày
+        room_ids (list): Các phòng có thể dùng; None nếu không cần phòng
+        limit (int): Số giờ trống tối đa trả về
+        exclude_interview_id (int): ID buổi phỏng vấn đang được dời lịch
+
+    Returns:
+        list: dict {'start', 'end', 'room_id'} theo thời gian tăng dần
+    """
+    window_start = window_start or datetime.now()
+    window_end = window_end or window_start + timedelta(days=7)
+    duration = timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+
+    # Khoảng bận chung của mọi người phỏng vấn, gộp một lần
+    people_busy = merge_intervals(
+        _people_busy_intervals(list(interviewer_ids), window_start, window_end, exclude_interview_id)
+        + _off_hours(window_start, window_end)
+    )
+
+    if not room_ids:
+        gaps = free_gaps(people_busy, window_start, window_end)
+        return [{'start': start, 'end': end, 'room_id': None} for start, end in _slots_in_gaps(gaps, duration, limit)]
+
+    slots = []
+    for room_id, room_busy in _room_busy_intervals(list(room_ids), window_start, window_end,
+                                                   exclude_interview_id).items():
+        busy = merge_intervals(people_busy + room_busy) if room_busy else people_busy
+        gaps = free_gaps(busy, window_start, window_end)
+        slots += [{'start': start, 'end': end, 'room_id': room_id}
+                  for start, end in _slots_in_gaps(gaps, duration, limit)]
+
+    # Mỗi thời điểm chỉ gợi ý một phòng
+    result = {}
+    for slot in sorted(slots, key=lambda s: (s['start'], s['room_id'])):
+        result.setdefault(slot['start'], slot)
+    return list(result.values())[:limit]
+
+
+def get_room_choices():
+    """Các lựa chọn phòng phỏng vấn đang sử dụng cho ô chọn trong form"""
+    rooms = InterviewRoom.query.filter_by(is_active=True).order_by(InterviewRoom.name).all()
+    return [(0, '-- Không chọn phòng --')] + [(room.id, room.name) for room in rooms]
@@ -0,0 +1,218 @@
+"""
+Sổ ngày phép (LeaveBalance): tính số ngày làm việc của đơn nghỉ phép,
+ghi nhận/hoàn trả ngày phép khi duyệt/hủy đơn và chuyển số dư sang năm mới.
+"""
+import os
+import logging
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, case, exists, literal, select
+from sqlalchemy.orm import aliased
+
+from app import db
+from models import Employee, EmployeeStatus, Holiday, LeaveBalance, LeaveType
+
+logger = logging.getLogger(__name__)
+
+# Số ngày phép được hưởng mỗi năm theo loại phép.
+# Loại phép không có trong danh sách chỉ được theo dõi số ngày đã dùng, không giới hạn.
+LEAVE_ENTITLEMENTS = {
+    LeaveType.ANNUAL: float(os.environ.get("LEAVE_ANNUAL_DAYS", "12")),
+}
+
+# Số ngày phép năm tối đa được chuyển sang năm sau
+MAX_CARRY_OVER_DAYS = float(os.environ.get("LEAVE_MAX_CARRY_OVER_DAYS", "5"))
+
+# Ngày làm việc trong tuần (Thứ 2 -> Chủ nhật), mặc định nghỉ Thứ 7 và Chủ nhật
+WORK_WEEKMASK = os.environ.get("LEAVE_WORK_WEEKMASK", "1111100")
+
+
+def get_holidays(start_date, end_date):
+    """
+    Lấy danh sách ngày nghỉ lễ trong khoảng thời gian
+
+    Args:
+        start_date (date): Ngày bắt đầu
+        end_date (date): Ngày kết thúc
+
+    Returns:
+        list: Danh sách ngày nghỉ lễ
+    """
+    rows = Holiday.query.with_entities(Holiday.date) \
+        .filter(Holiday.date >= start_date, Holiday.date <= end_date).all()
+    return [row.date for row in rows]
+
+
+def count_working_days(start_date, end_date, holidays=None):
+    """
+    Đếm số ngày làm việc (bỏ qua cuối tuần và ngày lễ) từ start_date đến end_date, tính cả hai đầu
+
+    Args:
+        start_date (date): Ngày bắt đầu
+        end_date (date): Ngày kết thúc
+        holidays (list): Danh sách ngày lễ, nếu None sẽ lấy từ database
+
+    Returns:
+        int: Số ngày làm việc
+    """
+    if end_date < start_date:
+        return 0
+    if holidays is None:
+        holidays = get_holidays(start_date, end_date)
+    end_exclusive = np.datetime64(end_date, 'D') + np.timedelta64(1, 'D')
+    return int(np.busday_count(np.datetime64(start_date, 'D'), end_exclusive,
+                               weekmask=WORK_WEEKMASK, holidays=holidays))
+
+
+def working_days_by_year(start_date, end_date):
+    """
+    Chia số ngày làm việc của một khoảng thời gian theo từng năm (đơn nghỉ qua năm mới)
+
+    Returns:
+        dict: {năm: số ngày làm việc}
+    """
+    holidays = get_holidays(start_date, end_date)
+    result = {}
+    for year in range(start_date.year, end_date.year + 1):
+        year_start = max(start_date, start_date.replace(year=year, month=1, day=1))
+        year_end = min(end_date, end_date.replace(year=year, month=12, day=31))
+        days = count_working_days(year_start, year_end, holidays)
+        if days:
+            result[year] = days
+    return result
+
+
+def get_leave_balance(employee_id, year, leave_type, for_update=False):
+    """
+    Lấy sổ phép của nhân viên, tạo mới với số ngày được hưởng mặc định nếu chưa có
+
+    Args:
+        employee_id (int): ID nhân viên
+        year (int): Năm
+        leave_type (LeaveType): Loại phép
+        for_update (bool): Khóa dòng để cập nhật trong cùng transaction
+
+    Returns:
+        LeaveBalance: Sổ phép (chưa commit nếu vừa tạo)
+    """
+    query = LeaveBalance.query.filter_by(employee_id=employee_id, year=year, leave_type=leave_type)
+    if for_update:
+        query = query.with_for_update()
+    balance = query.first()
+    if balance is None:
+        balance = LeaveBalance(
+            employee_id=employee_id,
+            year=year,
+            leave_type=leave_type,
+            entitled_days=LEAVE_ENTITLEMENTS.get(leave_type, 0),
+            carried_over_days=0,
+            used_days=0
+        )
+        db.session.add(balance)
+    return balance
+
+
+def check_leave_balance(employee_id, leave_type, start_date, end_date):
+    """
+    Kiểm tra nhân viên còn đủ ngày phép cho khoảng thời gian xin nghỉ hay không
+
+    Returns:
+        tuple: (bool đủ ngày phép, thông báo lỗi hoặc None)
+    """
+    if leave_type not in LEAVE_ENTITLEMENTS:
+        return True, None
+
+    for year, days in working_days_by_year(start_date, end_date).items():
+        balance = LeaveBalance.query.filter_by(employee_id=employee_id, year=year, leave_type=leave_type).first()
+        remaining = balance.remaining_days if balance else LEAVE_ENTITLEMENTS[leave_type]
+        if days > remaining:
+            return False, (f'Không đủ ngày phép năm {year}: cần {days} ngày làm việc, '
+                           f'còn lại {remaining:g} ngày.')
+    return True, None
+
+
+def _adjust_used_days(leave_request, sign):
+    for year, days in working_days_by_year(leave_request.start_date, leave_request.end_date).items():
+        balance = get_leave_balance(leave_request.employee_id, year, leave_request.leave_type, for_update=True)
+        balance.used_days = max((balance.used_days or 0) + sign * days, 0)
+
+
+def apply_leave_request(leave_request):
+    """
+    Ghi nhận số ngày phép đã dùng khi đơn được duyệt.
+    Không commit: route gọi hàm này commit cùng với thay đổi trạng thái đơn.
+    """
+    _adjust_used_days(leave_request, 1)
+
+
+def release_leave_request(leave_request):
+    """
+    Hoàn trả số ngày phép khi hủy đơn đã duyệt.
+    Không commit: route gọi hàm này commit cùng với việc hủy đơn.
+    """
+    _adjust_used_days(leave_request, -1)
+
+
+def rollover_leave_balances(from_year, to_year=None):
+    """
+    Tạo sổ phép năm mới cho tất cả nhân viên đang làm việc bằng một câu lệnh INSERT ... SELECT
+    cho mỗi loại phép, chuyển số ngày còn lại (tối đa MAX_CARRY_OVER_DAYS) của phép năm.
+    Nhân viên chưa có sổ phép năm cũ được coi như còn nguyên số ngày phép tiêu chuẩn,
+    giống get_leave_balance. Nhân viên đã có sổ phép năm mới sẽ được bỏ qua.
+
+    Args:
+        from_year (int): Năm cũ
+        to_year (int): Năm mới, mặc định from_year + 1
+
+    Returns:
+        int: Số sổ phép đã tạo
+    """
+    to_year = to_year or from_year + 1
+    now = datetime.utcnow()
+    created = 0
+
+    for leave_type, entitled_days in LEAVE_ENTITLEMENTS.items():
+        previous = aliased(LeaveBalance)
+        if leave_type == LeaveType.ANNUAL:
+            remaining = previous.entitled_days + previous.carried_over_days - previous.used_days
+            carried_over = case(
+                (previous.id.is_(None), min(entitled_days, MAX_CARRY_OVER_DAYS)),
+                (remaining > MAX_CARRY_OVER_DAYS, MAX_CARRY_OVER_DAYS),
+                (remaining > 0, remaining),
+                else_=0
+            )
+        else:
+            carried_over = literal(0)
+
+        already_exists = exists().where(and_(
+            LeaveBalance.employee_id == Employee.id,
+            LeaveBalance.year == to_year,
+            LeaveBalance.leave_type == leave_type
+        ))
+
+        source = select(
+            Employee.id,
+            literal(to_year),
+            literal(leave_type, LeaveBalance.leave_type.type),
+            literal(entitled_days),
+            carried_over,
+            literal(0),
+            literal(now),
+            literal(now)
+        ).select_from(Employee).outerjoin(previous, and_(
+            previous.employee_id == Employee.id,
+            previous.year == from_year,
+            previous.leave_type == leave_type
+        )).where(Employee.status == EmployeeStatus.ACTIVE, ~already_exists)
+
+        result = db.session.execute(LeaveBalance.__table__.insert().from_select(
+            ['employee_id', 'year', 'leave_type', 'entitled_days', 'carried_over_days',
+             'used_days', 'created_at', 'updated_at'],
+            source
+        ))
+        created += result.rowcount or 0
+
+    db.session.commit()
+    logger.info(f"Đã tạo {created} sổ phép cho năm {to_year}")
+    return created
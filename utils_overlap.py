@@ -0,0 +1,110 @@
+"""
+Kiểm tra chồng lấn khoảng thời gian cho đơn nghỉ phép và lịch công tác.
+
+Mỗi kiểm tra là một câu truy vấn range trên index (employee_id, start_date, end_date)
+của leave_request và (employee_id, schedule_id) của work_schedule_participant.
+Trên PostgreSQL có thể thêm ràng buộc EXCLUDE bằng GiST (xem migrate_overlap_indexes.py)
+để database tự chặn đơn nghỉ phép trùng nhau.
+"""
+from sqlalchemy import select
+
+from app import db
+from models import (LeaveRequest, LeaveStatus, WorkSchedule, WorkScheduleParticipant,
+                    WorkScheduleStatus, Employee)
+
+# Trạng thái đơn nghỉ phép còn chiếm thời gian của nhân viên
+ACTIVE_LEAVE_STATUSES = (LeaveStatus.PENDING, LeaveStatus.APPROVED)
+
+# Trạng thái lịch công tác còn chiếm thời gian của người tham gia
+ACTIVE_SCHEDULE_STATUSES = (WorkScheduleStatus.PENDING, WorkScheduleStatus.APPROVED)
+
+
+def leave_overlap_query(employee_ids, start_date, end_date, exclude_id=None, statuses=ACTIVE_LEAVE_STATUSES):
+    """
+    Tạo câu truy vấn các đơn nghỉ phép giao với khoảng [start_date, end_date]
+
+    Args:
+        employee_ids (list): Danh sách ID nhân viên
+        start_date (date): Ngày bắt đầu
+        end_date (date): Ngày kết thúc
+        exclude_id (int): ID đơn cần bỏ qua (đơn đang được duyệt/sửa)
+        statuses (tuple): Các trạng thái đơn được tính
+
+    Returns:
+        Select: Câu truy vấn trả về (id, employee_id, start_date, end_date)
+    """
+    query = select(
+        LeaveRequest.id, LeaveRequest.employee_id, LeaveRequest.start_date, LeaveRequest.end_date
+    ).where(
+        LeaveRequest.employee_id.in_(employee_ids),
+        LeaveRequest.start_date <= end_date,
+        LeaveRequest.end_date >= start_date,
+        LeaveRequest.status.in_(statuses)
+    )
+    if exclude_id is not None:
+        query = query.where(LeaveRequest.id != exclude_id)
+    return query
+
+
+def find_leave_conflict(employee_id, start_date, end_date, exclude_id=None, statuses=ACTIVE_LEAVE_STATUSES):
+    """
+    Tìm một đơn nghỉ phép của nhân viên giao với khoảng thời gian
+    (mặc định tính đơn đang chờ duyệt và đã duyệt)
+
+    Returns:
+        Row: (id, employee_id, start_date, end_date) của đơn trùng, hoặc None
+    """
+    query = leave_overlap_query([employee_id], start_date, end_date, exclude_id, statuses).limit(1)
+    return db.session.execute(query).first()
+
+
+def find_schedule_conflicts(employee_ids, start_time, end_time, exclude_schedule_id=None):
+    """
+    Tìm các lịch công tác khác của những người tham gia giao với khoảng thời gian
+
+    Args:
+        employee_ids (list): Danh sách ID nhân viên tham gia
+        start_time (datetime): Thời gian bắt đầu
+        end_time (datetime): Thời gian kết thúc
+        exclude_schedule_id (int): ID lịch cần bỏ qua (lịch đang được sửa)
+
+    Returns:
+        list: Các dòng (employee_id, employee_code, full_name, schedule_id, title, start_time, end_time)
+    """
+    if not employee_ids:
+        return []
+    query = select(
+        WorkScheduleParticipant.employee_id,
+        Employee.employee_code,
+        Employee.full_name,
+        WorkSchedule.id.label('schedule_id'),
+        WorkSchedule.title,
+        WorkSchedule.start_time,
+        WorkSchedule.end_time
+    ).join(
+        WorkSchedule, WorkSchedule.id == WorkScheduleParticipant.schedule_id
+    ).join(
+        Employee, Employee.id == WorkScheduleParticipant.employee_id
+    ).where(
+        WorkScheduleParticipant.employee_id.in_(employee_ids),
+        WorkSchedule.start_time < end_time,
+        WorkSchedule.end_time > start_time,
+        WorkSchedule.status.in_(ACTIVE_SCHEDULE_STATUSES)
+    )
+    if exclude_schedule_id is not None:
+        query = query.where(WorkSchedule.id != exclude_schedule_id)
+    return db.session.execute(query.order_by(WorkSchedule.start_time)).all()
+
+
+def find_participant_leave_conflicts(employee_ids, start_time, end_time):
+    """
+    Tìm các đơn nghỉ phép đã duyệt của người tham gia trùng với lịch công tác
+
+    Returns:
+        list: Các dòng (id, employee_id, start_date, end_date)
+    """
+    if not employee_ids:
+        return []
+    query = leave_overlap_query(employee_ids, start_time.date(), end_time.date(),
+                                statuses=(LeaveStatus.APPROVED,))
+    return db.session.execute(query).all()
@@ -0,0 +1,229 @@
+"""
+Phân trang keyset (con trỏ) dùng chung cho các danh sách lớn, không dùng OFFSET.
+
+- Mỗi trang đọc per_page + 1 dòng sau/trước con trỏ (?after=/?before=) theo thứ tự sắp xếp
+  có cột cuối là khóa duy nhất, nên thời gian không tăng theo số trang.
+- Tổng số dòng là số gần đúng: trên PostgreSQL lấy số dòng ước tính của EXPLAIN (đếm chính xác
+  nếu ước tính nhỏ); trên database khác đếm chính xác một lần và cache ngắn hạn theo bộ lọc.
+"""
+import os
+import json
+import base64
+import hashlib
+from datetime import date, datetime
+
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+from app import db
+from utils_cache import cached
+
+# Số dòng mặc định mỗi trang
+DEFAULT_PER_PAGE = 20
+
+# Dưới ngưỡng này (theo ước tính) thì đếm chính xác vì COUNT(*) đủ rẻ
+EXACT_COUNT_THRESHOLD = 1000
+
+# Thời gian sống của cache số dòng theo bộ lọc (giây)
+COUNT_CACHE_TTL = int(os.environ.get("PAGINATION_COUNT_CACHE_TTL", "60"))
+
+# Tham số phân trang, bỏ qua khi tạo khóa cache và URL trang khác
+CURSOR_ARGS = ('after', 'before', 'page')
+
+
+def encode_cursor(values):
+    """Mã hóa giá trị các cột sắp xếp của một dòng thành chuỗi con trỏ"""
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """
+    Giải mã con trỏ thành giá trị các cột sắp xếp
+
+    Raises:
+        ValueError: Con trỏ không hợp lệ
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+
+    result = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if value is None:
+            result.append(None)
+        elif python_type is datetime:
+            result.append(datetime.fromisoformat(value))
+        elif python_type is date:
+            result.append(date.fromisoformat(value))
+        else:
+            result.append(python_type(value))
+    return result
+
+
+def _seek_condition(order, values, backward=False):
+    """
+    Điều kiện lấy các dòng nằm sau (hoặc trước nếu backward) giá trị con trỏ theo thứ tự sắp xếp:
+    (c1 sau v1) OR (c1 = v1 AND c2 sau v2) OR ...
+    """
+    conditions = []
+    for i, (column, descending) in enumerate(order):
+        later = column < values[i] if descending != backward else column > values[i]
+        conditions.append(and_(*[order[j][0] == values[j] for j in range(i)], later))
+    return or_(*conditions)
+
+
+class KeysetPage:
+    """Một trang kết quả phân trang keyset"""
+
+    def __init__(self, items, per_page, prev_cursor=None, next_cursor=None, total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def _url(self, **cursor):
+        args = {key: value for key, value in request.args.items() if key not in CURSOR_ARGS and value}
+        args.update(request.view_args or {})
+        args.update(cursor)
+        return url_for(request.endpoint, **args)
+
+    @property
+    def prev_url(self):
+        return self._url(before=self.prev_cursor) if self.has_prev else None
+
+    @property
+    def next_url(self):
+        return self._url(after=self.next_cursor) if self.has_next else None
+
+    def to_dict(self):
+        """Thông tin phân trang cho API JSON"""
+        return {
+            'per_page': self.per_page,
+            'prev_cursor': self.prev_cursor,
+            'next_cursor': self.next_cursor,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate,
+        }
+
+
+def filter_cache_key(prefix):
+    """Khóa cache số dòng theo endpoint và các tham số lọc của request hiện tại"""
+    args = sorted((key, value) for key, value in request.args.items(multi=True)
+                  if key not in CURSOR_ARGS and value)
+    digest = hashlib.sha1(json.dumps(args).encode()).hexdigest()[:16]
+    return f"count:{prefix}:{digest}"
+
+
+def _exact_count(query):
+    return query.order_by(None).count()
+
+
+def _explain_estimate(query):
+    """Số dòng ước tính của câu truy vấn theo EXPLAIN của PostgreSQL"""
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    result = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def approximate_count(query, cache_key=None):
+    """
+    Số dòng gần đúng của câu truy vấn đã lọc
+
+    Args:
+        query (Query): Câu truy vấn (chưa phân trang)
+        cache_key (str): Khóa cache số dòng, thường lấy từ filter_cache_key()
+
+    Returns:
+        tuple: (số dòng, True nếu là số ước tính)
+    """
+    if db.engine.dialect.name == 'postgresql':
+        estimate = _explain_estimate(query.order_by(None))
+        if estimate > EXACT_COUNT_THRESHOLD:
+            return estimate, True
+    if cache_key:
+        return cached(cache_key, lambda: _exact_count(query), COUNT_CACHE_TTL), False
+    return _exact_count(query), False
+
+
+def keyset_paginate(query, order, per_page=DEFAULT_PER_PAGE, after=None, before=None, count_key=None):
+    """
+    Phân trang keyset
+
+    Args:
+        query (Query): Câu truy vấn đã lọc, chưa sắp xếp
+        order (list): Các cặp (cột, giảm dần?) theo thứ tự sắp xếp; cột cuối phải là khóa duy nhất
+        per_page (int): Số dòng mỗi trang
+        after (str): Con trỏ của dòng cuối trang trước (lấy trang tiếp theo)
+        before (str): Con trỏ của dòng đầu trang sau (lấy trang trước)
+        count_key (str): Khóa cache số dòng; None để không tính tổng
+
+    Returns:
+        KeysetPage: Trang kết quả (con trỏ không hợp lệ được coi như trang đầu)
+    """
+    columns = [column for column, _ in order]
+    forward_order = [column.desc() if descending else column.asc() for column, descending in order]
+    backward_order = [column.asc() if descending else column.desc() for column, descending in order]
+
+    def cursor_of(item):
+        return encode_cursor([getattr(item, column.key) for column in columns])
+
+    def decode(cursor):
+        try:
+            return decode_cursor(cursor, columns) if cursor else None
+        except ValueError:
+            return None
+
+    before_values = decode(before)
+    after_values = decode(after) if before_values is None else None
+
+    if before_values is not None:
+        rows = query.filter(_seek_condition(order, before_values, backward=True)) \
+            .order_by(*backward_order).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        prev_cursor = cursor_of(rows[0]) if rows and has_more else None
+        next_cursor = cursor_of(rows[-1]) if rows else None
+    else:
+        paged = query.filter(_seek_condition(order, after_values)) if after_values is not None else query
+        rows = paged.order_by(*forward_order).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        prev_cursor = cursor_of(rows[0]) if rows and after_values is not None else None
+        next_cursor = cursor_of(rows[-1]) if rows and has_more else None
+
+    total, is_estimate = approximate_count(query, count_key) if count_key else (None, False)
+    return KeysetPage(rows, per_page, prev_cursor, next_cursor, total, is_estimate)
+
+
+def paginate_request(query, order, per_page=DEFAULT_PER_PAGE, count_prefix=None):
+    """
+    Phân trang keyset theo tham số ?after=/?before= của request hiện tại
+
+    Args:
+        count_prefix (str): Tiền tố khóa cache số dòng (thường là tên danh sách); None để không tính tổng
+    """
+    return keyset_paginate(
+        query, order, per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        count_key=filter_cache_key(count_prefix) if count_prefix else None
+    )
@@ -0,0 +1,235 @@
+"""
+Tính bảng lương tháng theo lô.
+
+Thay vì tính EmployeeSalary.calculated_salary cho từng đối tượng (mỗi lần lazy load
+salary_grade), toàn bộ dữ liệu của tháng được đọc bằng vài truy vấn dạng cột:
+hồ sơ lương hiệu lực (join SalaryGrade), số ngày chấm công (group-by trong SQL) và
+đơn nghỉ phép đã duyệt. Các khoản khấu trừ được tính bằng phép toán vectơ (pandas/NumPy),
+kết quả được ghi thành một PayrollRun cùng các PayrollItem bằng bulk insert.
+"""
+import os
+import logging
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, or_
+
+from app import db
+from models import (Attendance, Employee, EmployeeSalary, EmployeeStatus, LeaveRequest, LeaveStatus,
+                    LeaveType, PayrollItem, PayrollRun, SalaryGrade)
+from utils_leave import WORK_WEEKMASK, get_holidays
+
+logger = logging.getLogger(__name__)
+
+# Trừ lương những ngày làm việc không chấm công và không có đơn nghỉ phép được duyệt
+DEDUCT_ABSENT_DAYS = os.environ.get("PAYROLL_DEDUCT_ABSENT_DAYS", "1") == "1"
+
+# Loại phép không được hưởng lương
+UNPAID_LEAVE_TYPES = (LeaveType.UNPAID,)
+
+# Số dòng lương ghi vào database trong mỗi lệnh insert
+INSERT_BATCH_SIZE = int(os.environ.get("PAYROLL_INSERT_BATCH_SIZE", "5000"))
+
+ITEM_COLUMNS = [
+    'employee_id', 'employee_salary_id', 'salary_grade_id', 'base_salary', 'total_coefficient',
+    'gross_salary', 'working_days', 'days_present', 'paid_leave_days', 'unpaid_leave_days',
+    'absent_days', 'deduction', 'net_salary'
+]
+
+
+def get_period(year, month):
+    """
+    Ngày đầu và ngày cuối của tháng
+
+    Returns:
+        tuple: (date bắt đầu, date kết thúc)
+    """
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _busday_count(starts, ends, holidays):
+    """Đếm số ngày làm việc cho từng cặp [start, end] (tính cả hai đầu), không lặp Python"""
+    starts = np.asarray(starts, dtype='datetime64[D]')
+    ends = np.asarray(ends, dtype='datetime64[D]') + np.timedelta64(1, 'D')
+    counts = np.busday_count(starts, np.maximum(ends, starts), weekmask=WORK_WEEKMASK, holidays=holidays)
+    return counts.astype(np.int64)
+
+
+def load_effective_salaries(period_start, period_end):
+    """
+    Hồ sơ lương có hiệu lực trong tháng của mỗi nhân viên (kèm bậc lương).
+    Nếu có nhiều hồ sơ giao với tháng, lấy hồ sơ có ngày hiệu lực muộn nhất.
+
+    Returns:
+        DataFrame: Mỗi nhân viên một dòng
+    """
+    query = select(
+        EmployeeSalary.id.label('employee_salary_id'),
+        EmployeeSalary.employee_id,
+        EmployeeSalary.salary_grade_id,
+        EmployeeSalary.effective_date,
+        EmployeeSalary.additional_coefficient,
+        SalaryGrade.base_coefficient,
+        SalaryGrade.base_salary,
+        Employee.join_date
+    ).join(
+        SalaryGrade, EmployeeSalary.salary_grade_id == SalaryGrade.id
+    ).join(
+        Employee, EmployeeSalary.employee_id == Employee.id
+    ).where(
+        EmployeeSalary.effective_date <= period_end,
+        or_(EmployeeSalary.end_date.is_(None), EmployeeSalary.end_date >= period_start),
+        Employee.join_date <= period_end,
+        Employee.status != EmployeeStatus.LEAVE
+    )
+    df = pd.read_sql(query, db.session.connection())
+    return df.sort_values(['employee_id', 'effective_date', 'employee_salary_id']) \
+        .drop_duplicates('employee_id', keep='last') \
+        .reset_index(drop=True)
+
+
+def load_days_present(period_start, period_end):
+    """
+    Số ngày có chấm công của mỗi nhân viên trong tháng (đếm trong SQL)
+
+    Returns:
+        Series: days_present theo employee_id
+    """
+    query = select(
+        Attendance.employee_id,
+        func.count(func.distinct(Attendance.date)).label('days_present')
+    ).where(
+        Attendance.date.between(period_start, period_end),
+        Attendance.check_in.isnot(None)
+    ).group_by(Attendance.employee_id)
+    df = pd.read_sql(query, db.session.connection())
+    return df.set_index('employee_id')['days_present']
+
+
+def load_leave_days(period_start, period_end, holidays):
+    """
+    Số ngày làm việc nghỉ phép đã duyệt trong tháng, tách có lương / không lương
+
+    Returns:
+        DataFrame: Các cột paid_leave_days, unpaid_leave_days theo employee_id
+    """
+    query = select(
+        LeaveRequest.employee_id,
+        LeaveRequest.leave_type,
+        LeaveRequest.start_date,
+        LeaveRequest.end_date
+    ).where(
+        LeaveRequest.status == LeaveStatus.APPROVED,
+        LeaveRequest.start_date <= period_end,
+        LeaveRequest.end_date >= period_start
+    )
+    df = pd.read_sql(query, db.session.connection())
+    if df.empty:
+        return pd.DataFrame(columns=['paid_leave_days', 'unpaid_leave_days'], dtype='int64')
+
+    starts = pd.to_datetime(df['start_date']).clip(lower=pd.Timestamp(period_start))
+    ends = pd.to_datetime(df['end_date']).clip(upper=pd.Timestamp(period_end))
+    df['days'] = _busday_count(starts.values, ends.values, holidays)
+    df['unpaid'] = df['leave_type'].isin(UNPAID_LEAVE_TYPES)
+    df['paid_leave_days'] = df['days'].where(~df['unpaid'], 0)
+    df['unpaid_leave_days'] = df['days'].where(df['unpaid'], 0)
+    return df.groupby('employee_id')[['paid_leave_days', 'unpaid_leave_days']].sum()
+
+
+def compute_payroll(year, month):
+    """
+    Tính lương tháng cho tất cả nhân viên có hồ sơ lương hiệu lực (chưa ghi database)
+
+    Lương = (hệ số cơ bản + hệ số phụ cấp) x lương cơ sở. Khấu trừ theo ngày công:
+    lương / số ngày làm việc chuẩn của tháng x số ngày không được trả lương
+    (trước ngày vào làm, nghỉ không lương và vắng mặt nếu DEDUCT_ABSENT_DAYS).
+
+    Args:
+        year (int): Năm
+        month (int): Tháng
+
+    Returns:
+        tuple: (số ngày làm việc chuẩn, DataFrame các cột ITEM_COLUMNS)
+    """
+    period_start, period_end = get_period(year, month)
+    holidays = get_holidays(period_start, period_end)
+    standard_days = int(_busday_count([period_start], [period_end], holidays)[0])
+
+    df = load_effective_salaries(period_start, period_end)
+    if df.empty or standard_days == 0:
+        return standard_days, pd.DataFrame(columns=ITEM_COLUMNS)
+
+    df['total_coefficient'] = df['base_coefficient'] + df['additional_coefficient'].fillna(0)
+    df['gross_salary'] = np.floor(df['total_coefficient'] * df['base_salary']).astype(np.int64)
+
+    # Số ngày phải đi làm tính từ ngày vào làm (nếu vào làm giữa tháng)
+    starts = pd.to_datetime(df['join_date']).clip(lower=pd.Timestamp(period_start))
+    df['working_days'] = _busday_count(starts.values, [period_end] * len(df), holidays)
+
+    df = df.join(load_days_present(period_start, period_end), on='employee_id')
+    df = df.join(load_leave_days(period_start, period_end, holidays), on='employee_id')
+    for column in ('days_present', 'paid_leave_days', 'unpaid_leave_days'):
+        df[column] = df[column].fillna(0).astype(np.int64)
+
+    if DEDUCT_ABSENT_DAYS:
+        absent = df['working_days'] - df['days_present'] - df['paid_leave_days'] - df['unpaid_leave_days']
+        df['absent_days'] = absent.clip(lower=0)
+    else:
+        df['absent_days'] = 0
+
+    unpaid_days = (standard_days - df['working_days']) + df['unpaid_leave_days'] + df['absent_days']
+    unpaid_days = unpaid_days.clip(lower=0, upper=standard_days)
+    df['deduction'] = np.round(df['gross_salary'] * unpaid_days / standard_days).astype(np.int64)
+    df['net_salary'] = df['gross_salary'] - df['deduction']
+
+    return standard_days, df[ITEM_COLUMNS]
+
+
+def create_payroll_run(year, month, created_by_id=None, notes=None):
+    """
+    Tính và chốt bảng lương tháng. Bảng lương đã chốt không sửa được,
+    tính lại cùng tháng sẽ tạo một PayrollRun mới.
+
+    Args:
+        year (int): Năm
+        month (int): Tháng
+        created_by_id (int): ID người dùng tạo bảng lương
+        notes (str): Ghi chú
+
+    Returns:
+        PayrollRun: Bảng lương vừa tạo
+    """
+    period_start, period_end = get_period(year, month)
+    standard_days, items = compute_payroll(year, month)
+
+    run = PayrollRun(
+        year=year,
+        month=month,
+        period_start=period_start,
+        period_end=period_end,
+        working_days=standard_days,
+        employee_count=len(items),
+        total_gross=int(items['gross_salary'].sum()) if len(items) else 0,
+        total_deduction=int(items['deduction'].sum()) if len(items) else 0,
+        total_net=int(items['net_salary'].sum()) if len(items) else 0,
+        notes=notes,
+        created_by_id=created_by_id
+    )
+    try:
+        db.session.add(run)
+        db.session.flush()
+
+        # astype(object) chuyển kiểu NumPy sang kiểu Python để driver database nhận được
+        records = items.assign(run_id=run.id).astype(object).to_dict(orient='records')
+        for offset in range(0, len(records), INSERT_BATCH_SIZE):
+            db.session.execute(PayrollItem.__table__.insert(), records[offset:offset + INSERT_BATCH_SIZE])
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Đã tạo bảng lương {month}/{year}: {run.employee_count} nhân viên, tổng {run.total_net}")
+    return run
@@ -0,0 +1,117 @@
+"""
+Lưu điểm đánh giá hiệu suất theo tiêu chí.
+
+Số câu truy vấn không phụ thuộc số tiêu chí: chi tiết đánh giá hiện có được đọc bằng
+một truy vấn, tất cả dòng chi tiết được ghi bằng một câu INSERT ... ON CONFLICT DO UPDATE
+(SQLite/PostgreSQL, dựa trên unique (evaluation_id, criteria_id)) và điểm tổng hợp
+có trọng số được tính bằng một câu SELECT.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, func, insert, update
+
+from app import db
+from models import PerformanceEvaluationCriteria, PerformanceEvaluationDetail
+
+
+def get_evaluation_details(evaluation_id):
+    """
+    Chi tiết đánh giá hiện có của một đánh giá
+
+    Returns:
+        dict: {criteria_id: PerformanceEvaluationDetail}
+    """
+    query = select(PerformanceEvaluationDetail).where(PerformanceEvaluationDetail.evaluation_id == evaluation_id)
+    return {detail.criteria_id: detail for detail in db.session.execute(query).scalars()}
+
+
+def _dialect_insert():
+    """Hàm insert hỗ trợ ON CONFLICT của database đang dùng, hoặc None"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert
+    return None
+
+
+def upsert_evaluation_details(evaluation_id, scores, existing=None):
+    """
+    Ghi điểm của tất cả tiêu chí bằng một câu lệnh (không commit)
+
+    Args:
+        evaluation_id (int): ID đánh giá
+        scores (list): Danh sách dict {'criteria_id', 'score', 'comments'}
+        existing (dict): Kết quả get_evaluation_details, chỉ dùng khi database không hỗ trợ ON CONFLICT
+    """
+    if not scores:
+        return
+    now = datetime.utcnow()
+    rows = [dict(row, evaluation_id=evaluation_id, created_at=now, updated_at=now) for row in scores]
+
+    dialect_insert = _dialect_insert()
+    if dialect_insert is not None:
+        stmt = dialect_insert(PerformanceEvaluationDetail.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['evaluation_id', 'criteria_id'],
+            set_={
+                'score': stmt.excluded.score,
+                'comments': stmt.excluded.comments,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    # Database khác: một lệnh UPDATE hàng loạt theo khóa chính và một lệnh INSERT hàng loạt
+    if existing is None:
+        existing = get_evaluation_details(evaluation_id)
+    updates = [
+        {'id': existing[row['criteria_id']].id, 'score': row['score'],
+         'comments': row['comments'], 'updated_at': now}
+        for row in rows if row['criteria_id'] in existing
+    ]
+    inserts = [row for row in rows if row['criteria_id'] not in existing]
+    if updates:
+        db.session.execute(update(PerformanceEvaluationDetail), updates)
+    if inserts:
+        db.session.execute(insert(PerformanceEvaluationDetail), inserts)
+
+
+def calculate_overall_score(evaluation_id):
+    """
+    Điểm tổng hợp có trọng số của đánh giá, tính trong SQL
+
+    Returns:
+        float: Điểm tổng hợp, hoặc None nếu chưa có tiêu chí nào được chấm
+    """
+    weight = PerformanceEvaluationCriteria.weight
+    query = select(
+        func.sum(PerformanceEvaluationDetail.score * weight) / func.nullif(func.sum(weight), 0)
+    ).join(
+        PerformanceEvaluationCriteria, PerformanceEvaluationDetail.criteria_id == PerformanceEvaluationCriteria.id
+    ).where(
+        PerformanceEvaluationDetail.evaluation_id == evaluation_id,
+        PerformanceEvaluationDetail.score.isnot(None)
+    )
+    score = db.session.execute(query).scalar()
+    return float(score) if score is not None else None
+
+
+def save_evaluation_scores(evaluation, scores, existing=None):
+    """
+    Ghi điểm các tiêu chí và cập nhật điểm tổng hợp của đánh giá (không commit)
+
+    Args:
+        evaluation (PerformanceEvaluation): Đánh giá
+        scores (list): Danh sách dict {'criteria_id', 'score', 'comments'}
+        existing (dict): Chi tiết đánh giá đã đọc trước đó (tùy chọn)
+
+    Returns:
+        float: Điểm tổng hợp mới
+    """
+    upsert_evaluation_details(evaluation.id, scores, existing)
+    evaluation.overall_score = calculate_overall_score(evaluation.id)
+    return evaluation.overall_score
@@ -0,0 +1,248 @@
+"""
+Thống kê đánh giá hiệu suất toàn công ty theo kỳ đánh giá và phòng ban.
+
+Điểm tổng hợp của các đánh giá đã hoàn thành được đọc một lần thành DataFrame;
+phân phối (trung bình, độ lệch chuẩn, phân vị), xếp hạng phần trăm và nhóm hiệu chỉnh
+được tính bằng pandas. Điểm trung bình theo tiêu chí được group-by trong SQL.
+Kết quả được cache theo (kỳ, năm, phòng ban) và xóa khi giao dịch phê duyệt/chấm lại/xóa
+đánh giá commit.
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func, event
+
+from app import db
+from models import (Department, Employee, PerformanceEvaluation, PerformanceEvaluationCriteria,
+                    PerformanceEvaluationDetail, PerformanceRatingStatus)
+from utils_cache import cached, invalidate
+
+# Chỉ thống kê các đánh giá đã được phê duyệt hoàn thành
+ANALYTICS_STATUSES = (PerformanceRatingStatus.COMPLETED,)
+
+# Thời gian sống của cache thống kê (giây)
+ANALYTICS_CACHE_TTL = int(os.environ.get("PERFORMANCE_ANALYTICS_CACHE_TTL", "3600"))
+
+# Khóa trong session.info chứa các khóa cache thống kê cần xóa khi commit
+_STALE_KEY = 'stale_performance_analytics'
+
+# Nhóm hiệu chỉnh theo xếp hạng phần trăm: (tên, cận dưới của phân vị)
+CALIBRATION_BUCKETS = [
+    ('Xuất sắc', 0.9),
+    ('Tốt', 0.7),
+    ('Đạt', 0.3),
+    ('Cần cải thiện', 0.1),
+    ('Chưa đạt', 0.0),
+]
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def analytics_cache_key(period, year, department_id=None):
+    """Khóa cache thống kê của một (kỳ, năm, phòng ban)"""
+    return f"perf:analytics:{period}:{year}:{department_id or 'all'}"
+
+
+def invalidate_performance_analytics(evaluation, session=None):
+    """
+    Đánh dấu cache thống kê bị ảnh hưởng bởi một đánh giá cần xóa khi giao dịch hiện tại commit
+    (gọi trước commit; rollback thì giữ nguyên cache)
+
+    Args:
+        evaluation (PerformanceEvaluation): Đánh giá sắp được phê duyệt/chấm điểm/xóa
+        session: Session chứa thay đổi, mặc định db.session
+    """
+    period = evaluation.evaluation_period.name
+    year = evaluation.start_date.year
+    department_id = evaluation.employee.department_id if evaluation.employee else None
+    session = session or db.session()
+    session.info.setdefault(_STALE_KEY, set()).update(
+        (analytics_cache_key(period, year), analytics_cache_key(period, year, department_id))
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_stale_analytics(session):
+    keys = session.info.pop(_STALE_KEY, ())
+    if keys:
+        invalidate(*keys)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_stale_analytics(session):
+    session.info.pop(_STALE_KEY, None)
+
+
+def _evaluation_filters(period, year, department_id):
+    filters = [
+        PerformanceEvaluation.status.in_(ANALYTICS_STATUSES),
+        PerformanceEvaluation.evaluation_period == period,
+        PerformanceEvaluation.start_date.between(date(year, 1, 1), date(year, 12, 31)),
+    ]
+    if department_id:
+        filters.append(Employee.department_id == department_id)
+    return filters
+
+
+def load_scores_frame(period, year, department_id=None):
+    """
+    Điểm tổng hợp của các đánh giá trong kỳ (một truy vấn)
+
+    Returns:
+        DataFrame: evaluation_id, employee_id, employee_code, full_name,
+                   department_id, department_name, overall_score
+    """
+    query = select(
+        PerformanceEvaluation.id.label('evaluation_id'),
+        PerformanceEvaluation.employee_id,
+        Employee.employee_code,
+        Employee.full_name,
+        Employee.department_id,
+        Department.name.label('department_name'),
+        PerformanceEvaluation.overall_score
+    ).join(
+        Employee, PerformanceEvaluation.employee_id == Employee.id
+    ).join(
+        Department, Employee.department_id == Department.id
+    ).where(
+        PerformanceEvaluation.overall_score.isnot(None),
+        *_evaluation_filters(period, year, department_id)
+    )
+    return pd.read_sql(query, db.session.connection())
+
+
+def _calibration_bucket(percentile_rank):
+    """Gán nhóm hiệu chỉnh cho từng xếp hạng phần trăm (vectơ hóa)"""
+    conditions = [percentile_rank >= lower for _, lower in CALIBRATION_BUCKETS]
+    return np.select(conditions, [name for name, _ in CALIBRATION_BUCKETS], default=CALIBRATION_BUCKETS[-1][0])
+
+
+def _describe(scores):
+    """Thống kê phân phối của một dãy điểm"""
+    if scores.empty:
+        return {'count': 0}
+    result = {
+        'count': int(scores.count()),
+        'mean': round(float(scores.mean()), 2),
+        'stdev': round(float(scores.std(ddof=0)), 2),
+        'min': round(float(scores.min()), 2),
+        'max': round(float(scores.max()), 2),
+    }
+    for p, value in zip(PERCENTILES, np.percentile(scores.to_numpy(), PERCENTILES)):
+        result[f'p{p}'] = round(float(value), 2)
+    return result
+
+
+def criteria_averages(period, year, department_id=None):
+    """
+    Điểm trung bình theo tiêu chí (group-by trong SQL)
+
+    Returns:
+        list: dict {criteria_id, name, weight, max_score, count, average, average_percent}
+    """
+    query = select(
+        PerformanceEvaluationCriteria.id,
+        PerformanceEvaluationCriteria.name,
+        PerformanceEvaluationCriteria.weight,
+        PerformanceEvaluationCriteria.max_score,
+        func.count(PerformanceEvaluationDetail.id),
+        func.avg(PerformanceEvaluationDetail.score)
+    ).join(
+        PerformanceEvaluationDetail, PerformanceEvaluationDetail.criteria_id == PerformanceEvaluationCriteria.id
+    ).join(
+        PerformanceEvaluation, PerformanceEvaluationDetail.evaluation_id == PerformanceEvaluation.id
+    ).join(
+        Employee, PerformanceEvaluation.employee_id == Employee.id
+    ).where(
+        PerformanceEvaluationDetail.score.isnot(None),
+        *_evaluation_filters(period, year, department_id)
+    ).group_by(
+        PerformanceEvaluationCriteria.id,
+        PerformanceEvaluationCriteria.name,
+        PerformanceEvaluationCriteria.weight,
+        PerformanceEvaluationCriteria.max_score
+    ).order_by(PerformanceEvaluationCriteria.name)
+
+    result = []
+    for criteria_id, name, weight, max_score, count, average in db.session.execute(query):
+        average = float(average) if average is not None else None
+        result.append({
+            'criteria_id': criteria_id,
+            'name': name,
+            'weight': weight,
+            'max_score': max_score,
+            'count': count,
+            'average': round(average, 2) if average is not None else None,
+            'average_percent': round(average / max_score * 100, 1) if average is not None and max_score else None,
+        })
+    return result
+
+
+def compute_performance_analytics(period, year, department_id=None):
+    """
+    Tính thống kê đánh giá hiệu suất (không dùng cache)
+
+    Args:
+        period (str): Tên kỳ đánh giá (PerformanceRatingPeriod.name)
+        year (int): Năm của ngày bắt đầu kỳ đánh giá
+        department_id (int): Giới hạn theo phòng ban (tùy chọn)
+
+    Returns:
+        dict: {'filters', 'overall', 'departments', 'buckets', 'rankings', 'criteria'}
+    """
+    df = load_scores_frame(period, year, department_id)
+    filters = {'period': period, 'year': year, 'department_id': department_id}
+
+    if df.empty:
+        return {'filters': filters, 'overall': {'count': 0}, 'departments': [],
+                'buckets': [{'name': name, 'count': 0} for name, _ in CALIBRATION_BUCKETS],
+                'rankings': [], 'criteria': criteria_averages(period, year, department_id)}
+
+    # Xếp hạng phần trăm trong toàn bộ tập và trong từng phòng ban
+    df['percentile'] = df['overall_score'].rank(pct=True, method='max')
+    df['department_percentile'] = df.groupby('department_id')['overall_score'].rank(pct=True, method='max')
+    df['bucket'] = _calibration_bucket(df['percentile'])
+
+    departments = []
+    for (dept_id, dept_name), group in df.groupby(['department_id', 'department_name'], sort=True):
+        departments.append(dict(_describe(group['overall_score']), department_id=int(dept_id),
+                                department_name=dept_name))
+
+    bucket_counts = df['bucket'].value_counts()
+    buckets = [{'name': name, 'count': int(bucket_counts.get(name, 0))} for name, _ in CALIBRATION_BUCKETS]
+
+    rankings = df.sort_values('overall_score', ascending=False)
+    rankings = [
+        {
+            'evaluation_id': int(row.evaluation_id),
+            'employee_id': int(row.employee_id),
+            'employee_code': row.employee_code,
+            'full_name': row.full_name,
+            'department_name': row.department_name,
+            'overall_score': round(float(row.overall_score), 2),
+            'percentile': round(float(row.percentile) * 100, 1),
+            'department_percentile': round(float(row.department_percentile) * 100, 1),
+            'bucket': row.bucket,
+        }
+        for row in rankings.itertuples(index=False)
+    ]
+
+    return {
+        'filters': filters,
+        'overall': _describe(df['overall_score']),
+        'departments': departments,
+        'buckets': buckets,
+        'rankings': rankings,
+        'criteria': criteria_averages(period, year, department_id),
+    }
+
+
+def get_performance_analytics(period, year, department_id=None):
+    """Thống kê đánh giá hiệu suất, có cache theo (kỳ, năm, phòng ban)"""
+    return cached(
+        analytics_cache_key(period, year, department_id),
+        lambda: compute_performance_analytics(period, year, department_id),
+        ANALYTICS_CACHE_TTL
+    )
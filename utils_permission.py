@@ -336,6 +336,7 @@ def setup_initial_permissions():
     """
     from app import db
     from models import Permission, Role
+    from utils_cache import invalidate, PERMISSIONS
     
     # Thêm các quyền mặc định
     for perm_data in DEFAULT_PERMISSIONS:
@@ -351,6 +352,7 @@ def setup_initial_permissions():
             db.session.add(perm)
     
     db.session.commit()
+    invalidate(PERMISSIONS)
     
     # Tạo các vai trò mặc định
     for role_data in DEFAULT_ROLES:
@@ -370,4 +372,9 @@ def setup_initial_permissions():
             
             db.session.add(role)
     
-    db.session.commit()
\ No newline at end of file
+    db.session.commit()
+    
+    # Dựng lại toàn bộ ma trận quyền hiệu lực (lần đầu hoặc sau khi nâng cấp)
+    from utils_permission_matrix import rebuild_user_permissions
+    rebuild_user_permissions()
+    db.session.commit()
@@ -0,0 +1,195 @@
+"""
+Ma trận quyền hiệu lực người dùng × quyền (bảng user_effective_permissions), tính sẵn từ vai trò.
+
+- Admin có mọi quyền; người dùng khác có hợp các quyền của những vai trò đang hoạt động được gán.
+- Mỗi lần dựng lại là một lệnh DELETE và một lệnh INSERT ... SELECT cho tập người dùng bị ảnh hưởng.
+- Sự kiện flush của session ghi nhận thay đổi về vai trò, quyền của vai trò, gán vai trò, loại tài khoản
+  và thêm/xóa quyền, rồi dựng lại phần ma trận liên quan trong cùng giao dịch.
+- has_permission(), trang quản trị phân quyền và các truy vấn kiểm tra (ai có quyền X) đọc từ ma trận.
+"""
+import logging
+
+from sqlalchemy import select, delete, insert, union, func, event, inspect, true
+
+from app import db
+from models import User, UserRole, Role, Permission, UserPermission, role_permissions, user_roles
+
+logger = logging.getLogger(__name__)
+
+# Khóa trong session.info chứa các thay đổi chờ dựng lại ma trận
+_PENDING_KEY = 'permission_matrix'
+
+
+def effective_permissions(user_ids=None):
+    """
+    Truy vấn các cặp (user_id, permission_id) hiệu lực
+
+    Args:
+        user_ids: Danh sách ID hoặc truy vấn con trả về ID người dùng (mặc định tất cả)
+    """
+    def only(column):
+        return column.in_(user_ids) if user_ids is not None else true()
+
+    from_roles = select(user_roles.c.user_id, role_permissions.c.permission_id) \
+        .join(Role, Role.id == user_roles.c.role_id) \
+        .join(role_permissions, role_permissions.c.role_id == Role.id) \
+        .join(User, User.id == user_roles.c.user_id) \
+        .where(Role.is_active == True, User.role != UserRole.ADMIN, only(user_roles.c.user_id))
+    from_admin = select(User.id, Permission.id).select_from(User).join(Permission, true()) \
+        .where(User.role == UserRole.ADMIN, only(User.id))
+    return union(from_roles, from_admin)
+
+
+def rebuild_statements(user_ids=None):
+    """Các lệnh dựng lại ma trận cho các người dùng (mặc định toàn bộ)"""
+    table = UserPermission.__table__
+    clear = delete(table)
+    if user_ids is not None:
+        clear = clear.where(table.c.user_id.in_(user_ids))
+    fill = insert(table).from_select(['user_id', 'permission_id'], effective_permissions(user_ids))
+    return clear, fill
+
+
+def rebuild_user_permissions(user_ids=None, connection=None):
+    """
+    Dựng lại ma trận quyền cho các người dùng (không commit)
+
+    Args:
+        user_ids: Danh sách ID hoặc truy vấn con trả về ID người dùng (mặc định toàn bộ)
+        connection: Kết nối dùng để thực thi (mặc định db.session)
+
+    Returns:
+        int: Số ô quyền đã ghi
+    """
+    if isinstance(user_ids, (set, list, tuple)) and not user_ids:
+        return 0
+    execute = connection.execute if connection is not None else db.session.execute
+    clear, fill = rebuild_statements(user_ids)
+    execute(clear)
+    return execute(fill).rowcount
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, {
+        'users': set(), 'new_users': [], 'admins': False, 'deleted_permissions': set()
+    })
+
+
+def _changed(obj, *attributes):
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _role_members(session, role_id):
+    return set(session.execute(select(user_roles.c.user_id).where(user_roles.c.role_id == role_id)).scalars())
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_permission_changes(session, flush_context, instances):
+    """Ghi nhận người dùng bị ảnh hưởng trước khi flush (thành viên của vai trò còn đọc được)"""
+    pending = None
+    for obj in session.new:
+        if isinstance(obj, User):
+            pending = pending or _pending(session)
+            pending['new_users'].append(obj)
+        elif isinstance(obj, Permission):
+            pending = pending or _pending(session)
+            pending['admins'] = True
+        elif isinstance(obj, Role) and obj.users:
+            pending = pending or _pending(session)
+            pending['new_users'].extend(obj.users)
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, 'role', 'custom_roles'):
+            pending = pending or _pending(session)
+            pending['users'].add(obj.id)
+        elif isinstance(obj, Role) and _changed(obj, 'is_active', 'permissions', 'users'):
+            pending = pending or _pending(session)
+            pending['users'] |= _role_members(session, obj.id)
+            pending['new_users'].extend(inspect(obj).attrs.users.history.added)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pending = pending or _pending(session)
+            pending['users'].add(obj.id)
+        elif isinstance(obj, Role):
+            pending = pending or _pending(session)
+            pending['users'] |= _role_members(session, obj.id)
+        elif isinstance(obj, Permission):
+            pending = pending or _pending(session)
+            pending['deleted_permissions'].add(obj.id)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_permission_changes(session, flush_context):
+    """Dựng lại phần ma trận của các người dùng bị ảnh hưởng trong cùng giao dịch"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    connection = session.connection()
+    if pending['deleted_permissions']:
+        connection.execute(delete(UserPermission.__table__).where(
+            UserPermission.__table__.c.permission_id.in_(pending['deleted_permissions'])
+        ))
+    user_ids = pending['users'] | {user.id for user in pending['new_users'] if user.id is not None}
+    if pending['admins']:
+        user_ids |= set(connection.execute(select(User.id).where(User.role == UserRole.ADMIN)).scalars())
+    rebuild_user_permissions(user_ids, connection=connection)
+
+    # Bỏ danh sách quyền đã nhớ trên các đối tượng người dùng vừa được dựng lại
+    for obj in session.identity_map.values():
+        if isinstance(obj, User) and obj.id in user_ids:
+            obj.__dict__.pop('_permission_codes', None)
+
+
+def users_with_permission(permission_code):
+    """
+    Người dùng có một quyền (dùng ix_user_permission_permission, phục vụ kiểm tra phân quyền)
+
+    Returns:
+        list: Danh sách User theo tên đăng nhập
+    """
+    return User.query.join(UserPermission, UserPermission.user_id == User.id) \
+        .join(Permission, Permission.id == UserPermission.permission_id) \
+        .filter(Permission.code == permission_code).order_by(User.username).all()
+
+
+def permission_counts_by_user():
+    """Số quyền hiệu lực của mỗi người dùng: {user_id: số quyền}"""
+    return dict(db.session.execute(
+        select(UserPermission.user_id, func.count()).group_by(UserPermission.user_id)
+    ).all())
+
+
+def role_names_by_user():
+    """Tên các vai trò được gán của mỗi người dùng: {user_id: [tên vai trò]}"""
+    result = {}
+    for user_id, name in db.session.execute(
+        select(user_roles.c.user_id, Role.name).join(Role, Role.id == user_roles.c.role_id).order_by(Role.name)
+    ):
+        result.setdefault(user_id, []).append(name)
+    return result
+
+
+def role_counts():
+    """
+    Số quyền và số người dùng của mỗi vai trò
+
+    Returns:
+        tuple: ({role_id: số quyền}, {role_id: số người dùng})
+    """
+    permissions = dict(db.session.execute(
+        select(role_permissions.c.role_id, func.count()).group_by(role_permissions.c.role_id)
+    ).all())
+    users = dict(db.session.execute(
+        select(user_roles.c.role_id, func.count()).group_by(user_roles.c.role_id)
+    ).all())
+    return permissions, users
+
+
+def permission_counts_by_module():
+    """Số quyền theo module: {module: số quyền}"""
+    return dict(db.session.execute(
+        select(Permission.module, func.count()).group_by(Permission.module).order_by(Permission.module)
+    ).all())
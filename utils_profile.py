@@ -0,0 +1,201 @@
+"""
+Hồ sơ tổng hợp của một nhân viên: lộ trình công danh, nghỉ phép, khen thưởng, lịch sử lương,
+hợp đồng, giấy tờ và tài sản đang giữ, trả về một tài liệu JSON gọn.
+
+- Các quan hệ của Employee được nạp bằng selectinload, các quan hệ dạng dynamic (hợp đồng, giấy tờ)
+  và tài sản đang giữ mỗi loại một truy vấn, nên số truy vấn cố định, không phụ thuộc số bản ghi.
+- Kết quả được cache theo nhân viên. Mọi thay đổi qua ORM trên nhân viên hoặc các bảng con được
+  ghi nhận trong sự kiện flush và cache được xóa sau khi giao dịch commit; các lệnh ghi hàng loạt
+  (không qua ORM) gọi mark_profiles_stale().
+"""
+import os
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app import db
+from models import (Employee, CareerPath, LeaveRequest, Award, EmployeeSalary, Contract, Document,
+                    AssetAssignment, AssetState)
+from utils_asset_events import assets_held_by
+from utils_cache import cached, invalidate
+
+logger = logging.getLogger(__name__)
+
+# Thời gian sống của cache hồ sơ (giây), giới hạn độ trễ với các thay đổi không qua ORM
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", "300"))
+
+# Khóa trong session.info chứa các nhân viên cần xóa cache khi commit
+_STALE_KEY = 'stale_profiles'
+
+# Các bảng con thuộc hồ sơ và cột trỏ tới nhân viên
+PROFILE_CHILDREN = {
+    CareerPath: 'employee_id',
+    LeaveRequest: 'employee_id',
+    Award: 'employee_id',
+    EmployeeSalary: 'employee_id',
+    Contract: 'employee_id',
+    Document: 'employee_id',
+    AssetAssignment: 'employee_id',
+    AssetState: 'holder_id',
+}
+
+
+def profile_cache_key(employee_id):
+    """Khóa cache hồ sơ tổng hợp của một nhân viên"""
+    return f"profile:employee:{employee_id}"
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _label(value):
+    return value.value if value is not None else None
+
+
+def build_profile(employee_id):
+    """
+    Dựng hồ sơ tổng hợp của nhân viên (không dùng cache)
+
+    Returns:
+        dict: Hồ sơ dạng JSON, None nếu không có nhân viên
+    """
+    employee = Employee.query.options(
+        joinedload(Employee.department),
+        selectinload(Employee.career_paths),
+        selectinload(Employee.leave_requests),
+        selectinload(Employee.awards),
+        selectinload(Employee.salary_history).joinedload(EmployeeSalary.salary_grade),
+    ).filter(Employee.id == employee_id).first()
+    if employee is None:
+        return None
+
+    contracts = Contract.query.filter_by(employee_id=employee_id) \
+        .order_by(Contract.start_date.desc(), Contract.id.desc()).all()
+    documents = Document.query.filter_by(employee_id=employee_id) \
+        .order_by(Document.document_type, Document.id.desc()).all()
+    assets = assets_held_by(employee_id)
+
+    return {
+        'employee': {
+            'id': employee.id,
+            'employee_code': employee.employee_code,
+            'full_name': employee.full_name,
+            'department': employee.department.name if employee.department else None,
+            'position': employee.position,
+            'status': employee.status.name if employee.status else None,
+            'contract_start_date': _iso(employee.contract_start_date),
+            'contract_end_date': _iso(employee.contract_end_date),
+        },
+        'career_paths': [{
+            'id': path.id,
+            'position': path.position,
+            'start_date': _iso(path.start_date),
+            'end_date': _iso(path.end_date),
+            'description': path.description,
+        } for path in sorted(employee.career_paths, key=lambda p: p.start_date, reverse=True)],
+        'leave_requests': [{
+            'id': leave.id,
+            'leave_type': _label(leave.leave_type),
+            'start_date': _iso(leave.start_date),
+            'end_date': _iso(leave.end_date),
+            'reason': leave.reason,
+            'status': leave.status.name if leave.status else None,
+            'status_label': _label(leave.status),
+            'created_at': _iso(leave.created_at),
+        } for leave in sorted(employee.leave_requests, key=lambda l: (l.created_at is not None, l.created_at),
+                              reverse=True)],
+        'awards': [{
+            'id': award.id,
+            'name': award.name,
+            'award_type': _label(award.award_type),
+            'year': award.year,
+            'date_received': _iso(award.date_received),
+        } for award in sorted(employee.awards, key=lambda a: a.year, reverse=True)],
+        'salary_history': [{
+            'id': salary.id,
+            'salary_grade_code': salary.salary_grade.code,
+            'total_coefficient': salary.total_coefficient,
+            'calculated_salary': salary.calculated_salary,
+            'effective_date': _iso(salary.effective_date),
+            'end_date': _iso(salary.end_date),
+            'decision_number': salary.decision_number,
+        } for salary in sorted(employee.salary_history, key=lambda s: s.effective_date, reverse=True)],
+        'contracts': [{
+            'id': contract.id,
+            'contract_number': contract.contract_number,
+            'contract_type': _label(contract.contract_type),
+            'status': contract.status.name,
+            'status_label': _label(contract.status),
+            'start_date': _iso(contract.start_date),
+            'end_date': _iso(contract.end_date),
+            'job_title': contract.job_title,
+        } for contract in contracts],
+        'documents': [{
+            'id': document.id,
+            'document_type': _label(document.document_type),
+            'document_number': document.document_number,
+            'issue_date': _iso(document.issue_date),
+            'expiry_date': _iso(document.expiry_date),
+            'is_verified': bool(document.is_verified),
+        } for document in documents],
+        'assets': [{
+            'id': asset.id,
+            'asset_code': asset.asset_code,
+            'name': asset.name,
+        } for asset in assets],
+    }
+
+
+def get_profile(employee_id):
+    """Hồ sơ tổng hợp của nhân viên, có cache theo nhân viên"""
+    return cached(profile_cache_key(employee_id), lambda: build_profile(employee_id), PROFILE_CACHE_TTL)
+
+
+def invalidate_profiles(*employee_ids):
+    """Xóa cache hồ sơ của các nhân viên"""
+    keys = [profile_cache_key(employee_id) for employee_id in employee_ids if employee_id]
+    if keys:
+        invalidate(*keys)
+
+
+def mark_profiles_stale(*employee_ids, session=None):
+    """
+    Đánh dấu hồ sơ của các nhân viên cần xóa cache khi giao dịch hiện tại commit
+    (dùng cho các lệnh ghi hàng loạt không qua ORM)
+    """
+    session = session or db.session()
+    session.info.setdefault(_STALE_KEY, set()).update(employee_id for employee_id in employee_ids if employee_id)
+
+
+def _employee_ids(target, column):
+    """Nhân viên hiện tại và trước khi sửa (nếu bản ghi chuyển sang nhân viên khác)"""
+    history = inspect(target).attrs[column].history
+    return [getattr(target, column), *history.deleted]
+
+
+def _on_employee_write(mapper, connection, target):
+    mark_profiles_stale(target.id, session=Session.object_session(target))
+
+
+def _on_child_write(mapper, connection, target):
+    column = PROFILE_CHILDREN[mapper.class_]
+    mark_profiles_stale(*_employee_ids(target, column), session=Session.object_session(target))
+
+
+for _event in ('after_update', 'after_delete'):
+    event.listen(Employee, _event, _on_employee_write)
+for _model in PROFILE_CHILDREN:
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _on_child_write)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_stale_profiles(session):
+    invalidate_profiles(*session.info.pop(_STALE_KEY, ()))
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_stale_profiles(session):
+    session.info.pop(_STALE_KEY, None)
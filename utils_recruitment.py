@@ -0,0 +1,197 @@
+"""
+Truy vấn quy trình tuyển dụng (pipeline) và số liệu tổng quan tuyển dụng.
+
+Số lượng ứng viên theo trạng thái được đếm bằng một câu GROUP BY; danh sách ứng viên
+được phân trang theo từng giai đoạn trên index (job_opening_id, status, application_date),
+và bảng Kanban lấy N ứng viên đầu của mọi giai đoạn bằng một truy vấn ROW_NUMBER().
+Số liệu tổng quan (phễu tuyển dụng, thời gian tuyển) được tính bằng vài truy vấn gộp
+và lưu trong cache ngắn hạn, xóa khi trạng thái ứng viên thay đổi.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, func, case
+
+from app import db
+from models import Candidate, CandidateStatus, Interview, JobOpening, JobOpeningStatus
+from utils_cache import cached, invalidate
+
+# Số ứng viên mỗi trang trong danh sách theo giai đoạn
+STAGE_PAGE_SIZE = 20
+
+# Khóa và thời gian sống (giây) của cache số liệu tổng quan tuyển dụng
+RECRUITMENT_METRICS = 'recruitment:metrics'
+METRICS_CACHE_TTL = int(os.environ.get("RECRUITMENT_METRICS_CACHE_TTL", "60"))
+
+# Các bước của phễu tuyển dụng: (khóa, nhãn, trạng thái hiện tại cho thấy ứng viên đã qua bước này).
+# Ứng viên đã có lịch phỏng vấn được tính là đã qua bước sàng lọc và phỏng vấn,
+# kể cả khi sau đó bị từ chối hoặc rút lui.
+FUNNEL_STAGES = [
+    ('applied', 'Ứng tuyển', tuple(CandidateStatus)),
+    ('screening', 'Sàng lọc', (CandidateStatus.SCREENING, CandidateStatus.INTERVIEW_SCHEDULED,
+                               CandidateStatus.INTERVIEWED, CandidateStatus.OFFER_SENT, CandidateStatus.HIRED)),
+    ('interview', 'Phỏng vấn', (CandidateStatus.INTERVIEW_SCHEDULED, CandidateStatus.INTERVIEWED,
+                                CandidateStatus.OFFER_SENT, CandidateStatus.HIRED)),
+    ('offer', 'Gửi đề nghị', (CandidateStatus.OFFER_SENT, CandidateStatus.HIRED)),
+    ('hired', 'Tuyển dụng', (CandidateStatus.HIRED,)),
+]
+_INTERVIEW_STAGES = ('applied', 'screening', 'interview')
+
+_candidate_order = (Candidate.application_date.desc(), Candidate.id.desc())
+
+
+def candidate_status_counts(opening_id):
+    """
+    Số ứng viên theo trạng thái của đợt tuyển dụng (một truy vấn)
+
+    Returns:
+        dict: {tên trạng thái: số ứng viên}, đủ mọi CandidateStatus
+    """
+    rows = db.session.execute(
+        select(Candidate.status, func.count(Candidate.id))
+        .where(Candidate.job_opening_id == opening_id)
+        .group_by(Candidate.status)
+    ).all()
+    counts = {status.name: 0 for status in CandidateStatus}
+    for status, count in rows:
+        counts[status.name if isinstance(status, CandidateStatus) else status] = count
+    return counts
+
+
+def stage_candidates(opening_id, status, page=1, per_page=STAGE_PAGE_SIZE, total=None):
+    """
+    Một trang ứng viên của một giai đoạn
+
+    Args:
+        opening_id (int): ID đợt tuyển dụng
+        status (str): Tên trạng thái (CandidateStatus.name)
+        page (int): Số trang
+        per_page (int): Số ứng viên mỗi trang
+        total (int): Tổng số ứng viên của giai đoạn nếu đã biết (bỏ qua câu COUNT)
+
+    Returns:
+        Pagination: Trang ứng viên
+    """
+    query = Candidate.query.filter(
+        Candidate.job_opening_id == opening_id,
+        Candidate.status == status
+    ).order_by(*_candidate_order)
+    if total is None:
+        return query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = total
+    return pagination
+
+
+def pipeline_preview(opening_id, per_stage=STAGE_PAGE_SIZE):
+    """
+    N ứng viên mới nhất của mọi giai đoạn trong một truy vấn (ROW_NUMBER theo trạng thái)
+
+    Returns:
+        dict: {tên trạng thái: [Candidate]}
+    """
+    row_number = func.row_number().over(partition_by=Candidate.status, order_by=_candidate_order)
+    ranked = select(Candidate.id, row_number.label('rn')) \
+        .where(Candidate.job_opening_id == opening_id).subquery()
+    candidates = Candidate.query.join(ranked, ranked.c.id == Candidate.id) \
+        .filter(ranked.c.rn <= per_stage).order_by(*_candidate_order).all()
+
+    preview = {status.name: [] for status in CandidateStatus}
+    for candidate in candidates:
+        preview[candidate.status.name].append(candidate)
+    return preview
+
+
+def candidate_to_card(candidate):
+    """Dữ liệu thẻ ứng viên cho bảng Kanban"""
+    return {
+        'id': candidate.id,
+        'full_name': candidate.full_name,
+        'email': candidate.email,
+        'phone': candidate.phone,
+        'status': candidate.status.name,
+        'application_date': candidate.application_date.isoformat() if candidate.application_date else None,
+    }
+
+
+def compute_recruitment_metrics(now=None):
+    """
+    Số liệu tổng quan tuyển dụng (không dùng cache), gồm 3 truy vấn:
+    các số đếm tổng, phân bố ứng viên theo (trạng thái, đã phỏng vấn) và ngày tuyển của ứng viên đã tuyển.
+
+    Thời gian tuyển được tính từ ngày ứng tuyển đến lần cập nhật cuối của ứng viên đã tuyển
+    (thời điểm chuyển sang trạng thái HIRED nếu hồ sơ không bị sửa sau đó).
+
+    Returns:
+        dict: {'active_openings', 'total_candidates', 'interviews_this_week', 'status_counts',
+               'funnel', 'time_to_hire'}
+    """
+    now = now or datetime.now()
+
+    active_openings, interviews_this_week = db.session.execute(select(
+        select(func.count(JobOpening.id)).where(JobOpening.status == JobOpeningStatus.OPEN).scalar_subquery(),
+        select(func.count(Interview.id)).where(
+            Interview.scheduled_date >= now,
+            Interview.scheduled_date <= now + timedelta(days=7)
+        ).scalar_subquery()
+    )).one()
+
+    interviewed = select(Interview.candidate_id).distinct().subquery()
+    has_interview = case((interviewed.c.candidate_id.isnot(None), 1), else_=0)
+    rows = db.session.execute(
+        select(Candidate.status, has_interview, func.count(Candidate.id))
+        .outerjoin(interviewed, interviewed.c.candidate_id == Candidate.id)
+        .group_by(Candidate.status, has_interview)
+    ).all()
+
+    status_counts = {status.name: 0 for status in CandidateStatus}
+    funnel_counts = {key: 0 for key, _, _ in FUNNEL_STAGES}
+    for status, interviewed_flag, count in rows:
+        status_counts[status.name] += count
+        for key, _, statuses in FUNNEL_STAGES:
+            if status in statuses or (interviewed_flag and key in _INTERVIEW_STAGES):
+                funnel_counts[key] += count
+
+    funnel = []
+    previous = None
+    for key, label, _ in FUNNEL_STAGES:
+        count = funnel_counts[key]
+        funnel.append({
+            'stage': key,
+            'label': label,
+            'count': count,
+            'conversion_rate': round(count / previous * 100, 1) if previous else None,
+        })
+        previous = count
+
+    hired = db.session.execute(
+        select(Candidate.application_date, Candidate.updated_at)
+        .where(Candidate.status == CandidateStatus.HIRED, Candidate.updated_at.isnot(None))
+    ).all()
+    days = np.array([(updated_at.date() - applied).days for applied, updated_at in hired if applied], dtype=float)
+    if days.size:
+        p50, p75, p90 = np.percentile(days, [50, 75, 90])
+        time_to_hire = {'count': int(days.size), 'mean': round(float(days.mean()), 1),
+                        'p50': round(float(p50), 1), 'p75': round(float(p75), 1), 'p90': round(float(p90), 1)}
+    else:
+        time_to_hire = {'count': 0}
+
+    return {
+        'active_openings': active_openings,
+        'total_candidates': sum(status_counts.values()),
+        'interviews_this_week': interviews_this_week,
+        'status_counts': status_counts,
+        'funnel': funnel,
+        'time_to_hire': time_to_hire,
+    }
+
+
+def get_recruitment_metrics():
+    """Số liệu tổng quan tuyển dụng, có cache ngắn hạn"""
+    return cached(RECRUITMENT_METRICS, compute_recruitment_metrics, METRICS_CACHE_TTL)
+
+
+def invalidate_recruitment_metrics():
+    """Xóa cache số liệu tuyển dụng sau khi ứng viên, phỏng vấn hoặc đợt tuyển dụng thay đổi"""
+    invalidate(RECRUITMENT_METRICS)
@@ -0,0 +1,81 @@
+"""
+Tra cứu hồ sơ lương có hiệu lực tại một ngày (as-of).
+
+Mỗi tra cứu dùng index (employee_id, effective_date DESC) của employee_salary:
+- Một nhân viên: lấy dòng đầu tiên có effective_date <= ngày cần tra.
+- Nhiều nhân viên: DISTINCT ON (employee_id) trên PostgreSQL, ROW_NUMBER() trên các database khác.
+"""
+from datetime import date
+
+from sqlalchemy import select, func, or_
+
+from app import db
+from models import EmployeeSalary
+
+
+def _in_force(query, as_of):
+    return query.where(
+        EmployeeSalary.effective_date <= as_of,
+        or_(EmployeeSalary.end_date.is_(None), EmployeeSalary.end_date >= as_of)
+    )
+
+
+def get_salary_as_of(employee_id, as_of=None):
+    """
+    Hồ sơ lương của nhân viên có hiệu lực tại ngày as_of
+
+    Args:
+        employee_id (int): ID nhân viên
+        as_of (date): Ngày cần tra, mặc định hôm nay
+
+    Returns:
+        EmployeeSalary: Hồ sơ lương, hoặc None nếu không có
+    """
+    as_of = as_of or date.today()
+    query = _in_force(select(EmployeeSalary).where(EmployeeSalary.employee_id == employee_id), as_of)
+    query = query.order_by(EmployeeSalary.effective_date.desc(), EmployeeSalary.id.desc()).limit(1)
+    return db.session.execute(query).scalars().first()
+
+
+def salary_as_of_ids(as_of=None, employee_ids=None):
+    """
+    Câu truy vấn ID hồ sơ lương có hiệu lực tại ngày as_of, mỗi nhân viên một hồ sơ
+    (hồ sơ có ngày hiệu lực muộn nhất)
+
+    Args:
+        as_of (date): Ngày cần tra, mặc định hôm nay
+        employee_ids (list): Giới hạn theo danh sách nhân viên (tùy chọn)
+
+    Returns:
+        Select: Câu truy vấn một cột id, dùng được trong IN (...) hoặc làm subquery
+    """
+    as_of = as_of or date.today()
+    order = (EmployeeSalary.effective_date.desc(), EmployeeSalary.id.desc())
+
+    if db.engine.dialect.name == 'postgresql':
+        query = select(EmployeeSalary.id).distinct(EmployeeSalary.employee_id) \
+            .order_by(EmployeeSalary.employee_id, *order)
+        query = _in_force(query, as_of)
+        if employee_ids is not None:
+            query = query.where(EmployeeSalary.employee_id.in_(employee_ids))
+        return query
+
+    row_number = func.row_number().over(partition_by=EmployeeSalary.employee_id, order_by=order)
+    ranked = _in_force(select(EmployeeSalary.id, row_number.label('rn')), as_of)
+    if employee_ids is not None:
+        ranked = ranked.where(EmployeeSalary.employee_id.in_(employee_ids))
+    ranked = ranked.subquery()
+    return select(ranked.c.id).where(ranked.c.rn == 1)
+
+
+def get_salaries_as_of(employee_ids, as_of=None):
+    """
+    Hồ sơ lương có hiệu lực tại ngày as_of của nhiều nhân viên
+
+    Returns:
+        dict: {employee_id: EmployeeSalary}
+    """
+    if not employee_ids:
+        return {}
+    query = select(EmployeeSalary).where(EmployeeSalary.id.in_(salary_as_of_ids(as_of, employee_ids)))
+    return {s.employee_id: s for s in db.session.execute(query).scalars()}
@@ -0,0 +1,404 @@
+"""
+Lưu trữ file tải lên (CV, hợp đồng, phụ lục, tài liệu) theo nội dung (content-addressed).
+
+- File tải lên được đọc từng khối và ghi ra file tạm, đồng thời tính SHA-256;
+  không đọc toàn bộ file vào bộ nhớ.
+- Mỗi nội dung chỉ được lưu một lần (khóa đối tượng suy ra từ SHA-256). Bảng stored_files
+  đếm số bản ghi đang tham chiếu; đối tượng bị xóa khi không còn ai tham chiếu, sau khi
+  giao dịch commit (rollback thì giữ nguyên file).
+- Backend lưu trữ: thư mục cục bộ (mặc định) hoặc S3/MinIO (FILE_STORAGE_BACKEND=s3).
+- Tải xuống qua backend cục bộ dùng X-Sendfile (USE_X_SENDFILE) hoặc X-Accel-Redirect
+  của nginx (FILE_STORAGE_ACCEL_PREFIX); qua S3 thì chuyển hướng tới URL ký sẵn.
+
+Cột file của các model lưu tham chiếu dạng "stored/<sha256><phần mở rộng>". Các giá trị cũ
+("uploads/...", nằm trong thư mục static) vẫn được đọc và xóa như trước.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+import mimetypes
+import unicodedata
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from flask import current_app, send_file, send_from_directory, redirect, Response
+from sqlalchemy import update, select, event
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from app import db
+from models import StoredFile
+
+logger = logging.getLogger(__name__)
+
+# Tiền tố tham chiếu của file lưu theo nội dung
+STORED_PREFIX = 'stored/'
+
+# Kích thước mỗi khối khi đọc file tải lên (byte)
+CHUNK_SIZE = 64 * 1024
+
+# Thời gian hiệu lực của URL tải xuống ký sẵn trên S3 (giây)
+PRESIGNED_URL_TTL = int(os.environ.get("FILE_STORAGE_URL_TTL", "300"))
+
+# Khóa trong session.info chứa các file chờ xóa khi giao dịch commit
+_RELEASED_KEY = 'released_files'
+
+
+def object_key(sha256):
+    """Khóa đối tượng của một nội dung, chia thư mục theo 2 ký tự đầu của SHA-256"""
+    return f"{sha256[:2]}/{sha256}"
+
+
+class LocalStorageBackend:
+    """Lưu đối tượng trong một thư mục cục bộ"""
+
+    def __init__(self, root):
+        self.root = root
+        self.temp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def put(self, key, temp_path, content_type=None):
+        """Chuyển file tạm vào vị trí của đối tượng (cùng filesystem nên là thao tác đổi tên)"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def send(self, key, download_name, mimetype, as_attachment=True, etag=None):
+        """
+        Response tải đối tượng. Nếu có FILE_STORAGE_ACCEL_PREFIX thì để nginx gửi file
+        (X-Accel-Redirect); nếu bật USE_X_SENDFILE thì send_file trả header X-Sendfile.
+        """
+        accel_prefix = current_app.config.get("FILE_STORAGE_ACCEL_PREFIX")
+        if accel_prefix:
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + key
+            response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline',
+                                 filename=download_name)
+            if etag:
+                response.set_etag(etag)
+            return response
+        return send_file(self.path(key), mimetype=mimetype, as_attachment=as_attachment,
+                         download_name=download_name, etag=etag or True, conditional=True)
+
+
+class S3StorageBackend:
+    """Lưu đối tượng trên S3 hoặc dịch vụ tương thích S3 (MinIO)"""
+
+    def __init__(self, bucket, endpoint_url=None, region_name=None, prefix=''):
+        import boto3  # Chỉ import khi thực sự dùng S3
+        self._client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region_name)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.temp_dir = None
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def put(self, key, temp_path, content_type=None):
+        extra_args = {'ContentType': content_type} if content_type else None
+        self._client.upload_file(temp_path, self.bucket, self._key(key), ExtraArgs=extra_args)
+        os.remove(temp_path)
+
+    def exists(self, key):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception:
+            return False
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def download(self, key, dest_path):
+        self._client.download_file(self.bucket, self._key(key), dest_path)
+
+    def send(self, key, download_name, mimetype, as_attachment=True, etag=None):
+        """Chuyển hướng tới URL ký sẵn, file được tải trực tiếp từ S3"""
+        disposition = 'attachment' if as_attachment else 'inline'
+        url = self._client.generate_presigned_url('get_object', Params={
+            'Bucket': self.bucket,
+            'Key': self._key(key),
+            'ResponseContentType': mimetype,
+            'ResponseContentDisposition': _content_disposition(disposition, download_name),
+        }, ExpiresIn=PRESIGNED_URL_TTL)
+        return redirect(url)
+
+
+def _content_disposition(disposition, download_name):
+    """
+    Giá trị Content-Disposition như send_file của werkzeug: tên ASCII trong filename
+    (bỏ dấu, bỏ ký tự trích dẫn) và tên gốc mã hóa UTF-8 trong filename* (RFC 5987)
+
+    Args:
+        disposition (str): 'attachment' hoặc 'inline'
+        download_name (str): Tên file khi tải xuống
+
+    Returns:
+        str: Giá trị header Content-Disposition
+    """
+    simple = download_name.replace('đ', 'd').replace('Đ', 'D')  # NFKD không tách được chữ đ
+    simple = unicodedata.normalize('NFKD', simple).encode('ascii', 'ignore').decode('ascii')
+    simple = simple.replace('\\', '').replace('"', '')
+    value = f'{disposition}; filename="{simple}"'
+    if simple != download_name:
+        value += f"; filename*=UTF-8''{quote(download_name, safe='!#$&+^`|~')}"
+    return value
+
+
+def _create_backend():
+    """Chọn backend theo cấu hình FILE_STORAGE_BACKEND (local/s3)"""
+    if os.environ.get("FILE_STORAGE_BACKEND", "local") == "s3":
+        return S3StorageBackend(
+            bucket=os.environ["FILE_STORAGE_S3_BUCKET"],
+            endpoint_url=os.environ.get("FILE_STORAGE_S3_ENDPOINT"),
+            region_name=os.environ.get("FILE_STORAGE_S3_REGION"),
+            prefix=os.environ.get("FILE_STORAGE_S3_PREFIX", ""),
+        )
+    root = os.environ.get("FILE_STORAGE_DIR") or os.path.join(current_app.root_path, 'instance', 'storage')
+    return LocalStorageBackend(root)
+
+
+_backend = None
+
+
+def get_backend():
+    """Backend lưu trữ đang dùng (khởi tạo lần đầu khi cần)"""
+    global _backend
+    if _backend is None:
+        _backend = _create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Thay backend lưu trữ
+
+    Args:
+        backend: Đối tượng có các phương thức put, exists, delete, send và thuộc tính temp_dir
+    """
+    global _backend
+    _backend = backend
+
+
+def is_stored(ref):
+    """Tham chiếu có phải file lưu theo nội dung không (ngược lại là đường dẫn cũ trong static)"""
+    return bool(ref) and ref.startswith(STORED_PREFIX)
+
+
+def file_extension(ref):
+    """Phần mở rộng của file từ tham chiếu, ví dụ '.pdf'"""
+    return os.path.splitext(ref or '')[1].lower()
+
+
+def _parse_sha256(ref):
+    return os.path.splitext(ref[len(STORED_PREFIX):])[0]
+
+
+def _spool_upload(file_storage, temp_dir):
+    """
+    Ghi file tải lên ra file tạm theo từng khối, đồng thời tính SHA-256
+
+    Returns:
+        tuple: (đường dẫn file tạm, sha256, kích thước)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    stream = file_storage.stream
+    tmp = tempfile.NamedTemporaryFile(dir=temp_dir, delete=False)
+    try:
+        with tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp.name)
+        raise
+    return tmp.name, digest.hexdigest(), size
+
+
+def _increment_ref(stored_file_id, delta):
+    db.session.execute(
+        update(StoredFile).where(StoredFile.id == stored_file_id)
+        .values(ref_count=StoredFile.ref_count + delta)
+    )
+
+
+def store_upload(file_storage):
+    """
+    Lưu file tải lên và tăng số tham chiếu của nội dung (không commit)
+
+    Nếu nội dung đã có (cùng SHA-256) thì chỉ tăng số tham chiếu, file tạm bị bỏ đi.
+
+    Args:
+        file_storage (FileStorage): File từ form (form.<field>.data)
+
+    Returns:
+        str: Tham chiếu "stored/<sha256><phần mở rộng>" để lưu vào cột file của model
+    """
+    backend = get_backend()
+    filename = secure_filename(file_storage.filename or '')
+    extension = os.path.splitext(filename)[1].lower()
+    content_type = file_storage.mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    temp_path, sha256, size = _spool_upload(file_storage, backend.temp_dir)
+    try:
+        stored_file = StoredFile.query.filter_by(sha256=sha256).first()
+        if stored_file is None:
+            backend.put(object_key(sha256), temp_path, content_type)
+            try:
+                with db.session.begin_nested():
+                    stored_file = StoredFile(sha256=sha256, size=size, content_type=content_type, ref_count=0)
+                    db.session.add(stored_file)
+            except IntegrityError:
+                # Một request khác vừa lưu cùng nội dung
+                stored_file = StoredFile.query.filter_by(sha256=sha256).one()
+        elif not backend.exists(object_key(sha256)):
+            # Đối tượng bị mất ngoài ý muốn: ghi lại từ bản vừa tải lên
+            backend.put(object_key(sha256), temp_path, content_type)
+        _increment_ref(stored_file.id, 1)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return f"{STORED_PREFIX}{sha256}{extension}"
+
+
+def _released(session):
+    return session.info.setdefault(_RELEASED_KEY, {'stored': set(), 'static': set()})
+
+
+def release_file(ref):
+    """
+    Bỏ một tham chiếu tới file (không commit). Đối tượng không còn tham chiếu được xóa khỏi
+    backend sau khi giao dịch commit; nếu rollback thì file vẫn còn nguyên.
+    Với đường dẫn cũ trong static thì file cũng chỉ bị xóa khi commit.
+
+    Args:
+        ref (str): Giá trị cột file của model
+    """
+    if not ref:
+        return
+    session = db.session()
+    if not is_stored(ref):
+        _released(session)['static'].add(os.path.join(current_app.root_path, 'static', ref))
+        return
+
+    stored_file = StoredFile.query.filter_by(sha256=_parse_sha256(ref)).first()
+    if stored_file is None:
+        return
+    _increment_ref(stored_file.id, -1)
+    db.session.refresh(stored_file)
+    if stored_file.ref_count <= 0:
+        db.session.delete(stored_file)
+        _released(session)['stored'].add(stored_file.sha256)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _delete_released_files(session):
+    """Xóa khỏi backend các đối tượng đã bỏ tham chiếu trong giao dịch vừa commit"""
+    released = session.info.pop(_RELEASED_KEY, None)
+    if not released:
+        return
+
+    for path in released['static']:
+        if os.path.exists(path):
+            os.remove(path)
+
+    hashes = released['stored']
+    if not hashes:
+        return
+    # Session không chạy được SQL trong after_commit; nội dung có thể vừa được tải lên lại ở request khác
+    with session.get_bind().connect() as conn:
+        hashes -= set(conn.execute(select(StoredFile.sha256).where(StoredFile.sha256.in_(hashes))).scalars())
+    backend = get_backend()
+    for sha256 in hashes:
+        try:
+            backend.delete(object_key(sha256))
+        except Exception as e:
+            logger.warning(f"Không thể xóa đối tượng {sha256}: {e}")
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_released_files(session):
+    session.info.pop(_RELEASED_KEY, None)
+
+
+def replace_file(old_ref, file_storage):
+    """
+    Lưu file mới rồi bỏ tham chiếu file cũ (không commit). Tải lại đúng nội dung cũ
+    không làm xóa đối tượng vì tham chiếu mới được tăng trước.
+
+    Returns:
+        str: Tham chiếu của file mới
+    """
+    new_ref = store_upload(file_storage)
+    release_file(old_ref)
+    return new_ref
+
+
+@contextmanager
+def local_copy(ref):
+    """
+    Đường dẫn cục bộ để đọc nội dung file (ví dụ khi trích xuất văn bản).
+    Với backend S3, file được tải về file tạm và xóa khi ra khỏi khối with.
+
+    Args:
+        ref (str): Giá trị cột file của model
+    """
+    if not is_stored(ref):
+        yield os.path.join(current_app.root_path, 'static', ref)
+        return
+
+    backend = get_backend()
+    key = object_key(_parse_sha256(ref))
+    if isinstance(backend, LocalStorageBackend):
+        yield backend.path(key)
+        return
+
+    fd, temp_path = tempfile.mkstemp(suffix=file_extension(ref))
+    os.close(fd)
+    try:
+        backend.download(key, temp_path)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
+
+
+def send_stored_file(ref, download_name=None, as_attachment=True):
+    """
+    Response tải file theo tham chiếu
+
+    Args:
+        ref (str): Giá trị cột file của model
+        download_name (str): Tên file khi tải xuống (không gồm phần mở rộng thì tự thêm)
+        as_attachment (bool): False để trình duyệt hiển thị trực tiếp (ví dụ xem PDF)
+    """
+    if not is_stored(ref):
+        directory = os.path.join(current_app.root_path, 'static', os.path.dirname(ref))
+        return send_from_directory(directory, os.path.basename(ref), as_attachment=as_attachment,
+                                   download_name=download_name)
+
+    sha256 = _parse_sha256(ref)
+    stored_file = StoredFile.query.filter_by(sha256=sha256).first_or_404()
+    extension = file_extension(ref)
+    download_name = download_name or sha256
+    if extension and not download_name.lower().endswith(extension):
+        download_name += extension
+    return get_backend().send(object_key(sha256), download_name, stored_file.content_type,
+                              as_attachment=as_attachment, etag=sha256)
@@ -0,0 +1,53 @@
+"""
+Script để đối soát ngày hợp đồng lưu trên nhân viên với hợp đồng đang hiệu lực
+và sửa các bản sao bị lệch
+Script này có thể được chạy tự động thông qua cron
+"""
+import sys
+import logging
+from app import app
+from utils_contract import find_contract_date_drift, repair_contract_date_drift
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Hàm chính của script
+    
+    Sử dụng: python verify_contract_dates.py [--check]
+    - --check: Chỉ kiểm tra, không sửa; trả về mã lỗi 1 nếu có nhân viên bị lệch
+    """
+    try:
+        check_only = '--check' in sys.argv[1:]
+        
+        logger.info("Đối soát ngày hợp đồng của nhân viên...")
+        
+        with app.app_context():
+            if check_only:
+                drift = find_contract_date_drift()
+                for row in drift:
+                    logger.warning(f"Nhân viên {row['employee_code']}: {row['stored_start']} - {row['stored_end']}, "
+                                   f"hợp đồng hiện hành {row['start_date']} - {row['end_date']}")
+                logger.info(f"Đã kiểm tra xong, {len(drift)} nhân viên bị lệch.")
+                return 1 if drift else 0
+            
+            result = repair_contract_date_drift()
+            logger.info(f"Đã đối soát xong, {result['drift']} nhân viên bị lệch, "
+                        f"{result['repaired']} nhân viên đã được sửa.")
+        
+        return 0
+    except Exception as e:
+        logger.error(f"Lỗi: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())